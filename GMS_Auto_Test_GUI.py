@@ -1,5 +1,6 @@
 # GMS_Auto_Test_GUI.py
 import atexit
+import codecs
 import getpass
 import json
 import os
@@ -29,6 +30,9 @@ except ImportError:
     messagebox.showerror("依赖缺失", "请运行命令安装: paramiko:\npip install paramiko")
     sys.exit(1)
 
+# 并行 SFTP、增量上传和主机镜像缓存与 Web 服务共用同一实现
+from web_app.sftp_transfer import IMAGE_CACHE_MIN_SIZE, cached_sftp_put
+
 # ==================== 创建弹框 ====================
 def center_toplevel(window, width, height):
     """居中 Toplevel 弹窗"""
@@ -2417,10 +2421,19 @@ class GmsTestGUI:
             for msg in log_msgs:
                 self.log_message(msg)
             stdin, stdout, stderr = ssh.exec_command(gms_cmd, get_pty=True)
+            summary_path = None
+            # recv 的分块可能截断多字节字符或一行输出，解码和摘要路径匹配都按行缓冲
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            pending = ''
             while not stdout.channel.exit_status_ready() and self.test_running:
                 if stdout.channel.recv_ready():
-                    data = stdout.channel.recv(4096).decode('utf-8', errors='replace')
+                    data = decoder.decode(stdout.channel.recv(4096))
                     if data:
+                        *lines, pending = (pending + data).split('\n')
+                        for line in lines:
+                            match = re.search(r'运行摘要: (\S+summary\.json)', line)
+                            if match:
+                                summary_path = match.group(1)
                         self.log_message(data.rstrip())
                 if stderr.channel.recv_stderr_ready():
                     error = stderr.channel.recv_stderr(4096).decode('utf-8', errors='replace')
@@ -2433,6 +2446,10 @@ class GmsTestGUI:
             else:
                 exit_code = stdout.channel.recv_exit_status()
                 self.log_message(f"📊 测试完成，退出码: {exit_code}")
+                summary = self.read_run_summary(ssh, summary_path) if summary_path else None
+                if summary:
+                    self.log_message(f"📊 测试结果: PASS: {summary.get('pass', 0)}  FAIL: {summary.get('failed', 0)}  "
+                                     f"重试: {summary.get('retry_rounds', 0)} 次  用时: {summary.get('duration', 0)}s")
         except Exception as e:
             self.log_message(f"❌ 执行出错: {str(e)}")
         finally:
@@ -2441,6 +2458,19 @@ class GmsTestGUI:
             if ssh:
                 self.release_ssh_connection(ssh)
 
+    def read_run_summary(self, ssh, remote_path):
+        """读取运行脚本写出的 summary.json"""
+        try:
+            sftp = ssh.open_sftp()
+            try:
+                with sftp.open(remote_path, 'r') as f:
+                    return json.loads(f.read(65536).decode('utf-8', errors='replace'))
+            finally:
+                sftp.close()
+        except Exception as e:
+            self.log_message(f"⚠️ 读取运行摘要失败: {e}")
+            return None
+
     def _kill_tradefed_processes(self):
         """强制终止远程主机上所有 tradefed 相关进程"""
         ssh = self.get_ssh_connection()
@@ -2612,7 +2642,13 @@ class GmsTestGUI:
                 last_time = now
                 last_size = transferred
 
-            sftp.put(local_path, remote_path, callback=update_progress)
+            if file_size >= IMAGE_CACHE_MIN_SIZE:
+                self._update_progress_info("计算 SHA-256 并比对主机镜像缓存...")
+            upload = cached_sftp_put(ssh, self.config, local_path, remote_path, callback=update_progress)
+            if upload['cached']:
+                self.log_message(f"⚡ 主机已有相同内容 (SHA-256 {upload['sha256'][:12]})，已直接链接，跳过上传")
+            elif upload['delta_sent'] is not None:
+                self.log_message(f"🧩 增量上传: 仅发送 {format_size(upload['delta_sent'])} / {file_size_str}")
             total_time = time.time() - start_time
             avg_speed = file_size / total_time if total_time > 0 else 0
 
@@ -2631,6 +2667,7 @@ class GmsTestGUI:
             self._update_progress_info("上传完成")
             return True
         except Exception as e:
+            self.log_message(f"❌ 上传失败: {e}")
             self._update_progress_info("上传失败")
             return False
         finally:
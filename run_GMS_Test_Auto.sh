@@ -18,11 +18,49 @@ FAIL_COUNT=0
 RESULT_TIMESTAMP=""
 RETRY_FAIL="true"
 COPY_TO_REMOTE="false"
+CAS_DEDUP="true"
+LOGS_DIR=""
+RESULT_DIR=""
+REMOTE_ROOT=""
+LOGS_ROOT=""
+RESULTS_ROOT=""
+SYNC_INTERVAL=60
+SYNC_STATE=""
+LIVE_SYNC_PID=""
+SCRIPT_PATH="$(readlink -f "$0")"
+# 同一次运行的 ssh/rsync 复用一条主连接
+SSH_OPTS="-o BatchMode=yes -o ConnectTimeout=5 -o ControlMaster=auto -o ControlPath=/tmp/gms_ssh_%r@%h:%p -o ControlPersist=600"
+export RSYNC_RSH="ssh $SSH_OPTS"
+RUN_STARTED=$(date +%s)
+RETRY_ROUNDS=0
+PHASES=()
+declare -A RESULT_ATTRS=()
 
 # 工具函数
 log() { echo -e "$*" | tee -a "$LOG_FILE"; }
 die() { log "❌ $*"; exit 1; }
 
+# 记录一个阶段的耗时和退出码（写入 summary.json）
+timed() {
+    local name="$1" started=$(date +%s) rc=0
+    shift
+    "$@" || rc=$?
+    PHASES+=("$name:$(( $(date +%s) - started )):$rc")
+    return $rc
+}
+
+json_str() {
+    local s="$1"
+    s="${s//\\/\\\\}"
+    s="${s//\"/\\\"}"
+    s="${s//$'\t'/\\t}"
+    s="${s//$'\r'/\\r}"
+    s="${s//$'\n'/\\n}"
+    printf '"%s"' "$s"
+}
+
+json_num() { [[ "$1" =~ ^-?[0-9]+$ ]] && printf '%s' "$1" || printf '0'; }
+
 show_help() {
 cat <<EOF
 用法:
@@ -36,7 +74,8 @@ cat <<EOF
 可选参数:
   --device-args ARGS        设备参数, 格式：[-s DEVICE1] 或 [--shard-count 2 -s DEVICE1 -s DEVICE2...]
   --no-retry                禁用失败自动重试
-  --copy-remote             测试结果拷贝到远端 
+  --copy-remote             测试结果拷贝到远端（运行中后台增量同步日志，结束后后台完成拷贝）
+  --no-dedup                拷贝时禁用内容去重（直接 rsync 完整目录）
   --help                    显示帮助
 
 示例:
@@ -112,6 +151,11 @@ parse_args() {
                 log "✅ 启用结果拷贝到远程"
                 shift
                 ;;
+            --no-dedup)
+                CAS_DEDUP="false"
+                log "✅ 禁用拷贝去重"
+                shift
+                ;;
             -*)
                 die "未知参数: $1"
                 ;;
@@ -210,20 +254,58 @@ run_tradefed() {
     local exit_code=${PIPESTATUS[0]}
     log "⏱️ 结束时间: $(date)"
     log "📊 退出代码: $exit_code"
+    locate_output_dirs
     return $exit_code
 }
 
+# 一次扫描日志，取最后一次运行的 LOG/RESULT DIRECTORY
+locate_output_dirs() {
+    local dirs
+    dirs=$(awk -F': ' '/LOG DIRECTORY/ {l=$2} /RESULT DIRECTORY/ {r=$2}
+        END { split(l, a, " "); split(r, b, " "); print a[1] "\t" b[1] }' "$LOG_FILE")
+    LOGS_DIR="${dirs%%$'\t'*}"
+    RESULT_DIR="${dirs#*$'\t'}"
+}
+
+# 读取 test_result.xml 中 <Result>/<Summary> 的属性，读到 <Summary> 即停止
+read_result_counts() {
+    local xml="$RESULT_DIR/test_result.xml" key value
+    RESULT_ATTRS=()
+    if [[ -n "$RESULT_DIR" && -f "$xml" ]]; then
+        while IFS=$'\t' read -r key value; do
+            RESULT_ATTRS["$key"]="$value"
+        done < <(awk '
+            function attrs(tag,   s, kv, eq) {
+                s = substr($0, index($0, "<" tag " ")); s = substr(s, 1, index(s, ">"))
+                while (match(s, /[a-z_]+="[^"]*"/)) {
+                    kv = substr(s, RSTART, RLENGTH); s = substr(s, RSTART + RLENGTH)
+                    eq = index(kv, "=")
+                    print substr(kv, 1, eq - 1) "\t" substr(kv, eq + 2, length(kv) - eq - 2)
+                }
+            }
+            /<Result / { attrs("Result") }
+            /<Summary / { attrs("Summary"); exit }
+        ' "$xml")
+        PASS_COUNT="${RESULT_ATTRS[pass]:-0}"
+        FAIL_COUNT="${RESULT_ATTRS[failed]:-0}"
+    else
+        read -r PASS_COUNT FAIL_COUNT < <(awk '/^PASSED[[:space:]]+:/ {p=$NF} /^FAILED[[:space:]]+:/ {f=$NF}
+            END { print (p == "" ? 0 : p), (f == "" ? 0 : f) }' "$LOG_FILE")
+    fi
+}
+
 ## 重新测试
 retry_if_needed() {
     (( FAIL_COUNT == 0 )) && return 0
     [[ "$RETRY_FAIL" != "true" ]] && return 0
 
-    if run_tradefed "retry"; then
+    RETRY_ROUNDS=$((RETRY_ROUNDS + 1))
+    if timed retry run_tradefed "retry"; then
         log "✅ retry成功"
         return 0
     else
         log "❌ 自动重试失败，回退完整重跑..."
-        run_tradefed "run"
+        timed run run_tradefed "run"
     fi
 }
 
@@ -232,40 +314,91 @@ analyze_result() {
     log "🔍 解析结果..."
     cd "$SUITE_PATH" || die "无法进入测试套件目录 $SUITE_PATH"
 
-    local result_dir=$(awk -F': ' '/RESULT DIRECTORY/ {d=$2} END{print d}' "$LOG_FILE" | awk '{print $1}')
-    [[ -d "$result_dir" ]] || die "未找到 RESULT DIRECTORY"
-    log "📁 结果目录: ${result_dir:-<none>}"
-    RESULT_TIMESTAMP=$(basename "$result_dir")
+    [[ -d "$RESULT_DIR" ]] || die "未找到 RESULT DIRECTORY"
+    log "📁 结果目录: ${RESULT_DIR:-<none>}"
+    RESULT_TIMESTAMP=$(basename "$RESULT_DIR")
 
-    if [[ -f "$result_dir/test_result.xml" ]]; then
-        PASS_COUNT=$(grep -o 'pass="[0-9]*"' "$result_dir/test_result.xml" | head -1 | sed 's/pass="//; s/"//')
-        FAIL_COUNT=$(grep -o 'failed="[0-9]*"' "$result_dir/test_result.xml" | head -1 | sed 's/failed="//; s/"//')
-    else
-        PASS_COUNT=$(awk '/^PASSED[[:space:]]+:/ {print $2}' "$LOG_FILE")
-        FAIL_COUNT=$(awk '/^FAILED[[:space:]]+:/ {print $2}' "$LOG_FILE")
-    fi
+    read_result_counts
     log "📊 测试结果: PASS: $PASS_COUNT  FAIL: $FAIL_COUNT"
 }
 
-## 远程拷贝
-copy_to_remote_server() {
-    if [[ "$COPY_TO_REMOTE" != "true" ]]; then
-        log "📤 远程拷贝已禁用"
-        return 0
-    fi
-
-    local logs_dir=$(awk -F': ' '/LOG DIRECTORY/ {d=$2} END{print d}' "$LOG_FILE" | awk '{print $1}')
-    local result_dir=$(awk -F': ' '/RESULT DIRECTORY/ {d=$2} END{print d}' "$LOG_FILE" | awk '{print $1}')
-    [[ -z "$logs_dir" || -z "$result_dir" ]] && die "未找到 RESULT DIRECTORY"
-    log "📁 日志目录: ${logs_dir:-<none>}"
-    log "📁 结果目录: ${result_dir:-<none>}"
-
-    local timestamp=$(basename "$result_dir")
-    [[ -n "$timestamp" ]] || die "无法获取 RESULT_TIMESTAMP"
+## 去重拷贝
+# 远端 gms_test_results/.cas/<前两位>/<sha256> 每份内容只保存一次，
+# 运行目录中的文件都是指向 .cas 的硬链接，.manifest 记录 "sha256  相对路径"
+cas_copy() {
+    local results_root="$1" timestamp="$2"
+    shift 2
+    local remote="${REMOTE_USER}@${REMOTE_HOST}"
+    local work
+    work=$(mktemp -d) || return 1
+
+    # 1. 本地并行计算哈希，后拷贝的目录覆盖同名文件（与 rsync 行为一致）
+    local src
+    : > "$work/sources"
+    for src in "$@"; do
+        [[ -d "$src" ]] || continue
+        (cd "$src" && find . -type f -print0 | xargs -0 -r -P "$(nproc)" -n 64 sha256sum) \
+            | sed 's#  \./#  #' | while IFS= read -r line; do
+                printf '%s\t%s\n' "$src" "$line"
+            done >> "$work/sources" || { rm -rf "$work"; return 1; }
+    done
+    awk -F'\t' '{ print $2 }' "$work/sources" > "$work/manifest"
+    [[ -s "$work/manifest" ]] || { rm -rf "$work"; return 1; }
+
+    # 2. 一次 SSH 查询远端缺少的内容
+    cut -d' ' -f1 "$work/manifest" | sort -u \
+        | remote_ssh "cas='$results_root/.cas'; mkdir -p \"\$cas\"; while read -r h; do [ -e \"\$cas/\${h:0:2}/\$h\" ] || echo \"\$h\"; done" \
+        > "$work/missing" || { rm -rf "$work"; return 1; }
+
+    # 3. 只上传缺少的内容：以哈希命名的符号链接目录，rsync -L 传输实际文件
+    mkdir -p "$work/blobs"
+    awk -F'\t' 'NR == FNR { need[$1] = 1; next }
+        { split($2, parts, "  "); h = parts[1]; if ((h in need) && !(h in seen)) { seen[h] = 1; print h "\t" $1 "/" substr($2, length(h) + 3) } }' \
+        "$work/missing" "$work/sources" | while IFS=$'\t' read -r h path; do
+            ln -s "$path" "$work/blobs/$h"
+        done
+    cp "$work/manifest" "$work/blobs/.manifest"
+
+    local total unique
+    total=$(wc -l < "$work/manifest")
+    unique=$(wc -l < "$work/missing")
+    log "📦 去重: 共 $total 个文件，需上传 $unique 个新内容"
+
+    rsync -aLz --chmod=Fu=rw,Fgo=r "$work/blobs/" "${remote}:${results_root}/.cas/.incoming/${timestamp}/" \
+        2>&1 | tee -a "$LOG_FILE"
+    [[ ${PIPESTATUS[0]} -eq 0 ]] || { rm -rf "$work"; return 1; }
+    rm -rf "$work"
+
+    # 4. 远端入库并按 manifest 建立硬链接
+    remote_ssh "bash -s -- '$results_root' '$timestamp'" <<'REMOTE_EOF' 2>&1 | tee -a "$LOG_FILE"
+set -e
+root="$1"; ts="$2"
+cas="$root/.cas"; inc="$cas/.incoming/$ts"; run="$root/$ts"
+mkdir -p "$run"
+for blob in "$inc"/*; do
+    [ -f "$blob" ] || continue
+    h=$(basename "$blob")
+    mkdir -p "$cas/${h:0:2}"
+    if [ -e "$cas/${h:0:2}/$h" ]; then rm -f "$blob"; else mv "$blob" "$cas/${h:0:2}/$h"; fi
+done
+while IFS= read -r line; do
+    h="${line%%  *}"; p="${line#*  }"
+    mkdir -p "$run/$(dirname "$p")"
+    ln -f "$cas/${h:0:2}/$h" "$run/$p"
+done < "$inc/.manifest"
+mv "$inc/.manifest" "$run/.manifest"
+rmdir "$inc"
+REMOTE_EOF
+    return ${PIPESTATUS[0]}
+}
 
-    local remote_target_dir="/home/$REMOTE_USER/gms_test_results/$timestamp"
-    log "🌐 本地主机: ${REMOTE_USER}@${REMOTE_HOST}:${remote_target_dir}"
+## 结果同步
+# 测试运行期间后台周期性增量同步当前运行的日志目录；测试结束后以独立会话完成最终同步，
+# 脚本不再等待拷贝完成
+remote_ssh() { ssh $SSH_OPTS "${REMOTE_USER}@${REMOTE_HOST}" "$@"; }
 
+# 路由和 SSH 每次运行只检查一次，之后的 ssh/rsync 复用同一条主连接
+prepare_remote_sync() {
     # 添加路由
     #######################################
     # Ubuntu主机执行下面命令免密
@@ -280,26 +413,162 @@ copy_to_remote_server() {
         }
     fi
 
-    # 验证 SSH 连接
-    if ! ssh -o BatchMode=yes -o ConnectTimeout=5 \
-            "${REMOTE_USER}@${REMOTE_HOST}" "echo 'OK' >/dev/null" 2>/dev/null; then
+    REMOTE_ROOT="/home/$REMOTE_USER/gms_test_results"
+    if ! remote_ssh "mkdir -p '$REMOTE_ROOT'" 2>/dev/null; then
         log "❌ 无法连接远程服务器（检查网络和SSH免密）"
         return 1
     fi
+    log "🌐 本地主机: ${REMOTE_USER}@${REMOTE_HOST}:${REMOTE_ROOT}"
+}
 
-    # 创建远程目录
-    ssh "${REMOTE_USER}@${REMOTE_HOST}" "mkdir -p '$remote_target_dir'" 2>&1 | tee -a "$LOG_FILE"
+# 增量同步一个目录（按大小和修改时间跳过已同步文件），额外参数传给 rsync
+sync_tree() {
+    local src="$1" dest="$2" label="$3" stats
+    shift 3
+    [[ -d "$src" ]] || return 0
+    stats=$(rsync -az --partial --stats --chmod=Du=rwx,Dgo=rx,Fu=rw,Fgo=r "$@" \
+        "$src/" "${REMOTE_USER}@${REMOTE_HOST}:${dest}/" 2>>"$LOG_FILE") || {
+        log "❌ 同步失败: $label"
+        return 1
+    }
+    log "📤 $label: $(awk -F': ' '/^Number of regular files transferred/ {n=$2} /^Total transferred file size/ {s=$2}
+        END { print "传输 " n " 个文件, " s }' <<< "$stats")"
+}
+
+mark_sync_run() { grep -qxF "$1" "$SYNC_STATE/runs" 2>/dev/null || echo "$1" >> "$SYNC_STATE/runs"; }
+
+start_live_sync() {
+    [[ "$COPY_TO_REMOTE" == "true" ]] || return 0
+    prepare_remote_sync || { COPY_TO_REMOTE="false"; return 0; }
+    SYNC_STATE=$(mktemp -d /tmp/gms_sync.XXXXXX)
+    LOGS_ROOT="$(cd "$SUITE_PATH/.." && pwd)/logs"
+    RESULTS_ROOT="$(cd "$SUITE_PATH/.." && pwd)/results"
+    touch "$SYNC_STATE/started"
+    (
+        while [[ ! -e "$SYNC_STATE/stop" ]]; do
+            ts=$(find "$LOGS_ROOT" -mindepth 1 -maxdepth 1 -type d -newer "$SYNC_STATE/started" -printf '%f\n' 2>/dev/null \
+                | sort | tail -n 1) || true
+            if [[ -n "$ts" ]]; then
+                mark_sync_run "$ts"
+                sync_tree "$LOGS_ROOT/$ts" "$REMOTE_ROOT/$ts" "实时同步 $ts" || true
+            fi
+            for ((i = 0; i < SYNC_INTERVAL; i++)); do
+                [[ -e "$SYNC_STATE/stop" ]] && break
+                sleep 1
+            done
+        done
+    ) &
+    LIVE_SYNC_PID=$!
+    log "📤 已启动后台实时同步（每 ${SYNC_INTERVAL}s）"
+}
+
+stop_live_sync() {
+    [[ -n "$LIVE_SYNC_PID" ]] || return 0
+    touch "$SYNC_STATE/stop"
+    wait "$LIVE_SYNC_PID" 2>/dev/null || true
+    LIVE_SYNC_PID=""
+}
+
+start_final_sync() {
+    if [[ "$COPY_TO_REMOTE" != "true" ]]; then
+        log "📤 远程拷贝已禁用"
+        return 0
+    fi
+    stop_live_sync
+    if [[ -n "$RESULT_DIR" ]]; then
+        LOGS_ROOT=$(dirname "${LOGS_DIR:-$LOGS_ROOT/x}")
+        RESULTS_ROOT=$(dirname "$RESULT_DIR")
+        mark_sync_run "$(basename "$RESULT_DIR")"
+    fi
+    [[ -s "$SYNC_STATE/runs" ]] || { log "❌ 未找到 RESULT DIRECTORY，跳过拷贝"; return 1; }
 
-    log "📤 开始拷贝: $remote_target_dir"
-    for src in "$logs_dir" "$result_dir"; do
-        if [[ -d "$src" ]]; then
-            rsync -avz --chmod=Du=rwx,Dgo=rx,Fu=rw,Fgo=r \
-                "$src/" \
-                "${REMOTE_USER}@${REMOTE_HOST}:${remote_target_dir}/" \
-                2>&1 | tee -a "$LOG_FILE"
+    declare -p REMOTE_USER REMOTE_HOST REMOTE_ROOT LOGS_ROOT RESULTS_ROOT RESULT_DIR CAS_DEDUP LOG_FILE > "$SYNC_STATE/env"
+    setsid bash "$SCRIPT_PATH" --sync-stage "$SYNC_STATE" $$ </dev/null >/dev/null 2>&1 &
+    log "📤 后台拷贝到 ${REMOTE_USER}@${REMOTE_HOST}:${REMOTE_ROOT}（进度见 $LOG_FILE）"
+}
+
+# 独立会话中执行：日志和结果两棵目录树并行同步，结束后更新并上传 summary.json
+sync_stage() {
+    local state="$1" parent="$2" started=$(date +%s) rc=0 ts pid
+    local pids=()
+    # 等主进程退出写完 summary.json，避免与结果目录的哈希计算交错
+    while kill -0 "$parent" 2>/dev/null; do sleep 1; done
+
+    while read -r ts; do
+        sync_tree "$LOGS_ROOT/$ts" "$REMOTE_ROOT/$ts" "日志 $ts" &
+        pids+=($!)
+        if [[ "$CAS_DEDUP" == "true" ]]; then
+            { cas_copy "$REMOTE_ROOT" "$ts" "$RESULTS_ROOT/$ts" || {
+                log "⚠️ 去重拷贝失败，回退完整 rsync"
+                sync_tree "$RESULTS_ROOT/$ts" "$REMOTE_ROOT/$ts" "结果 $ts" --checksum
+            }; } &
+        else
+            sync_tree "$RESULTS_ROOT/$ts" "$REMOTE_ROOT/$ts" "结果 $ts" --checksum &
         fi
+        pids+=($!)
+    done < "$state/runs"
+    for pid in "${pids[@]}"; do
+        wait "$pid" || rc=1
+    done
+    local result="done"
+    (( rc == 0 )) || result="failed"
+    log "$([[ $rc -eq 0 ]] && echo "✅ 拷贝完成" || echo "❌ 拷贝未完成"): ${REMOTE_USER}@${REMOTE_HOST}:${REMOTE_ROOT} ($(( $(date +%s) - started ))s)"
+
+    local summary="$RESULT_DIR/summary.json"
+    if [[ -n "$RESULT_DIR" && -f "$summary" ]]; then
+        sed "s/\"sync\": \"pending\"}\$/\"sync\": \"$result\", \"sync_seconds\": $(( $(date +%s) - started ))}/" \
+            "$summary" > "$summary.tmp" && mv -f "$summary.tmp" "$summary"
+        ts=$(basename "$RESULT_DIR")
+        remote_ssh "cat > '$REMOTE_ROOT/$ts/.summary.json.tmp' && mv -f '$REMOTE_ROOT/$ts/.summary.json.tmp' '$REMOTE_ROOT/$ts/summary.json'" \
+            < "$summary" 2>/dev/null || log "⚠️ 运行摘要同步失败"
+    fi
+    rm -rf "$state"
+    return $rc
+}
+
+## 运行摘要
+# 退出时把运行信息、计数、目录、各阶段耗时写成单行 summary.json（先写临时文件再 mv），
+# 后台拷贝完成后由 sync_stage 同步到远程结果目录；启动器和报告索引只读这个文件
+write_summary() {
+    local exit_code="$1"
+    local target="${LOG_FILE%.log}.summary.json"
+    [[ -n "$RESULT_DIR" && -d "$RESULT_DIR" ]] && target="$RESULT_DIR/summary.json"
+    read_result_counts 2>/dev/null || true
+
+    local phases="" phase name rest
+    for phase in "${PHASES[@]}"; do
+        name="${phase%%:*}"; rest="${phase#*:}"
+        phases+="${phases:+, }{\"name\": $(json_str "$name"), \"seconds\": $(json_num "${rest%%:*}"), \"exit_code\": $(json_num "${rest#*:}")}"
     done
-    log "✅ 拷贝完成: ${REMOTE_USER}@${REMOTE_HOST}:${remote_target_dir}"
+
+    local finished=$(date +%s)
+    {
+        printf '{"version": 1'
+        printf ', "timestamp": %s' "$(json_str "$(basename "${RESULT_DIR:-}")")"
+        printf ', "test_type": %s, "mode": %s' "$(json_str "${Test_Type:-}")" "$(json_str "$MODE")"
+        printf ', "module": %s, "case": %s' "$(json_str "${Test_Module:-}")" "$(json_str "${Test_Case:-}")"
+        printf ', "device_args": %s, "suite_path": %s' "$(json_str "$DEVICE_ARGS")" "$(json_str "$SUITE_PATH")"
+        printf ', "suite_name": %s, "suite_version": %s' "$(json_str "${RESULT_ATTRS[suite_name]:-}")" "$(json_str "${RESULT_ATTRS[suite_version]:-}")"
+        printf ', "start_display": %s, "end_display": %s' "$(json_str "${RESULT_ATTRS[start_display]:-}")" "$(json_str "${RESULT_ATTRS[end_display]:-}")"
+        printf ', "result_dir": %s, "logs_dir": %s, "log_file": %s' "$(json_str "$RESULT_DIR")" "$(json_str "$LOGS_DIR")" "$(json_str "$LOG_FILE")"
+        printf ', "started_at": %s, "finished_at": %s, "duration": %s' "$RUN_STARTED" "$finished" "$((finished - RUN_STARTED))"
+        printf ', "exit_code": %s, "pass": %s, "failed": %s' "$(json_num "$exit_code")" "$(json_num "$PASS_COUNT")" "$(json_num "$FAIL_COUNT")"
+        printf ', "modules_done": %s, "modules_total": %s' "$(json_num "${RESULT_ATTRS[modules_done]:-0}")" "$(json_num "${RESULT_ATTRS[modules_total]:-0}")"
+        printf ', "retry_rounds": %s, "phases": [%s]' "$RETRY_ROUNDS" "$phases"
+        if [[ "$COPY_TO_REMOTE" == "true" ]]; then
+            # 后台拷贝结束后由 sync_stage 改写为 done/failed
+            printf ', "remote": %s, "sync": "pending"}\n' "$(json_str "${REMOTE_USER}@${REMOTE_HOST}:${REMOTE_ROOT}/$(basename "${RESULT_DIR:-}")")"
+        else
+            printf ', "remote": null, "sync": "disabled"}\n'
+        fi
+    } > "$target.tmp" && mv -f "$target.tmp" "$target" || { rm -f "$target.tmp"; return 0; }
+    log "📄 运行摘要: $target"
+}
+
+on_exit() {
+    local exit_code="$1"
+    stop_live_sync
+    write_summary "$exit_code"
 }
 
 ## 主函数
@@ -314,25 +583,33 @@ main() {
     log "🌐 本地主机: ${REMOTE_USER}@${REMOTE_HOST}"
     log "📋 日志文件: $LOG_FILE"
     log "========================================"
+    trap 'on_exit $?' EXIT
+    start_live_sync
 
     if [[ "$MODE" == "retry" ]]; then
-        run_tradefed "retry"
-        copy_to_remote_server
-        exit $?
+        local rc=0
+        timed retry run_tradefed "retry" || rc=$?
+        start_final_sync
+        exit $rc
     fi
     
-    if run_tradefed "run"; then
+    if timed run run_tradefed "run"; then
         analyze_result
         retry_if_needed
-        copy_to_remote_server
         log "✅ GMS 测试成功完成"
+        start_final_sync
     else
         log "❌ GMS 测试执行失败"
-        copy_to_remote_server
+        start_final_sync
         exit 1
     fi
 }
 
 if [[ "${BASH_SOURCE[0]}" == "${0}" ]]; then
-    main "$@"
+    if [[ "${1:-}" == "--sync-stage" ]]; then
+        source "$2/env"
+        sync_stage "$2" "$3"
+    else
+        main "$@"
+    fi
 fi
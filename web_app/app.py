@@ -7,17 +7,37 @@ import subprocess
 import threading
 import time
 import queue
+import re
 import configparser
 import socket
 import shlex
 import traceback
 import uuid
+import hashlib
+import gzip
+import io
+import zlib
+import shutil
+import fnmatch
+import posixpath
+import mmap
+import bisect
+import sqlite3
+import struct
+import zipfile
+import weakref
+import xml.etree.ElementTree as ET
+from array import array
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify, Response, session
+from flask import Flask, render_template, request, jsonify, Response, session, send_file, stream_with_context
 from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
 from functools import wraps
+from itertools import islice
 import paramiko
 from paramiko import AuthenticationException, SSHException
+from sftp_transfer import (
+    UPLOAD_VERIFY_SCRIPT, IMAGE_CACHE_MIN_SIZE, cached_sftp_put, image_cache_link, image_cache_add)
 
 # Flask 应用
 app = Flask(__name__)
@@ -151,7 +171,7 @@ def get_user_state():
     with user_states_lock:
         if client_id not in user_states:
             user_states[client_id] = {
-                'running': False, 'devices': [], 'logs': [],
+                'running': False, 'devices': [], 'log_store': RunLogStore(None), 'state_version': 0,
                 'ssh_connected': False, 'log_file': None,
                 'test_type': 'cts', 'created_at': datetime.now().isoformat(),
                 'client_id': client_id
@@ -182,6 +202,7 @@ def cleanup_old_sessions():
             (now - datetime.fromisoformat(state['created_at'])) > timedelta(hours=24)
         ]
         for cid in expired_sessions:
+            user_states[cid]['log_store'].close()
             del user_states[cid]
 
 # 后台清理任务（每小时）
@@ -197,13 +218,20 @@ def emit_to_user(client_id, event, data):
     """向指定用户发送 Socket.IO 消息"""
     socketio.emit(event, data, room=client_id)
 
+def log_room(client_id, device=None):
+    """测试输出日志房间：不指定设备时为全部输出，否则为单台设备/分片"""
+    return f"{client_id}#logs:{device}" if device else f"{client_id}#logs"
+
 def append_user_log(client_id, log_message):
-    """添加用户日志"""
-    with user_states_lock:
-        if client_id in user_states:
-            user_states[client_id]['logs'].append(log_message)
-            return True
-    return False
+    """添加用户日志（带时间戳存档）并推送给该用户，返回日志序号"""
+    user_state = get_user_state_by_id(client_id)
+    if not user_state:
+        return None
+    seq = user_state['log_store'].append(f"[{datetime.now().strftime('%H:%M:%S')}] {log_message}")
+    socketio.emit('log_update', {'log': log_message, 'seq': seq}, room=client_id)
+    broadcast_run_log(user_state, {'log': log_message, 'seq': seq})
+    notify_status_changed()
+    return seq
 
 def set_user_running(client_id, running):
     """设置用户测试运行状态"""
@@ -213,13 +241,102 @@ def set_user_running(client_id, running):
             return True
     return False
 
+# ==================== State Sync ====================
+# 每个客户端的状态快照带版本号，变化时通过 Socket.IO 推送；
+# /api/status 用 ETag + 长轮询服务无 Socket.IO 的客户端
+STATUS_LONG_POLL_MAX = 30
+status_changed = threading.Condition()
+
+def notify_status_changed():
+    """唤醒等待状态变化的长轮询请求"""
+    with status_changed:
+        status_changed.notify_all()
+
+def build_state_snapshot(user_state):
+    """当前用户状态快照（不含日志内容）"""
+    store = user_state['log_store']
+    demux = user_state.get('log_demux')
+    return {
+        'version': user_state.get('state_version', 0),
+        'running': user_state['running'],
+        'devices': user_state['devices'],
+        'test_type': user_state.get('test_type'),
+        'run_id': user_state.get('run_id'),
+        'next_seq': store.next_seq,
+        'first_seq': store.first_seq,
+        'streams': demux.streams() if demux else {}
+    }
+
+def status_etag(user_state, device=''):
+    """状态版本 + 日志游标组成的 ETag"""
+    store = user_state['log_store']
+    return f'W/"{user_state.get("state_version", 0)}-{store.next_seq}-{store.first_seq}-{device}"'
+
+def publish_user_state(client_id):
+    """状态变化时递增版本号并推送快照"""
+    user_state = get_user_state_by_id(client_id)
+    if not user_state:
+        return
+    with user_states_lock:
+        user_state['state_version'] = user_state.get('state_version', 0) + 1
+    socketio.emit('state_snapshot', build_state_snapshot(user_state), room=client_id)
+    notify_status_changed()
+
+# ==================== Shared Run Rooms ====================
+# 每次运行一个 Socket.IO 房间，任意数量的观察者加入后共享同一路推送
+RUN_BACKLOG_LINES = 200         # 观察者加入时默认回放的日志行数
+RUN_BACKLOG_LIMIT = 1000        # 单次回放的最大行数
+active_runs = {}                # run_id -> 运行信息
+active_runs_lock = threading.Lock()
+
+def run_room(run_id):
+    """测试运行的观察者房间名"""
+    return f"run:{run_id}"
+
+def begin_shared_run(client_id, user_state, test_type, devices):
+    """登记正在进行的运行，供其他用户观察"""
+    run_id = user_state.get('run_id')
+    with active_runs_lock:
+        active_runs[run_id] = {
+            'run_id': run_id,
+            'owner': client_id,
+            'test_type': test_type,
+            'devices': list(devices),
+            'started_at': datetime.now().isoformat(),
+            'store': user_state['log_store'],
+        }
+    return run_id
+
+def end_shared_run(user_state, exit_code=None):
+    """运行结束：通知观察者并注销"""
+    run_id = user_state.get('run_id')
+    with active_runs_lock:
+        run = active_runs.pop(run_id, None)
+    if run:
+        socketio.emit('run_complete', {'run_id': run_id, 'exit_code': exit_code,
+                                       'summary': user_state.get('run_summary')}, room=run_room(run_id))
+
+def broadcast_run_log(user_state, payload):
+    """把一行日志推送到运行房间（每个房间只发送一次，与观察者数量无关）"""
+    run_id = user_state.get('run_id')
+    if run_id in active_runs:
+        socketio.emit('run_log', dict(payload, run_id=run_id), room=run_room(run_id))
+
+def count_run_observers(run_id):
+    """当前加入运行房间的连接数"""
+    try:
+        return sum(1 for _ in socketio.server.manager.get_participants('/', run_room(run_id)))
+    except (KeyError, AttributeError):
+        return 0
+
 # Socket.IO 事件处理
 @socketio.on('connect')
 def handle_connect():
     """客户端连接"""
     client_id = get_client_id()
     join_room(client_id)
-    emit('connected', {'client_id': client_id})
+    join_room(log_room(client_id))
+    emit('connected', {'client_id': client_id, 'data': 'Connected to GMS Auto Test Server'})
 
 @socketio.on('disconnect')
 def handle_disconnect():
@@ -344,45 +461,1002 @@ def save_dynamic_config(dynamic_config):
         return False
 
 # ==================== Test Log Management ====================
-def save_test_logs(test_type, client_id, exit_code=None):
-    """保存测试日志到文件"""
-    user_state = get_user_state_by_id(client_id)
-    if not user_state:
-        print(f"[ERROR] Session {client_id} not found")
-        return None
+# 测试日志在运行过程中持续写入 logs/ 目录：缓冲写入 + 定期 fsync，
+# 并维护 .idx 行偏移索引；进程崩溃或被杀时已写入的日志依然保留
+LOGS_DIR = os.path.join(os.path.dirname(__file__), 'logs')
+LOG_TAIL_RING_SIZE = 2000      # 内存中保留的最近日志行数
+LOG_FETCH_LIMIT = 1000         # 单次增量拉取的最大行数
+LOG_WRITE_BUFFER = 64 * 1024   # 日志文件写缓冲大小
+LOG_FSYNC_INTERVAL = 2.0       # 两次 fsync 之间的最长间隔（秒）
+
+# 行偏移索引文件 (<log>.idx)：16 字节文件头 + 每 stride 行一个 uint64 文件偏移
+LOG_INDEX_MAGIC = b'GMSLIDX1'
+LOG_INDEX_STRIDE = 1024
+LOG_INDEX_HEADER = struct.Struct('<8sII')   # magic, stride, reserved
+LOG_INDEX_ENTRY = struct.Struct('<Q')
+
+
+def log_index_path(log_path):
+    """日志文件对应的行偏移索引路径"""
+    return log_path + '.idx'
+
+
+def read_indexed_lines(log_path, line_no, limit):
+    """借助 .idx 索引从第 line_no 行（0 起）开始读取至多 limit 行
+
+    定位只需读一个索引项并跳过不超过 stride-1 行，与文件大小无关。
+    """
+    with open(log_index_path(log_path), 'rb') as idx:
+        magic, stride, _ = LOG_INDEX_HEADER.unpack(idx.read(LOG_INDEX_HEADER.size))
+        if magic != LOG_INDEX_MAGIC:
+            raise ValueError(f"Invalid log index: {log_index_path(log_path)}")
+        block, skip = divmod(line_no, stride)
+        idx.seek(LOG_INDEX_HEADER.size + block * LOG_INDEX_ENTRY.size)
+        entry = idx.read(LOG_INDEX_ENTRY.size)
+        if len(entry) < LOG_INDEX_ENTRY.size:
+            return []
+        offset, = LOG_INDEX_ENTRY.unpack(entry)
+
+    lines = []
+    with open(log_path, 'rb') as f:
+        f.seek(offset)
+        for _ in range(skip):
+            if not f.readline():
+                return []
+        for _ in range(limit):
+            line = f.readline()
+            if not line:
+                break
+            lines.append(line.decode('utf-8', errors='replace').rstrip('\n'))
+    return lines
+
+
+class RunLogStore:
+    """单次测试运行的日志存储
+
+    每行日志分配一个单调递增的序号 (seq)，客户端用序号作为增量拉取游标。
+    内存只保留最近 LOG_TAIL_RING_SIZE 行，更早的日志通过行偏移索引从磁盘读取。
+    清除日志只前移 first_seq，不重置序号，因此已有游标不会失效。
+    """
+
+    def __init__(self, run_id, path=None, start_seq=0, header=None, ring_size=LOG_TAIL_RING_SIZE):
+        self.run_id = run_id
+        self.path = path
+        self.first_seq = start_seq     # 当前可读取的最早序号
+        self.next_seq = start_seq      # 下一行日志的序号
+        self._base_seq = start_seq     # 文件中第一行日志对应的序号
+        self._disk_end_seq = start_seq # 已写入文件的日志序号上界
+        self._ring = deque(maxlen=ring_size)   # [(seq, entry)]
+        self._file = None
+        self._index_file = None
+        self._offset = 0
+        self._lines = 0                # 文件已写入的物理行数（含文件头）
+        self._data_line = 0            # 第一行日志所在的物理行号
+        self._last_sync = time.time()
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._file = open(path, 'wb', buffering=LOG_WRITE_BUFFER)
+            self._index_file = open(log_index_path(path), 'wb', buffering=LOG_WRITE_BUFFER)
+            self._index_file.write(LOG_INDEX_HEADER.pack(LOG_INDEX_MAGIC, LOG_INDEX_STRIDE, 0))
+            for line in header or []:
+                self._write_line(line)
+            self._data_line = self._lines
+            self._sync_locked()
+
+    def _write_line(self, text):
+        """写入一行到日志文件并维护行偏移索引（调用方持有锁）"""
+        data = (text.replace('\n', ' ') + '\n').encode('utf-8', errors='replace')
+        if self._lines % LOG_INDEX_STRIDE == 0:
+            self._index_file.write(LOG_INDEX_ENTRY.pack(self._offset))
+        self._file.write(data)
+        self._offset += len(data)
+        self._lines += 1
+
+    def _sync_locked(self):
+        """刷新缓冲并落盘（调用方持有锁）"""
+        if not self._file:
+            return
+        self._file.flush()
+        self._index_file.flush()
+        os.fsync(self._file.fileno())
+        os.fsync(self._index_file.fileno())
+        self._last_sync = time.time()
+
+    def sync(self):
+        """刷新缓冲并 fsync，由后台线程定期调用"""
+        with self._lock:
+            self._sync_locked()
+
+    def append(self, entry):
+        """追加一行日志，返回其序号"""
+        with self._lock:
+            seq = self.next_seq
+            if self._file:
+                self._write_line(entry)
+                self._disk_end_seq = seq + 1
+                if time.time() - self._last_sync >= LOG_FSYNC_INTERVAL:
+                    self._sync_locked()
+            self._ring.append((seq, entry))
+            self.next_seq += 1
+            return seq
+
+    def clear(self):
+        """清除日志（只影响查看，磁盘上的完整日志保留；序号继续递增）"""
+        with self._lock:
+            self.first_seq = self.next_seq
+            self._ring.clear()
+
+    def tail(self, limit=50):
+        """返回最近 limit 行日志"""
+        with self._lock:
+            return [entry for _, entry in islice(self._ring, max(len(self._ring) - limit, 0), None)]
+
+    def read(self, since, limit=LOG_FETCH_LIMIT):
+        """从序号 since 开始读取至多 limit 行，返回 (entries, next_cursor)"""
+        with self._lock:
+            since = max(since, self.first_seq)
+            if since >= self.next_seq:
+                return [], self.next_seq
+
+            ring_start = self._ring[0][0] if self._ring else self.next_seq
+            if since >= ring_start:
+                start = since - ring_start
+                entries = [entry for _, entry in islice(self._ring, start, start + limit)]
+            elif self.path and since < self._disk_end_seq:
+                if self._file:
+                    self._file.flush()
+                    self._index_file.flush()
+                line_no = self._data_line + since - self._base_seq
+                entries = read_indexed_lines(self.path, line_no, min(limit, ring_start - since))
+            else:
+                # 早于环形缓冲区且不在磁盘上的日志已丢弃，从最早可用处继续
+                since = ring_start
+                entries = [entry for _, entry in islice(self._ring, 0, limit)]
+            return entries, since + len(entries)
+
+    def iter_entries(self):
+        """按顺序遍历 first_seq 之后的全部日志"""
+        cursor = self.first_seq
+        while True:
+            entries, cursor = self.read(cursor)
+            if not entries:
+                return
+            yield from entries
+
+    def finalize(self, footer=None):
+        """写入结尾信息并落盘关闭文件；之后追加的日志只保留在内存中"""
+        with self._lock:
+            if not self._file:
+                return None
+            for line in footer or []:
+                self._write_line(line)
+            self._sync_locked()
+            self._file.close()
+            self._index_file.close()
+            self._file = self._index_file = None
+            return self.path
+
+    def close(self):
+        """关闭文件（不写结尾信息）"""
+        with self._lock:
+            if self._file:
+                self._sync_locked()
+                self._file.close()
+                self._index_file.close()
+                self._file = self._index_file = None
+
+
+# 仍在写入中的日志存储，由后台线程定期 fsync，并让搜索索引从上次位置读取新落盘的行
+active_log_stores = weakref.WeakSet()
+
+def log_sync_task():
+    while True:
+        time.sleep(LOG_FSYNC_INTERVAL)
+        for store in list(active_log_stores):
+            try:
+                store.sync()
+                if store.path:
+                    log_search_index.index_file(store.path)
+            except Exception as e:
+                print(f"[ERROR] 日志落盘失败: {e}")
+
+threading.Thread(target=log_sync_task, daemon=True).start()
 
-    # 创建 logs 目录
-    logs_dir = os.path.join(os.path.dirname(__file__), 'logs')
-    os.makedirs(logs_dir, exist_ok=True)
 
-    # 生成日志文件名（带时间戳和用户标识）
+def start_run_log_store(user_state, test_type, client_id):
+    """为新的测试运行创建日志文件，序号接续上一次运行以保持客户端游标有效"""
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     user_short_id = client_id[:8]
     log_filename = f"{test_type}_{timestamp}_{user_short_id}.log"
-    log_path = os.path.join(logs_dir, log_filename)
+    run_id = f"{timestamp}_{uuid.uuid4().hex[:8]}"
+
+    previous = user_state.get('log_store')
+    store = RunLogStore(
+        run_id,
+        path=os.path.join(LOGS_DIR, log_filename),
+        start_seq=previous.next_seq if previous else 0,
+        header=[
+            f"GMS 测试日志 - {test_type.upper()}",
+            f"开始时间: {timestamp}",
+            f"用户ID: {user_short_id}",
+            "=" * 80,
+            "",
+        ]
+    )
+    active_log_stores.add(store)
+    if previous:
+        previous.close()
+        active_log_stores.discard(previous)
 
-    try:
-        with open(log_path, 'w', encoding='utf-8') as f:
-            f.write(f"GMS 测试日志 - {test_type.upper()}\n")
-            f.write(f"保存时间: {timestamp}\n")
-            f.write(f"用户ID: {user_short_id}\n")
-            f.write(f"退出代码: {exit_code if exit_code is not None else '未知'}\n")
-            f.write("=" * 80 + "\n\n")
+    user_state['log_store'] = store
+    user_state['run_id'] = run_id
+    user_state['log_file'] = store.path
+    return store
 
-            # 写入所有日志条目
-            for log_entry in user_state['logs']:
-                f.write(log_entry + '\n')
 
-        # 更新 user_state
+def save_test_logs(test_type, client_id, exit_code=None):
+    """结束本次运行的日志文件（日志已在运行中持续写入，这里只追加结尾信息）"""
+    user_state = get_user_state_by_id(client_id)
+    if not user_state:
+        print(f"[ERROR] Session {client_id} not found")
+        return None
+
+    store = user_state['log_store']
+    try:
+        log_path = store.finalize([
+            "",
+            "=" * 80,
+            f"退出代码: {exit_code if exit_code is not None else '未知'}",
+            f"结束时间: {datetime.now().strftime('%Y%m%d_%H%M%S')}",
+        ])
+        active_log_stores.discard(store)
+        if not log_path:
+            return None
+        log_search_index.index_file(log_path)
+
         with user_states_lock:
             user_state['log_file'] = log_path
-
         return log_path
 
     except Exception as e:
         print(f"[ERROR] 保存日志失败: {e}")
         return None
 
+# ==================== Per-Device Log Streams ====================
+# 分片测试 (--shard-count N) 时所有设备的输出交错在一起，这里按设备/分片拆分
+DEVICE_LOG_RING_SIZE = 5000   # 每个设备流保留的最近行数
+HOST_LOG_STREAM = 'host'      # 无法归属到设备的行（tradefed 主机输出、脚本输出）
+
+# tradefed 日志行头: "01-12 14:36:17 I/ModuleListener: ..."
+TRADEFED_HEADER_RE = re.compile(r'^\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)? [VDIWEF]/')
+TRADEFED_SHARD_RE = re.compile(r'\bshard[\s_#-]*(?:index[\s:=]*)?(\d+)\b', re.IGNORECASE)
+
+
+class DeviceLogDemux:
+    """按 tradefed 行前缀把测试输出拆分为每台设备（或分片）的日志流
+
+    - 带 tradefed 行头且包含设备序列号的行归属该设备
+    - 只出现分片编号的行归属已知的分片->设备映射，否则归属 shard-N
+    - 不带行头的续行（堆栈等）沿用上一行的归属
+    """
+
+    def __init__(self, devices, ring_size=DEVICE_LOG_RING_SIZE):
+        self.devices = list(devices or [])
+        self.ring_size = ring_size
+        self._serial_re = None
+        if self.devices:
+            serials = sorted(self.devices, key=len, reverse=True)
+            self._serial_re = re.compile(
+                r'(?<![\w.:-])(' + '|'.join(re.escape(d) for d in serials) + r')(?![\w.:-])')
+        self._shard_devices = {}   # {shard_index: device}
+        self._last_stream = HOST_LOG_STREAM
+        self._rings = {}           # {stream: deque[(position, entry)]}
+        self._index = {}           # {stream: {'count', 'first_seen', 'last_seen'}}
+        self._lock = threading.Lock()
+
+    def classify(self, line):
+        """返回行所属的日志流名称（设备序列号 / shard-N / host）"""
+        if not TRADEFED_HEADER_RE.match(line):
+            return self._last_stream
+
+        serial_match = self._serial_re.search(line) if self._serial_re else None
+        shard_match = TRADEFED_SHARD_RE.search(line)
+
+        if serial_match:
+            stream = serial_match.group(1)
+            if shard_match:
+                self._shard_devices[int(shard_match.group(1))] = stream
+        elif shard_match:
+            shard = int(shard_match.group(1))
+            stream = self._shard_devices.get(shard, f"shard-{shard}")
+        else:
+            stream = HOST_LOG_STREAM
+
+        self._last_stream = stream
+        return stream
+
+    def append(self, line, entry, seq):
+        """记录一行输出，entry 为带时间戳的存档文本，seq 为全局日志序号
+
+        返回 (所属流名称, 是否为新出现的流)
+        """
+        with self._lock:
+            stream = self.classify(line)
+            now = datetime.now().isoformat()
+            new_stream = stream not in self._index
+            info = self._index.setdefault(stream, {'count': 0, 'first_seen': now, 'last_seen': now})
+            ring = self._rings.setdefault(stream, deque(maxlen=self.ring_size))
+            ring.append((seq, entry))
+            info['count'] += 1
+            info['last_seq'] = seq
+            info['last_seen'] = now
+            return stream, new_stream
+
+    def streams(self):
+        """返回日志流索引 {stream: {count, last_seq, first_seen, last_seen}}"""
+        with self._lock:
+            return {stream: dict(info) for stream, info in self._index.items()}
+
+    def tail(self, stream, since=None, limit=50):
+        """获取某个流的日志，since 为全局日志序号游标；返回 (logs, next_seq)"""
+        with self._lock:
+            ring = self._rings.get(stream)
+            if not ring:
+                return [], (since or 0)
+            next_seq = ring[-1][0] + 1
+            if since is not None:
+                return [entry for seq, entry in ring if seq >= since], max(since, next_seq)
+            return [entry for _, entry in list(ring)[-limit:]], next_seq
+
+
+def publish_test_output(client_id, user_state, log_line, prefix):
+    """记录一行测试输出，并只推送给订阅了全部输出或该设备的客户端"""
+    entry = f"{prefix}{log_line}"
+    seq = user_state['log_store'].append(entry)
+
+    demux = user_state.get('log_demux')
+    stream, new_stream = demux.append(log_line, entry, seq) if demux else (HOST_LOG_STREAM, False)
+
+    payload = {'log': log_line, 'device': stream, 'seq': seq}
+    socketio.emit('log_update', payload, room=log_room(client_id))
+    socketio.emit('log_update', payload, room=log_room(client_id, stream))
+    broadcast_run_log(user_state, payload)
+    if new_stream:
+        publish_user_state(client_id)
+    else:
+        notify_status_changed()
+
+# ==================== Log Search Index ====================
+# 基于 SQLite FTS5 的全文索引，覆盖 logs/ 下的测试日志和远端 tradefed host_log
+LOG_SEARCH_DB = os.path.join(LOGS_DIR, 'log_search.db')
+LOG_SEARCH_BATCH = 500         # 每个事务最多写入的行数
+LOG_SEARCH_QUEUE_SIZE = 10000  # 待写队列上限，满时提交方阻塞等待写线程
+LOG_SEARCH_MAX_RESULTS = 200
+
+
+class LogSearchIndex:
+    """增量全文索引：所有写操作经有界队列交给单个后台线程批量提交
+
+    log_sources 记录每个日志源已索引的行数和字节数，重启后从断点继续索引。
+    运行中的本地日志不逐行入队，而是由写线程按保存的偏移批量读取磁盘文件。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._queue = queue.Queue(maxsize=LOG_SEARCH_QUEUE_SIZE)
+        self._pending_files = set()    # 已入队尚未处理的本地文件，重复提交时合并
+        self._pending_lock = threading.Lock()
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        """启动后台写线程，并补建 logs/ 下尚未索引的日志"""
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._writer, daemon=True, name='log_search_index').start()
+        self.scan()
+
+    def scan(self):
+        """提交一次 logs/ 目录补建（只索引新增部分）"""
+        self._queue.put(('scan',))
+
+    def add_line(self, source, line_no, text, end_offset, kind='local'):
+        """提交一行日志；end_offset 为该行结束处的文件偏移，用于断点续建"""
+        self._queue.put(('line', source, kind, line_no, text, end_offset))
+
+    def index_file(self, path):
+        """提交一个本地日志文件，从上次索引位置继续；同一文件尚未处理时不重复入队"""
+        with self._pending_lock:
+            if path in self._pending_files:
+                return
+            self._pending_files.add(path)
+        self._queue.put(('file', path))
+
+    def set_source_mtime(self, source, mtime, kind='local'):
+        """记录日志源索引完成时的 mtime（远端 .gz 据此判断是否需要重建）"""
+        self._queue.put(('mtime', source, kind, mtime))
+
+    def flush(self, timeout=None):
+        """等待此前提交的写操作全部提交到数据库"""
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        return done.wait(timeout)
+
+    def remove_source(self, source):
+        self._queue.put(('remove', source))
+
+    def rename_source(self, old_source, new_source):
+        self._queue.put(('rename', old_source, new_source))
+
+    def source_state(self, source):
+        """返回 (indexed_lines, indexed_bytes, mtime)，未索引时为 None"""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT indexed_lines, indexed_bytes, mtime FROM log_sources WHERE name = ?",
+                (source,)).fetchone()
+        finally:
+            conn.close()
+
+    # ---------- 写线程 ----------
+    def _writer(self):
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS log_sources (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL,
+                kind TEXT NOT NULL,
+                indexed_lines INTEGER NOT NULL DEFAULT 0,
+                indexed_bytes INTEGER NOT NULL DEFAULT 0,
+                mtime REAL NOT NULL DEFAULT 0,
+                updated_at TEXT
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS log_lines USING fts5(
+                content, source_id UNINDEXED, line_no UNINDEXED, tokenize='unicode61'
+            );
+        """)
+        source_ids = {}
+        while True:
+            items = [self._queue.get()]
+            while len(items) < LOG_SEARCH_BATCH:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    for item in items:
+                        self._apply(conn, source_ids, item)
+            except Exception as e:
+                print(f"[LOG_SEARCH] 索引写入失败: {e}")
+                source_ids.clear()
+            finally:
+                for item in items:
+                    if item[0] == 'flush':
+                        item[1].set()
+
+    def _source_id(self, conn, source_ids, source, kind):
+        if source not in source_ids:
+            conn.execute("INSERT OR IGNORE INTO log_sources (name, kind) VALUES (?, ?)", (source, kind))
+            source_ids[source] = conn.execute(
+                "SELECT id FROM log_sources WHERE name = ?", (source,)).fetchone()[0]
+        return source_ids[source]
+
+    def _apply(self, conn, source_ids, item):
+        op = item[0]
+        if op == 'line':
+            _, source, kind, line_no, text, end_offset = item
+            source_id = self._source_id(conn, source_ids, source, kind)
+            conn.execute("INSERT INTO log_lines (content, source_id, line_no) VALUES (?, ?, ?)",
+                         (text, source_id, line_no))
+            conn.execute(
+                "UPDATE log_sources SET indexed_lines = MAX(indexed_lines, ?), "
+                "indexed_bytes = MAX(indexed_bytes, ?), updated_at = ? WHERE id = ?",
+                (line_no + 1, end_offset, datetime.now().isoformat(), source_id))
+        elif op == 'mtime':
+            _, source, kind, mtime = item
+            conn.execute("UPDATE log_sources SET mtime = ?, updated_at = ? WHERE id = ?",
+                         (mtime, datetime.now().isoformat(), self._source_id(conn, source_ids, source, kind)))
+        elif op == 'file':
+            # 先移出待处理集合：索引期间新落盘的行会再次入队，不会漏掉
+            with self._pending_lock:
+                self._pending_files.discard(item[1])
+            self._index_local_file(conn, source_ids, item[1])
+        elif op == 'scan':
+            if os.path.isdir(LOGS_DIR):
+                for filename in sorted(os.listdir(LOGS_DIR)):
+                    if filename.endswith('.log'):
+                        self._index_local_file(conn, source_ids, os.path.join(LOGS_DIR, filename))
+        elif op == 'remove':
+            row = conn.execute("SELECT id FROM log_sources WHERE name = ?", (item[1],)).fetchone()
+            if row:
+                conn.execute("DELETE FROM log_lines WHERE source_id = ?", (row[0],))
+                conn.execute("DELETE FROM log_sources WHERE id = ?", (row[0],))
+            source_ids.pop(item[1], None)
+        elif op == 'rename':
+            conn.execute("UPDATE log_sources SET name = ? WHERE name = ?", (item[2], item[1]))
+            source_ids.pop(item[1], None)
+
+    def _index_local_file(self, conn, source_ids, path):
+        """从上次索引的字节位置继续索引本地日志文件"""
+        source = os.path.basename(path)
+        if not os.path.exists(path):
+            return
+        stat = os.stat(path)
+        source_id = self._source_id(conn, source_ids, source, 'local')
+        line_no, offset = conn.execute(
+            "SELECT indexed_lines, indexed_bytes FROM log_sources WHERE id = ?", (source_id,)).fetchone()
+        if offset >= stat.st_size:
+            return
+
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            rows = []
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    break   # 未写完的最后一行，下次再索引
+                offset += len(raw)
+                text = raw.decode('utf-8', errors='replace').rstrip('\n')
+                if text.strip():
+                    rows.append((text, source_id, line_no))
+                line_no += 1
+                if len(rows) >= LOG_SEARCH_BATCH:
+                    conn.executemany("INSERT INTO log_lines (content, source_id, line_no) VALUES (?, ?, ?)", rows)
+                    rows = []
+            if rows:
+                conn.executemany("INSERT INTO log_lines (content, source_id, line_no) VALUES (?, ?, ?)", rows)
+        conn.execute(
+            "UPDATE log_sources SET indexed_lines = ?, indexed_bytes = ?, mtime = ?, updated_at = ? WHERE id = ?",
+            (line_no, offset, stat.st_mtime, datetime.now().isoformat(), source_id))
+
+    # ---------- 查询 ----------
+    @staticmethod
+    def build_match_query(text):
+        """把用户输入转成 FTS5 查询：每个词按短语匹配，词之间为 AND"""
+        terms = [t for t in text.split() if t]
+        return ' '.join('"' + t.replace('"', '""') + '"' for t in terms)
+
+    def search(self, text, kind=None, limit=50):
+        """返回按日志源分组的匹配结果"""
+        match = self.build_match_query(text)
+        if not match:
+            return []
+        conn = self._connect()
+        try:
+            kind_filter = "AND s.kind = ?" if kind else ""
+            params = [match] + ([kind] if kind else [])
+
+            counts = conn.execute(f"""
+                SELECT s.id, s.name, s.kind, COUNT(*) FROM log_lines l
+                JOIN log_sources s ON s.id = l.source_id
+                WHERE log_lines MATCH ? {kind_filter}
+                GROUP BY s.id ORDER BY s.name DESC
+            """, params).fetchall()
+
+            hits = conn.execute(f"""
+                SELECT l.source_id, l.line_no, snippet(log_lines, 0, '[[', ']]', '…', 24)
+                FROM log_lines l JOIN log_sources s ON s.id = l.source_id
+                WHERE log_lines MATCH ? {kind_filter}
+                ORDER BY rank LIMIT ?
+            """, params + [limit]).fetchall()
+        finally:
+            conn.close()
+
+        lines_by_source = {}
+        for source_id, line_no, snippet in hits:
+            lines_by_source.setdefault(source_id, []).append({'line': line_no, 'snippet': snippet})
+
+        return [{
+            'source': name,
+            'kind': source_kind,
+            'matches': count,
+            'lines': sorted(lines_by_source.get(source_id, []), key=lambda x: x['line'])
+        } for source_id, name, source_kind, count in counts]
+
+
+log_search_index = LogSearchIndex(LOG_SEARCH_DB)
+log_search_index.start()
+remote_host_index_lock = threading.Lock()
+
+
+def index_remote_host_logs(config):
+    """增量索引远端 gms_test_results 下的 tradefed host_log（在后台线程调用，同一时间只运行一遍）"""
+    with remote_host_index_lock:
+        return _index_remote_host_logs(config)
+
+
+def _index_remote_host_logs(config):
+    ssh = get_ssh_connection(config)
+    if not ssh:
+        print("[LOG_SEARCH] SSH connection failed, skip remote host logs")
+        return 0
+
+    indexed = 0
+    try:
+        results_base = f"/home/{config.get('ubuntu_user', 'hcq')}/gms_test_results"
+        list_cmd = (f"find '{results_base}' -type f -name 'host_log*' "
+                    f"-printf '%s %T@ %P\\n' 2>/dev/null")
+        output, _, _ = execute_ssh_command(ssh, list_cmd, timeout=60)
+
+        sftp = ssh.open_sftp()
+        try:
+            for line in output.splitlines():
+                parts = line.split(' ', 2)
+                if len(parts) < 3:
+                    continue
+                size, mtime, rel_path = int(parts[0]), float(parts[1]), parts[2]
+                source = f"remote:{rel_path}"
+                state = log_search_index.source_state(source)
+                line_no, offset = (state[0], state[1]) if state else (0, 0)
+                compressed = rel_path.endswith('.gz')
+
+                if compressed and state and state[2] and state[2] >= mtime:
+                    continue
+                if not compressed and offset >= size:
+                    continue
+
+                with sftp.open(f"{results_base}/{rel_path}", 'rb') as remote_file:
+                    reader = open_remote_reader(remote_file, size)
+                    if compressed:
+                        # 压缩文件无法按偏移续读，只在首次或文件更新时整体索引
+                        log_search_index.remove_source(source)
+                        stream, line_no, offset = gzip.GzipFile(fileobj=reader), 0, 0
+                    else:
+                        reader.seek(offset)
+                        stream = reader
+                    for raw in stream:
+                        if not raw.endswith(b'\n') and not compressed:
+                            break
+                        offset += len(raw)
+                        text = raw.decode('utf-8', errors='replace').rstrip('\n')
+                        if text.strip():
+                            log_search_index.add_line(source, line_no, text, offset, kind='remote')
+                        line_no += 1
+                log_search_index.set_source_mtime(source, mtime, kind='remote')
+                indexed += 1
+        finally:
+            sftp.close()
+            # 本遍的写入全部提交后再释放锁，下一遍读到的断点才是最新的
+            log_search_index.flush()
+        return_ssh_connection(ssh)
+    except Exception as e:
+        print(f"[LOG_SEARCH] Error indexing remote host logs: {e}")
+        ssh.close()
+    return indexed
+
+
+# ==================== Log Retention ====================
+# 后台任务：压缩旧日志为 .log.gz，并按保留天数和总大小清理 logs/ 目录
+LOG_STREAM_CHUNK = 256 * 1024
+LOG_MAINTENANCE_INTERVAL = 3600
+LOG_SIZE_MANIFEST = os.path.join(LOGS_DIR, '.compressed.json')   # {filename: 原始大小}
+log_manifest_lock = threading.Lock()
+
+
+def resolve_log_path(filename):
+    """把客户端传入的文件名解析为 logs/ 下的路径，拒绝目录穿越"""
+    if not filename or os.path.basename(filename) != filename:
+        raise ValueError(f"Invalid log filename: {filename}")
+    if not (filename.endswith('.log') or filename.endswith('.log.gz')):
+        raise ValueError(f"Not a log file: {filename}")
+    return os.path.join(LOGS_DIR, filename)
+
+
+def iter_saved_logs():
+    """遍历 logs/ 下的日志文件，返回 (filename, path, stat)"""
+    if not os.path.isdir(LOGS_DIR):
+        return
+    for filename in os.listdir(LOGS_DIR):
+        if filename.endswith('.log') or filename.endswith('.log.gz'):
+            path = os.path.join(LOGS_DIR, filename)
+            try:
+                yield filename, path, os.stat(path)
+            except FileNotFoundError:
+                continue
+
+
+def load_log_size_manifest():
+    try:
+        with open(LOG_SIZE_MANIFEST, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def gzip_uncompressed_size(path, manifest=None):
+    """压缩日志的原始大小：优先取压缩时记录的值，否则读 gzip 尾部 ISIZE（批量调用时传入已加载的 manifest）"""
+    if manifest is None:
+        manifest = load_log_size_manifest()
+    size = manifest.get(os.path.basename(path))
+    if size is not None:
+        return size
+    with open(path, 'rb') as f:
+        f.seek(-4, os.SEEK_END)
+        return struct.unpack('<I', f.read(4))[0]
+
+
+def iter_gzip_file(path, chunk_size=LOG_STREAM_CHUNK):
+    """边读边压缩，按块产出 gzip 数据"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+    yield compressor.flush()
+
+
+def iter_decompressed_file(path, chunk_size=LOG_STREAM_CHUNK):
+    """边读边解压 .gz 文件"""
+    with gzip.open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def compress_log_file(path):
+    """把日志压缩为 .log.gz（保留修改时间），并同步搜索索引中的名称"""
+    gz_path = path + '.gz'
+    tmp_path = gz_path + '.tmp'
+    stat = os.stat(path)
+    with open(path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, LOG_STREAM_CHUNK)
+    os.utime(tmp_path, (stat.st_atime, stat.st_mtime))
+    os.replace(tmp_path, gz_path)
+
+    with log_manifest_lock:
+        manifest = load_log_size_manifest()
+        manifest[os.path.basename(gz_path)] = stat.st_size
+        with open(LOG_SIZE_MANIFEST, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+
+    os.remove(path)
+    if os.path.exists(log_index_path(path)):
+        os.remove(log_index_path(path))
+    log_search_index.rename_source(os.path.basename(path), os.path.basename(gz_path))
+    return gz_path
+
+
+def remove_log_file(path):
+    """删除日志及其索引、压缩记录"""
+    filename = os.path.basename(path)
+    for victim in (path, log_index_path(path)):
+        if os.path.exists(victim):
+            os.remove(victim)
+    with log_manifest_lock:
+        manifest = load_log_size_manifest()
+        if manifest.pop(filename, None) is not None:
+            with open(LOG_SIZE_MANIFEST, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+    log_search_index.remove_source(filename)
+
+
+def run_log_maintenance(config):
+    """压缩超过 log_compress_days 天的日志，并按天数/总大小执行保留策略"""
+    compress_after = config.get('log_compress_days', 3) * 86400
+    retention = config.get('log_retention_days', 90) * 86400
+    max_bytes = config.get('log_retention_max_mb', 5120) * 1024 * 1024
+    active_paths = {store.path for store in list(active_log_stores)}
+    now = time.time()
+
+    for filename, path, stat in list(iter_saved_logs()):
+        if path in active_paths or filename.endswith('.gz'):
+            continue
+        if now - stat.st_mtime > compress_after:
+            try:
+                compress_log_file(path)
+            except Exception as e:
+                print(f"[LOG_RETENTION] 压缩日志失败 {filename}: {e}")
+
+    # 从最旧的开始删除：超过保留天数，或总大小超出预算
+    logs = sorted(iter_saved_logs(), key=lambda item: item[2].st_mtime)
+    total = sum(stat.st_size for _, _, stat in logs)
+    for filename, path, stat in logs:
+        if path in active_paths:
+            continue
+        if now - stat.st_mtime > retention or total > max_bytes:
+            remove_log_file(path)
+            total -= stat.st_size
+            print(f"[LOG_RETENTION] 已删除过期日志: {filename}")
+
+
+def log_maintenance_task():
+    while True:
+        time.sleep(LOG_MAINTENANCE_INTERVAL)
+        try:
+            run_log_maintenance(load_config())
+            cleanup_log_view_cache()
+        except Exception as e:
+            print(f"[LOG_RETENTION] Error: {e}")
+
+threading.Thread(target=log_maintenance_task, daemon=True).start()
+
+
+# ==================== Log Viewer ====================
+# 超大日志的分页查看：mmap 映射日志文件，借助 .idx 行偏移索引按行号随机访问
+LOG_VIEW_MAX_LIMIT = 2000
+LOG_VIEW_CACHE_DIR = os.path.join(LOGS_DIR, '.cache')   # .log.gz 解压后的查看缓存
+LOG_VIEW_CACHE_TTL = 86400
+LOG_ERROR_PATTERN = re.compile(rb'ERROR|FAILED|Exception|' + re.escape('❌'.encode('utf-8')))
+LOG_TIMESTAMP_RE = re.compile(rb'\[(\d{2}:\d{2}:\d{2})\]')
+LOG_TIMESTAMP_PROBE_LINES = 64   # 在索引块内寻找时间戳时最多查看的行数
+
+
+def build_log_index(log_path):
+    """为日志文件生成 .idx 行偏移索引（与运行中写入的格式相同）"""
+    index_path = log_index_path(log_path)
+    tmp_path = index_path + '.tmp'
+    with open(log_path, 'rb') as f, open(tmp_path, 'wb', buffering=LOG_WRITE_BUFFER) as idx:
+        idx.write(LOG_INDEX_HEADER.pack(LOG_INDEX_MAGIC, LOG_INDEX_STRIDE, 0))
+        offset = 0
+        for line_no, line in enumerate(f):
+            if line_no % LOG_INDEX_STRIDE == 0:
+                idx.write(LOG_INDEX_ENTRY.pack(offset))
+            offset += len(line)
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+def materialize_log(path):
+    """返回可 mmap 的日志路径：.log.gz 先解压到查看缓存（只做一次）"""
+    if not path.endswith('.gz'):
+        return path
+    os.makedirs(LOG_VIEW_CACHE_DIR, exist_ok=True)
+    cache_path = os.path.join(LOG_VIEW_CACHE_DIR, os.path.basename(path)[:-3])
+    if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(path):
+        tmp_path = cache_path + '.tmp'
+        with gzip.open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, LOG_STREAM_CHUNK)
+        os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def cleanup_log_view_cache():
+    """删除长时间未使用的解压缓存"""
+    if not os.path.isdir(LOG_VIEW_CACHE_DIR):
+        return
+    now = time.time()
+    for filename in os.listdir(LOG_VIEW_CACHE_DIR):
+        path = os.path.join(LOG_VIEW_CACHE_DIR, filename)
+        if filename.endswith('.log') and now - os.path.getatime(path) > LOG_VIEW_CACHE_TTL:
+            os.remove(path)
+            if os.path.exists(log_index_path(path)):
+                os.remove(log_index_path(path))
+
+
+class IndexedLogView:
+    """日志文件的只读随机访问视图
+
+    定位任意行只需一次索引查找并在 mmap 中跳过不超过 stride-1 行，
+    耗时与文件大小无关。
+    """
+
+    def __init__(self, path, active=False):
+        self.path = path
+        index_path = log_index_path(path)
+        # 运行中的日志索引由写入方实时维护；其他文件缺索引或已过期时重建
+        if not os.path.exists(index_path) or (
+                not active and os.path.getmtime(index_path) < os.path.getmtime(path)):
+            build_log_index(path)
+
+        with open(index_path, 'rb') as idx:
+            magic, self.stride, _ = LOG_INDEX_HEADER.unpack(idx.read(LOG_INDEX_HEADER.size))
+            if magic != LOG_INDEX_MAGIC:
+                raise ValueError(f"Invalid log index: {index_path}")
+            self._offsets = array('Q')
+            data = idx.read()
+            self._offsets.frombytes(data[:len(data) - len(data) % LOG_INDEX_ENTRY.size])
+
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+    def close(self):
+        if self._mm:
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def total_lines(self):
+        """总行数：最后一个索引块之前的行数 + 最后一块内的行数"""
+        if not self._mm or not self._offsets:
+            return 0
+        last_block = len(self._offsets) - 1
+        tail_start = self._offsets[last_block]
+        tail = self._mm[tail_start:self.size]
+        count = tail.count(b'\n')
+        if tail and not tail.endswith(b'\n'):
+            count += 1
+        return last_block * self.stride + count
+
+    def line_offset(self, line_no):
+        """第 line_no 行的起始偏移，超出范围返回 None"""
+        block, skip = divmod(line_no, self.stride)
+        if not self._mm or line_no < 0 or block >= len(self._offsets):
+            return None
+        pos = self._offsets[block]
+        for _ in range(skip):
+            pos = self._mm.find(b'\n', pos, self.size) + 1
+            if pos == 0 or pos >= self.size:
+                return None
+        return pos
+
+    def line_of_offset(self, pos):
+        """文件偏移所在的行号"""
+        block = bisect.bisect_right(self._offsets, pos) - 1
+        return block * self.stride + self._mm[self._offsets[block]:pos].count(b'\n')
+
+    def lines(self, start, limit):
+        """读取从 start 开始的至多 limit 行，返回 [{'line', 'text'}]"""
+        pos = self.line_offset(start)
+        result = []
+        while pos is not None and pos < self.size and len(result) < limit:
+            end = self._mm.find(b'\n', pos, self.size)
+            end = self.size if end == -1 else end
+            result.append({'line': start + len(result),
+                           'text': self._mm[pos:end].decode('utf-8', errors='replace')})
+            pos = end + 1
+        return result
+
+    def find_next(self, pattern, from_line):
+        """从 from_line 起（含）查找下一处匹配，返回行号或 None"""
+        pos = self.line_offset(from_line)
+        if pos is None:
+            return None
+        match = pattern.search(self._mm, pos)
+        return self.line_of_offset(match.start()) if match else None
+
+    def _block_timestamp(self, block):
+        """索引块开头附近第一条日志的 [HH:MM:SS] 时间戳"""
+        pos = self._offsets[block]
+        window_end = pos
+        for _ in range(LOG_TIMESTAMP_PROBE_LINES):
+            window_end = self._mm.find(b'\n', window_end, self.size) + 1
+            if window_end == 0:
+                window_end = self.size
+                break
+        match = LOG_TIMESTAMP_RE.search(self._mm, pos, window_end)
+        return match.group(1).decode() if match else None
+
+    def find_timestamp(self, timestamp):
+        """二分索引块定位到第一条时间戳 >= timestamp 的日志行"""
+        if not self._mm or not self._offsets:
+            return None
+        lo, hi = 0, len(self._offsets) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            block_ts = self._block_timestamp(mid)
+            if block_ts is not None and block_ts > timestamp:
+                hi = mid - 1
+            else:
+                lo = mid
+        for entry in self.lines(lo * self.stride, self.stride * 2):
+            match = LOG_TIMESTAMP_RE.search(entry['text'].encode('utf-8'))
+            if match and match.group(1).decode() >= timestamp:
+                return entry['line']
+        return None
+
+
 # ==================== SSH Connection Management ====================
 def create_ssh_connection(config):
     """Create and return a new SSH connection"""
@@ -546,14 +1620,21 @@ def run_test_suite(config, test_params, client_id):
     config['device_host'] = client_id
 
     user_state['running'] = True
-    user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] Starting test suite...")
-    socketio.emit('log_update', {'log': 'Starting test suite...'}, room=client_id)
+    start_run_log_store(user_state, test_params.get('test_type', 'cts'), client_id)
+    user_state['log_demux'] = DeviceLogDemux(test_params.get('devices', []))
+    begin_shared_run(client_id, user_state, test_params.get('test_type', 'cts'), test_params.get('devices', []))
+    publish_user_state(client_id)
+    append_user_log(client_id, "Starting test suite...")
+    exit_status = None
+    user_state['run_summary'] = None
 
     try:
         ssh = get_ssh_connection(config)
         if not ssh:
-            user_state['logs'].append("[ERROR] Failed to establish SSH connection")
+            append_user_log(client_id, "[ERROR] Failed to establish SSH connection")
             user_state['running'] = False
+            end_shared_run(user_state)
+            publish_user_state(client_id)
             return
 
         # Step 1: Upload script to remote server
@@ -564,15 +1645,16 @@ def run_test_suite(config, test_params, client_id):
         remote_script = os.path.join(suites_path, 'run_GMS_Test_Auto.sh')
 
         if not os.path.exists(local_script):
-            user_state['logs'].append(f"[ERROR] Local script not found: {local_script}")
+            append_user_log(client_id, f"[ERROR] Local script not found: {local_script}")
             user_state['running'] = False
+            end_shared_run(user_state)
+            publish_user_state(client_id)
             return
 
         # Upload script via SFTP
         script_size = os.path.getsize(local_script)
         size_kb = script_size / 1024
-        user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] 📤 上传文件: run_GMS_Test_Auto.sh → {remote_script} ({size_kb:.2f}KB)")
-        socketio.emit('log_update', {'log': f"📤 上传文件: run_GMS_Test_Auto.sh → {remote_script} ({size_kb:.2f}KB)"}, room=client_id)
+        append_user_log(client_id, f"📤 上传文件: run_GMS_Test_Auto.sh → {remote_script} ({size_kb:.2f}KB)")
 
         try:
             sftp = ssh.open_sftp()
@@ -583,19 +1665,18 @@ def run_test_suite(config, test_params, client_id):
             chmod_cmd = f"chmod +x '{remote_script}'"
             execute_ssh_command(ssh, chmod_cmd)
 
-            user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] 🔐 已设置可执行权限: {remote_script}")
-            socketio.emit('log_update', {'log': f"🔐 已设置可执行权限: {remote_script}"}, room=client_id)
-            user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] ✅ 上传完成 ({size_kb:.2f}KB)")
-            socketio.emit('log_update', {'log': f"✅ 上传完成 ({size_kb:.2f}KB)"}, room=client_id)
+            append_user_log(client_id, f"🔐 已设置可执行权限: {remote_script}")
+            append_user_log(client_id, f"✅ 上传完成 ({size_kb:.2f}KB)")
 
         except Exception as e:
-            user_state['logs'].append(f"[ERROR] Failed to upload script: {str(e)}")
+            append_user_log(client_id, f"[ERROR] Failed to upload script: {str(e)}")
             user_state['running'] = False
+            end_shared_run(user_state)
+            publish_user_state(client_id)
             return_ssh_connection(ssh)
             return
 
-        user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] ✅ SSH 连接成功")
-        socketio.emit('log_update', {'log': '✅ SSH 连接成功'}, room=client_id)
+        append_user_log(client_id, "✅ SSH 连接成功")
 
         # Extract parameters
         test_type = test_params.get('test_type', 'cts')
@@ -613,50 +1694,48 @@ def run_test_suite(config, test_params, client_id):
         if retry_dir:
             timestamp = os.path.basename(retry_dir.strip().rstrip('/'))
             cmd_parts.extend([test_type, "retry", timestamp])
-            user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] Retry mode: {timestamp}")
+            append_user_log(client_id, f"Retry mode: {timestamp}")
         else:
             cmd_parts.append(test_type)
             if test_module:
                 cmd_parts.append(test_module)
-                user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] Test module: {test_module}")
+                append_user_log(client_id, f"Test module: {test_module}")
             if test_case:
                 cmd_parts.append(test_case)
-                user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] Test case: {test_case}")
+                append_user_log(client_id, f"Test case: {test_case}")
 
         # Add device arguments
         if devices:
             device_args_list = []
             if len(devices) > 1:
                 device_args_list.extend(["--shard-count", str(len(devices))])
-                user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] Sharding across {len(devices)} devices")
+                append_user_log(client_id, f"Sharding across {len(devices)} devices")
             for device in devices:
                 device_args_list.extend(["-s", device])
 
             device_args_str = " ".join(device_args_list)
             cmd_parts.extend(["--device-args", device_args_str])
-            user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] Devices: {', '.join(devices)}")
+            append_user_log(client_id, f"Devices: {', '.join(devices)}")
 
         # Add test suite path
         if test_suite:
             cmd_parts.extend(["--test-suite", test_suite])
-            user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] 📂 测试套件: {test_suite}")
-            socketio.emit('log_update', {'log': f"📂 测试套件: {test_suite}"}, room=client_id)
+            append_user_log(client_id, f"📂 测试套件: {test_suite}")
 
         # Add local server
         if local_server:
             cmd_parts.extend(["--local-server", local_server])
-            user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] 🌐 本地主机: {local_server}")
-            socketio.emit('log_update', {'log': f"🌐 本地主机: {local_server}"}, room=client_id)
+            append_user_log(client_id, f"🌐 本地主机: {local_server}")
 
         # Build final command
         command = ' '.join(shlex.quote(part) for part in cmd_parts)
         command = f"cd {os.path.dirname(remote_script)} && {command}"
 
-        user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] 🚀 执行命令: {command}")
-        socketio.emit('log_update', {'log': f"🚀 执行命令: {command}"}, room=client_id)
+        append_user_log(client_id, f"🚀 执行命令: {command}")
 
         # Execute with real-time output (matching GUI.py logic)
         stdin, stdout, stderr = ssh.exec_command(command, get_pty=True)
+        summary_path = None
 
         # Real-time output reading loop (matching GUI lines 2420-2429)
         while not stdout.channel.exit_status_ready() and user_state['running']:
@@ -665,44 +1744,54 @@ def run_test_suite(config, test_params, client_id):
                 if data:
                     for line in data.splitlines():
                         if line.strip():
-                            log_line = line.strip()
-                            # Send raw log line to frontend (without timestamp prefix)
-                            socketio.emit('log_update', {'log': log_line}, room=client_id)
-                            # Store with timestamp for history
-                            user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] {log_line}")
+                            match = RUN_SUMMARY_RE.search(line)
+                            if match:
+                                summary_path = match.group(1)
+                            # Send raw log line to frontend, store with timestamp for history
+                            publish_test_output(client_id, user_state, line.strip(),
+                                                f"[{datetime.now().strftime('%H:%M:%S')}] ")
 
             if stderr.channel.recv_stderr_ready():
                 error = stderr.channel.recv_stderr(4096).decode('utf-8', errors='replace')
                 if error:
                     for line in error.splitlines():
                         if line.strip():
-                            log_line = line.strip()
-                            socketio.emit('log_update', {'log': log_line}, room=client_id)
-                            user_state['logs'].append(f"[STDERR] {log_line}")
+                            publish_test_output(client_id, user_state, line.strip(), "[STDERR] ")
 
             time.sleep(0.1)
 
         # Get final exit status
         exit_status = stdout.channel.recv_exit_status()
+
+        # 结果计数直接取运行脚本写出的 summary.json，不再解析日志和 XML
+        run_summary = None
+        if summary_path:
+            try:
+                run_summary = load_run_summary(ssh, summary_path)
+            except Exception as e:
+                append_user_log(client_id, f"⚠️ 读取运行摘要失败: {e}")
         return_ssh_connection(ssh)
+        user_state['run_summary'] = run_summary
+        if run_summary:
+            append_user_log(client_id, f"📊 测试结果: PASS: {run_summary.get('pass', 0)}  FAIL: {run_summary.get('failed', 0)}  "
+                                       f"模块: {run_summary.get('modules_done', 0)}/{run_summary.get('modules_total', 0)}  "
+                                       f"重试: {run_summary.get('retry_rounds', 0)} 次  用时: {run_summary.get('duration', 0)}s")
 
         if exit_status == 0:
-            user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] ✅ Test completed successfully")
-            socketio.emit('log_update', {'log': f"✅ Test completed successfully (exit code: {exit_status})"}, room=client_id)
+            append_user_log(client_id, f"✅ Test completed successfully (exit code: {exit_status})")
         else:
-            user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] ❌ Test failed with exit code {exit_status}")
-            socketio.emit('log_update', {'log': f"❌ Test failed with exit code {exit_status}"}, room=client_id)
+            append_user_log(client_id, f"❌ Test failed with exit code {exit_status}")
 
         # 保存测试日志
         log_file = save_test_logs(test_type, client_id, exit_status)
         if log_file:
-            user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] 📁 日志已保存: {log_file}")
-            socketio.emit('log_update', {'log': f"📁 日志已保存: {log_file}"}, room=client_id)
+            append_user_log(client_id, f"📁 日志已保存: {log_file}")
+
+        # 后台拷贝结束后再增量索引本次运行的 host_log 并将结果入库
+        threading.Thread(target=ingest_after_sync, args=(config, summary_path, run_summary), daemon=True).start()
 
     except Exception as e:
-        error_msg = f"[ERROR] {str(e)}"
-        user_state['logs'].append(error_msg)
-        socketio.emit('log_update', {'log': error_msg}, room=client_id)
+        append_user_log(client_id, f"[ERROR] {str(e)}")
         # Print full traceback to server logs
         print(f"[ERROR] Exception in run_test_suite:")
         print(traceback.format_exc())
@@ -710,8 +1799,7 @@ def run_test_suite(config, test_params, client_id):
         # 异常时也保存日志
         log_file = save_test_logs(test_type, client_id, None)
         if log_file:
-            user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] 📁 日志已保存: {log_file}")
-            socketio.emit('log_update', {'log': f"📁 日志已保存: {log_file}"}, room=client_id)
+            append_user_log(client_id, f"📁 日志已保存: {log_file}")
 
     # Release devices when test completes
     devices_to_release = test_params.get('devices', [])
@@ -719,6 +1807,8 @@ def run_test_suite(config, test_params, client_id):
 
     user_state['running'] = False
     user_state['devices'] = []
+    end_shared_run(user_state, exit_status)
+    publish_user_state(client_id)
     socketio.emit('test_complete', {}, room=client_id)
 
 # ==================== Routes ====================
@@ -994,6 +2084,7 @@ def start_test():
 
     # Update user state to mark test as running and save devices
     update_user_state({'running': True, 'devices': devices})
+    publish_user_state(client_id)
     return jsonify({'success': True, 'message': 'Test started'})
 
 @app.route('/api/test/stop', methods=['POST'])
@@ -1003,13 +2094,13 @@ def stop_test():
     client_id = get_client_id()
 
     user_state['running'] = False
-    user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] ⏹️ 用户请求停止测试...")
-    socketio.emit('log_update', {'log': '⏹️ 用户请求停止测试...'}, room=client_id)
+    append_user_log(client_id, "⏹️ 用户请求停止测试...")
 
     # Release devices when stopping test
     devices_to_release = user_state.get('devices', [])
     release_devices(client_id, devices_to_release)
     user_state['devices'] = []
+    publish_user_state(client_id)
 
     config = load_config()
     ssh = get_ssh_connection(config)
@@ -1032,18 +2123,15 @@ def stop_test():
         tradefed_bin = binary_map.get(test_type, 'tradefed')
         kill_cmd = f"pkill -f '[./]?{tradefed_bin}.*run commandAndExit'"
 
-        user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] 🧹 正在终止 {test_type.upper()} 测试进程...")
-        socketio.emit('log_update', {'log': f"🧹 正在终止 {test_type.upper()} 测试进程..."}, room=client_id)
+        append_user_log(client_id, f"🧹 正在终止 {test_type.upper()} 测试进程...")
         output, error, code = execute_ssh_command(ssh, kill_cmd)
 
         return_ssh_connection(ssh)
 
         if code == 0:
-            user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] ✅ {test_type.upper()} tradefed 进程已成功终止")
-            socketio.emit('log_update', {'log': f"✅ {test_type.upper()} tradefed 进程已成功终止"}, room=client_id)
+            append_user_log(client_id, f"✅ {test_type.upper()} tradefed 进程已成功终止")
         else:
-            user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] ⚠️ 未找到运行中的测试进程或终止失败")
-            socketio.emit('log_update', {'log': '⚠️ 未找到运行中的测试进程或终止失败'}, room=client_id)
+            append_user_log(client_id, "⚠️ 未找到运行中的测试进程或终止失败")
 
         return jsonify({
             'success': True,
@@ -1051,36 +2139,70 @@ def stop_test():
         })
     except Exception as e:
         return_ssh_connection(ssh)
-        user_state['logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] ❌ 停止测试时出错: {str(e)}")
-        socketio.emit('log_update', {'log': f"❌ 停止测试时出错: {str(e)}"}, room=client_id)
+        append_user_log(client_id, f"❌ 停止测试时出错: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/test/clean', methods=['POST'])
 def clean_test():
     """Clean test logs"""
     user_state = get_user_state()
-    user_state['logs'] = []
+    user_state['log_store'].clear()
+    publish_user_state(get_client_id())
     return jsonify({'success': True})
 
 @app.route('/api/test/logs/download')
 def download_logs():
-    """下载当前测试日志文件"""
-    user_state = get_user_state()
+    """下载测试日志：分块流式传输，支持 Range 续传，客户端支持时按 gzip 传输
 
-    log_file = user_state.get('log_file')
+    参数 file 指定 logs/ 下的日志文件名，缺省为当前用户最近一次的日志。
+    """
+    filename = request.args.get('file', '').strip()
+    if filename:
+        try:
+            log_file = resolve_log_path(filename)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    else:
+        log_file = get_user_state().get('log_file')
+        if log_file and not os.path.exists(log_file) and os.path.exists(log_file + '.gz'):
+            log_file += '.gz'   # 已被后台压缩
     if not log_file or not os.path.exists(log_file):
         return jsonify({'success': False, 'error': 'No log file available'}), 404
 
     try:
-        with open(log_file, 'r', encoding='utf-8') as f:
-            log_content = f.read()
+        accepts_gzip = 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+        has_range = 'Range' in request.headers
+        stored_gzip = log_file.endswith('.gz')
+        download_name = os.path.basename(log_file)
+
+        if stored_gzip and accepts_gzip and not has_range:
+            # 已压缩文件直接按 gzip 编码传输，浏览器自动解压
+            response = send_file(log_file, mimetype='text/plain', as_attachment=True,
+                                 download_name=download_name[:-3], conditional=False)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers['Vary'] = 'Accept-Encoding'
+            return response
+
+        if stored_gzip and not has_range:
+            return Response(
+                stream_with_context(iter_decompressed_file(log_file)),
+                mimetype='text/plain',
+                headers={'Content-Disposition': f'attachment; filename="{download_name[:-3]}"'}
+            )
+
+        if has_range or not accepts_gzip:
+            # send_file 分块读取文件，并处理 Range / If-Range 返回 206
+            return send_file(log_file, mimetype='application/gzip' if stored_gzip else 'text/plain',
+                             as_attachment=True, download_name=download_name, conditional=True)
 
-        filename = os.path.basename(log_file)
         return Response(
-            log_content,
+            stream_with_context(iter_gzip_file(log_file)),
             mimetype='text/plain',
             headers={
-                'Content-Disposition': f'attachment; filename="{filename}"'
+                'Content-Disposition': f'attachment; filename="{download_name}"',
+                'Content-Encoding': 'gzip',
+                'Vary': 'Accept-Encoding',
+                'Accept-Ranges': 'none'     # 边压缩边传输，不支持 Range
             }
         )
     except Exception as e:
@@ -1121,6 +2243,7 @@ def save_current_logs():
 
         # 更新 user_state
         user_state['log_file'] = log_path
+        log_search_index.index_file(log_path)
 
         return jsonify({
             'success': True,
@@ -1133,22 +2256,23 @@ def save_current_logs():
 
 @app.route('/api/test/logs/list')
 def list_logs():
-    """列出所有可用的测试日志文件"""
+    """列出所有可用的测试日志文件（含后台压缩的 .log.gz）"""
     try:
-        logs_dir = os.path.join(os.path.dirname(__file__), 'logs')
-        if not os.path.exists(logs_dir):
+        if not os.path.exists(LOGS_DIR):
             return jsonify({'logs': []})
 
         log_files = []
-        for filename in os.listdir(logs_dir):
-            if filename.endswith('.log'):
-                filepath = os.path.join(logs_dir, filename)
-                stat = os.stat(filepath)
-                log_files.append({
-                    'filename': filename,
-                    'size': stat.st_size,
-                    'modified': stat.st_mtime
-                })
+        manifest = load_log_size_manifest()
+        for filename, filepath, stat in iter_saved_logs():
+            compressed = filename.endswith('.gz')
+            log_files.append({
+                'filename': filename,
+                'size': stat.st_size,
+                'compressed': compressed,
+                'compressed_size': stat.st_size if compressed else None,
+                'uncompressed_size': gzip_uncompressed_size(filepath, manifest) if compressed else stat.st_size,
+                'modified': stat.st_mtime
+            })
 
         # 按修改时间降序排列
         log_files.sort(key=lambda x: x['modified'], reverse=True)
@@ -1156,33 +2280,154 @@ def list_logs():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/test/logs/view')
+def view_log_window():
+    """分页查看已保存的日志：按行号窗口读取，支持跳转到时间戳或下一处错误
+
+    参数: file, offset, limit, timestamp=HH:MM:SS, find=error|<文本>
+    """
+    filename = request.args.get('file', '').strip()
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 200, type=int), 1), LOG_VIEW_MAX_LIMIT)
+    timestamp = request.args.get('timestamp', '').strip()
+    find = request.args.get('find', '').strip()
+
+    try:
+        path = resolve_log_path(filename)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'error': f'Log file not found: {filename}'}), 404
+
+    try:
+        active = path in {store.path for store in list(active_log_stores)}
+        with IndexedLogView(materialize_log(path), active=active) as view:
+            match_line = None
+            if timestamp:
+                match_line = view.find_timestamp(timestamp)
+            elif find:
+                pattern = LOG_ERROR_PATTERN if find.lower() == 'error' else \
+                    re.compile(re.escape(find.encode('utf-8')))
+                match_line = view.find_next(pattern, offset)
+            if match_line is not None:
+                offset = match_line
+
+            return jsonify({
+                'success': True,
+                'file': filename,
+                'offset': offset,
+                'limit': limit,
+                'total_lines': view.total_lines(),
+                'match_line': match_line,
+                'lines': view.lines(offset, limit)
+            })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/logs/search')
+def search_logs():
+    """全文搜索已保存的测试日志和远端 host_log，返回匹配的运行及行号"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'error': 'Search query is required'}), 400
+
+    kind = request.args.get('kind') or None
+    limit = min(request.args.get('limit', 50, type=int), LOG_SEARCH_MAX_RESULTS)
+
+    start = time.time()
+    try:
+        results = log_search_index.search(query, kind=kind, limit=limit)
+    except sqlite3.Error as e:
+        return jsonify({'success': False, 'error': f'搜索失败: {str(e)}'}), 500
+
+    return jsonify({
+        'success': True,
+        'query': query,
+        'results': results,
+        'elapsed_ms': round((time.time() - start) * 1000, 1)
+    })
+
+@app.route('/api/logs/search/reindex', methods=['POST'])
+def reindex_logs():
+    """补建本地日志索引，并在后台增量索引远端 host_log"""
+    log_search_index.scan()
+    config = load_config()
+    threading.Thread(target=index_remote_host_logs, args=(config,), daemon=True).start()
+    return jsonify({'success': True, 'message': '索引任务已启动'})
+
 @app.route('/api/status')
 def get_status():
-    """Get current test status - 优化版本，减少数据传输"""
+    """Get current test status - 支持 ETag 和长轮询（wait=秒），状态未变化时返回 304"""
     user_state = get_user_state()
 
     # 获取请求参数，只返回需要的数据
     since = request.args.get('since', type=int)
     include_logs = request.args.get('logs', 'true').lower() == 'true'
+    device = request.args.get('device', '').strip()
+    wait = min(max(request.args.get('wait', 0, type=int), 0), STATUS_LONG_POLL_MAX)
+    if_none_match = request.headers.get('If-None-Match')
+
+    # 长轮询：客户端持有的版本仍是最新时，挂起直到状态/日志变化或超时
+    if wait and if_none_match == status_etag(user_state, device):
+        deadline = time.time() + wait
+        with status_changed:
+            while status_etag(user_state, device) == if_none_match and time.time() < deadline:
+                status_changed.wait(deadline - time.time())
+
+    etag = status_etag(user_state, device)
+    if if_none_match == etag:
+        return Response(status=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
 
     response = {
+        'version': user_state.get('state_version', 0),
         'running': user_state['running'],
         'devices': user_state['devices'],
+        'run_id': user_state.get('run_id'),
     }
 
-    # 只在需要时返回日志，并且基于since参数返回增量日志
-    if include_logs:
-        logs = user_state['logs']
-        if since is not None and 0 <= since < len(logs):
+    demux = user_state.get('log_demux')
+    if demux:
+        response['streams'] = demux.streams()
+
+    # 只在需要时返回日志；since 为单调递增的日志序号游标，清除日志后依然有效
+    store = user_state['log_store']
+    if include_logs and device:
+        # 单设备日志流：只返回该设备环形缓冲区中的日志
+        logs, next_seq = demux.tail(device, since) if demux else ([], store.next_seq)
+        response['device'] = device
+        response['logs'] = logs
+        response['next_seq'] = next_seq
+    elif include_logs:
+        if since is not None:
             # 只返回新日志（增量）
-            response['logs'] = logs[since:]
-            response['log_count'] = len(logs)
+            response['logs'], response['next_seq'] = store.read(since)
         else:
-            # 返回最近50条日志（从100减少到50）
-            response['logs'] = logs[-50:]
-            response['log_count'] = len(logs)
-
-    return jsonify(response)
+            # 返回最近50条日志
+            response['logs'] = store.tail(50)
+            response['next_seq'] = store.next_seq
+    if include_logs:
+        response['first_seq'] = store.first_seq
+        response['log_count'] = response['next_seq']
+
+    result = jsonify(response)
+    result.headers['ETag'] = etag
+    result.headers['Cache-Control'] = 'no-cache'
+    return result
+
+@app.route('/api/runs')
+def list_active_runs():
+    """列出正在进行的测试运行，供其他用户加入观察"""
+    with active_runs_lock:
+        runs = list(active_runs.values())
+    return jsonify({'success': True, 'runs': [{
+        'run_id': run['run_id'],
+        'owner': run['owner'],
+        'test_type': run['test_type'],
+        'devices': run['devices'],
+        'started_at': run['started_at'],
+        'next_seq': run['store'].next_seq,
+        'observers': count_run_observers(run['run_id'])
+    } for run in runs]})
 
 @app.route('/api/devices/reboot', methods=['POST'])
 def reboot_devices():
@@ -2634,156 +3879,1928 @@ def autocomplete_suite():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # ==================== Test Reports ====================
-@app.route('/api/reports/list')
-def list_test_reports():
-    """List all test report directories with summary information"""
-    config = load_config()
-    ssh = get_ssh_connection(config)
-    if not ssh:
-        return jsonify({'reports': []})
-
+REPORT_INDEX_TTL = 10           # 缓存有效期（秒），期间不再扫描远端
+REPORT_PAGE_SIZE = 20
+REPORT_HEADER_BYTES = 16384     # test_result.xml 中 <Result>/<Summary> 位于文件开头
+REPORT_ATTR_RE = re.compile(r'(\w+)="([^"]*)"')
+RUN_SUMMARY_MAX_BYTES = 65536   # run_GMS_Test_Auto.sh 写出的单行 summary.json
+RUN_SUMMARY_RE = re.compile(r'运行摘要: (\S+summary\.json)')
+RUN_SYNC_POLL_INTERVAL = 15     # 等待后台拷贝结束时轮询 summary.json 的间隔（秒）
+RUN_SYNC_TIMEOUT = 6 * 3600
+
+# 单次 SSH 执行完成整个扫描：stdin 传入已缓存目录的 mtime，远端只为变化的目录读取 XML 头部
+REPORT_SCAN_SCRIPT = r"""
+base="$1"
+declare -A known
+while read -r name key; do known["$name"]="$key"; done
+[ -d "$base" ] || exit 0
+find "$base" -mindepth 1 -maxdepth 1 -type d -name '[0-9]*' -printf '%f %T@\n' 2>/dev/null |
+while read -r name mtime; do
+    xml="$base/$name/test_result.xml"
+    key="$mtime/$(stat -c %Y "$xml" 2>/dev/null)"
+    if [ "${known[$name]}" = "$key" ]; then echo "D $name $key"; continue; fi
+    echo "N $name $key"
+    # 运行脚本写出的 summary.json 已包含计数，不必再读 XML
+    if [ -f "$base/$name/summary.json" ]; then
+        printf 'J '; head -c RUN_SUMMARY_MAX_BYTES "$base/$name/summary.json" | tr -d '\n'; echo
+        continue
+    fi
+    [ -f "$xml" ] && head -c REPORT_HEADER_BYTES "$xml" | tr '\n' ' ' | grep -o '<Result [^>]*>\|<Summary [^>]*>' | sed 's/^/H /'
+done
+# 只剩 zip 归档的旧运行
+find "$base" -mindepth 1 -maxdepth 1 -type f -name '[0-9]*.zip' -printf '%f %T@\n' 2>/dev/null |
+while read -r zname mtime; do
+    name="${zname%.zip}"
+    [ -d "$base/$name" ] && continue
+    key="zip/$mtime"
+    if [ "${known[$name]}" = "$key" ]; then echo "D $name $key"; continue; fi
+    echo "N $name $key"
+    echo "A"
+done
+""".replace('REPORT_HEADER_BYTES', str(REPORT_HEADER_BYTES)).replace('RUN_SUMMARY_MAX_BYTES', str(RUN_SUMMARY_MAX_BYTES))
+
+
+def parse_report_header(result_dir, timestamp, header_lines):
+    """从 <Result>/<Summary> 标签属性生成报告摘要"""
+    info = {'timestamp': timestamp, 'path': result_dir, 'has_xml': bool(header_lines)}
+    attrs = {}
+    for line in header_lines:
+        attrs.update(REPORT_ATTR_RE.findall(line))
+    if not attrs:
+        return info
+
+    def to_int(key):
+        try:
+            return int(attrs.get(key, 0))
+        except ValueError:
+            return 0
+
+    info['pass'] = to_int('pass')
+    info['fail'] = to_int('failed')
+    info['total'] = info['pass'] + info['fail']
+    info['modules_done'] = to_int('modules_done')
+    info['modules_total'] = to_int('modules_total')
+    for key in ('suite_name', 'suite_version', 'start_display', 'end_display'):
+        if key in attrs:
+            info[key] = attrs[key]
+    return info
+
+
+def parse_run_summary(result_dir, timestamp, summary):
+    """由 summary.json 生成报告摘要，字段与 parse_report_header 一致；不可用时返回 None"""
+    if not isinstance(summary, dict) or summary.get('version') != 1:
+        return None
+    info = {'timestamp': timestamp, 'path': result_dir, 'has_xml': bool(summary.get('suite_name')), 'has_summary': True}
+    for key in ('pass', 'modules_done', 'modules_total', 'exit_code', 'duration', 'retry_rounds'):
+        info[key] = summary.get(key) if isinstance(summary.get(key), int) else 0
+    info['fail'] = summary.get('failed') if isinstance(summary.get('failed'), int) else 0
+    info['total'] = info['pass'] + info['fail']
+    for key in ('suite_name', 'suite_version', 'start_display', 'end_display', 'test_type', 'module'):
+        if summary.get(key):
+            info[key] = summary[key]
+    return info
+
+
+def load_run_summary(ssh, path):
+    """读取一次运行的 summary.json（运行脚本输出的“运行摘要”路径）"""
+    sftp = ssh.open_sftp()
     try:
-        ubuntu_user = config.get('ubuntu_user', 'hcq')
-        results_base = f"/home/{ubuntu_user}/gms_test_results"
+        with sftp.open(path, 'r') as f:
+            return json.loads(f.read(RUN_SUMMARY_MAX_BYTES).decode('utf-8', errors='replace'))
+    finally:
+        sftp.close()
 
-        # Check if results directory exists
-        check_cmd = f"[ -d '{results_base}' ] && echo 'exists' || echo 'not_found'"
-        output, _, _ = execute_ssh_command(ssh, check_cmd, timeout=5)
 
-        if output.strip() != 'exists':
+def ingest_after_sync(config, summary_path, run_summary):
+    """后台拷贝结束（summary.json 的 sync 不再是 pending）后再索引 host_log、结果入库"""
+    if summary_path and run_summary and run_summary.get('sync') == 'pending':
+        deadline = time.time() + RUN_SYNC_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(RUN_SYNC_POLL_INTERVAL)
+            ssh = get_ssh_connection(config)
+            if not ssh:
+                continue
+            try:
+                run_summary = load_run_summary(ssh, summary_path)
+            except (IOError, ValueError):
+                run_summary = None
             return_ssh_connection(ssh)
-            return jsonify({'reports': []})
+            if not run_summary or run_summary.get('sync') != 'pending':
+                break
+        else:
+            print(f"[RESULTS] 等待后台拷贝超时，直接入库: {summary_path}")
+    index_remote_host_logs(config)
+    backfill_results(config)
+
+
+class ReportIndex:
+    """远端结果目录的摘要索引：按目录 mtime 增量刷新，并在内存中缓存"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._base = None
+        self._entries = {}          # timestamp -> {'key': mtime键, 'sort': 目录mtime, 'info': 摘要}
+        self._scanned_at = 0
+
+    def refresh(self, ssh, results_base, force=False):
+        """扫描远端（TTL 内直接使用缓存）；返回是否实际执行了扫描"""
+        with self._lock:
+            if self._base != results_base:
+                self._base = results_base
+                self._entries = {}
+                self._scanned_at = 0
+            if not force and time.time() - self._scanned_at < REPORT_INDEX_TTL:
+                return False
+
+            known = ''.join(f"{name} {entry['key']}\n" for name, entry in self._entries.items())
+            stdin, stdout, stderr = ssh.exec_command(
+                f"bash -c {shlex.quote(REPORT_SCAN_SCRIPT)} scan {shlex.quote(results_base)}",
+                timeout=30
+            )
+            stdin.write(known)
+            stdin.channel.shutdown_write()
+            output = stdout.read().decode('utf-8', errors='ignore')
+            stdout.channel.recv_exit_status()
+
+            entries = {}
+            current = None
+            for line in output.splitlines():
+                kind, _, rest = line.partition(' ')
+                if kind == 'H' and current:
+                    current['headers'].append(rest)
+                    continue
+                if kind == 'J' and current:
+                    try:
+                        current['summary'] = json.loads(rest)
+                    except ValueError:
+                        pass
+                    continue
+                if kind == 'A' and current:
+                    current['archived'] = True
+                    continue
+                if kind not in ('D', 'N'):
+                    continue
+                name, _, key = rest.partition(' ')
+                if kind == 'D' and name in self._entries:
+                    entries[name] = self._entries[name]
+                    current = None
+                else:
+                    current = {'key': key, 'headers': []}
+                    entries[name] = current
+                try:
+                    entries[name]['sort'] = float(key.rsplit('/', 1)[-1] if key.startswith('zip/') else key.split('/', 1)[0])
+                except ValueError:
+                    entries[name]['sort'] = 0.0
+
+            for name, entry in entries.items():
+                if 'headers' in entry:
+                    entry['info'] = parse_run_summary(f"{results_base}/{name}", name, entry.pop('summary', None)) \
+                        or parse_report_header(f"{results_base}/{name}", name, entry.pop('headers'))
+                    entry.pop('headers', None)
+                    if entry.pop('archived', False):
+                        # 摘要需通过 /api/reports/<timestamp> 从归档中读取
+                        entry['info'].update({'archived': True, 'path': f"{results_base}/{name}.zip", 'has_xml': None})
+
+            self._entries = entries
+            self._scanned_at = time.time()
+            return True
 
-        # List all timestamp directories, sorted by newest first
-        list_cmd = f"find '{results_base}' -maxdepth 1 -type d -name '[0-9]*' -printf '%T@ %p\\n' 2>/dev/null | sort -rn | head -20"
-        list_output, _, _ = execute_ssh_command(ssh, list_cmd, timeout=10)
+    def invalidate(self):
+        """下次请求时强制重新扫描"""
+        with self._lock:
+            self._scanned_at = 0
 
-        reports = []
-        for line in list_output.strip().split('\n'):
-            if not line.strip():
-                continue
+    def page(self, offset=0, limit=REPORT_PAGE_SIZE):
+        """按目录 mtime 倒序分页"""
+        with self._lock:
+            ordered = sorted(self._entries.values(), key=lambda e: e['sort'], reverse=True)
+            return [e['info'] for e in ordered[offset:offset + limit]], len(ordered), self._scanned_at
 
-            parts = line.strip().split(' ', 1)
-            if len(parts) < 2:
-                continue
 
-            result_dir = parts[1]
-            timestamp = os.path.basename(result_dir)
+report_index = ReportIndex()
 
-            # Get test_result.xml info
-            result_xml = f"{result_dir}/test_result.xml"
-            check_xml = f"[ -f '{result_xml}' ] && echo 'exists' || echo 'not_found'"
-            xml_exists, _, _ = execute_ssh_command(ssh, check_xml, timeout=3)
+# test_result.xml 流式解析
+REPORT_MAX_FAILURES = 500       # 单个报告最多返回的失败用例数
+REPORT_FAILURE_TEXT_LIMIT = 1000
+REPORT_SUMMARY_CACHE_SIZE = 16
+REPORT_TIMESTAMP_RE = re.compile(r'^[\w.\-]+$')
+report_summary_cache = OrderedDict()    # (path, size, mtime) -> 解析结果
+report_summary_lock = threading.Lock()
 
-            report_info = {
-                'timestamp': timestamp,
-                'path': result_dir,
-                'has_xml': xml_exists.strip() == 'exists'
-            }
 
-            # Parse test_result.xml if exists
-            if report_info['has_xml']:
-                # Get pass and fail counts
-                pass_cmd = f"grep -o 'pass=\"[0-9]*\"' '{result_xml}' 2>/dev/null | head -1 | sed 's/pass=\"//; s/\"//' || echo 0"
-                fail_cmd = f"grep -o 'failed=\"[0-9]*\"' '{result_xml}' 2>/dev/null | head -1 | sed 's/failed=\"//; s/\"//' || echo 0"
+def classify_test_result(result):
+    """tradefed 的 result 属性归为 pass / fail / skip"""
+    result = (result or '').lower()
+    if result == 'pass':
+        return 'pass'
+    if result == 'fail':
+        return 'fail'
+    return 'skip'
 
-                pass_output, _, _ = execute_ssh_command(ssh, pass_cmd, timeout=3)
-                fail_output, _, _ = execute_ssh_command(ssh, fail_cmd, timeout=3)
 
-                report_info['pass'] = int(pass_output.strip() or 0)
-                report_info['fail'] = int(fail_output.strip() or 0)
-                report_info['total'] = report_info['pass'] + report_info['fail']
+def parse_test_result_xml(stream, on_test=None):
+    """流式解析 test_result.xml：每个 <Test>/<Module> 处理完立即清除，内存占用与文件大小无关
 
-            reports.append(report_info)
+    on_test(module, test_case, test_elem, outcome) 在清除每个 <Test> 之前回调。
+    """
+    summary = {
+        'result': {}, 'build': {}, 'summary': {},
+        'totals': {'pass': 0, 'fail': 0, 'skip': 0, 'runtime_ms': 0},
+        'modules': [], 'abis': {},
+        'failures': [], 'failures_truncated': False
+    }
+    root = None
+    module = None
+    test_case = None
+
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            if root is None:
+                root = elem
+                summary['result'] = dict(elem.attrib)
+            elif tag == 'Module':
+                try:
+                    runtime = int(elem.get('runtime', 0))
+                except ValueError:
+                    runtime = 0
+                module = {
+                    'name': elem.get('name', ''), 'abi': elem.get('abi', ''),
+                    'runtime_ms': runtime, 'done': elem.get('done') == 'true',
+                    'pass': 0, 'fail': 0, 'skip': 0
+                }
+            elif tag == 'TestCase':
+                test_case = elem.get('name', '')
+            continue
+
+        if tag == 'Test':
+            outcome = classify_test_result(elem.get('result'))
+            summary['totals'][outcome] += 1
+            if module is not None:
+                module[outcome] += 1
+            if outcome == 'fail':
+                if len(summary['failures']) < REPORT_MAX_FAILURES:
+                    failure = elem.find('Failure')
+                    summary['failures'].append({
+                        'module': module['name'] if module else '',
+                        'abi': module['abi'] if module else '',
+                        'test_case': test_case or '',
+                        'test': elem.get('name', ''),
+                        'message': (failure.get('message', '') if failure is not None else '')[:REPORT_FAILURE_TEXT_LIMIT],
+                        'stack_trace': ((failure.findtext('StackTrace') or '') if failure is not None else '')[:REPORT_FAILURE_TEXT_LIMIT]
+                    })
+                else:
+                    summary['failures_truncated'] = True
+            if on_test:
+                on_test(module, test_case, elem, outcome)
+            elem.clear()
+        elif tag == 'TestCase':
+            test_case = None
+            elem.clear()
+        elif tag == 'Module' and module is not None:
+            summary['modules'].append(module)
+            summary['totals']['runtime_ms'] += module['runtime_ms']
+            abi = summary['abis'].setdefault(module['abi'], {'pass': 0, 'fail': 0, 'skip': 0, 'modules': 0, 'runtime_ms': 0})
+            for key in ('pass', 'fail', 'skip', 'runtime_ms'):
+                abi[key] += module[key]
+            abi['modules'] += 1
+            module = None
+            # 释放根节点对已处理模块的引用
+            root.clear()
+        elif tag == 'Build':
+            summary['build'] = dict(elem.attrib)
+        elif tag == 'Summary':
+            summary['summary'] = dict(elem.attrib)
+
+    return summary
+
+
+REMOTE_READ_WINDOW = 4 * 1024 * 1024     # 顺序读取远端大文件时每次流水线预读的字节数上限
+REMOTE_READ_FIRST_WINDOW = 256 * 1024    # seek 后的第一个窗口，连续读取时逐次翻倍
+REMOTE_READ_REQUEST = 32768
+
+
+class RemoteWindowReader(io.RawIOBase):
+    """按窗口流水线预读的 SFTP 文件流：内存只保留一个窗口，可 seek（供 ZipFile 使用）"""
+
+    def __init__(self, remote_file, size, close_file=False):
+        self._file = remote_file
+        self._size = size
+        self._close_file = close_file
+        self._pos = 0
+        self._window_start = 0
+        self._window = b''
+        self._window_size = REMOTE_READ_FIRST_WINDOW
+
+    def close(self):
+        if self._close_file and not self.closed:
+            self._file.close()
+        super().close()
+
+    def readable(self):
+        return True
 
-        return_ssh_connection(ssh)
-        return jsonify({'reports': reports})
+    def seekable(self):
+        return True
 
-    except Exception as e:
-        print(f"[ERROR] Error listing test reports: {e}")
-        if ssh:
-            return_ssh_connection(ssh)
-        return jsonify({'reports': []})
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def readinto(self, buffer):
+        start = self._pos - self._window_start
+        if not 0 <= start < len(self._window):
+            if self._pos >= self._size:
+                return 0
+            if self._pos == self._window_start + len(self._window):
+                self._window_size = min(self._window_size * 2, REMOTE_READ_WINDOW)
+            else:
+                self._window_size = REMOTE_READ_FIRST_WINDOW
+            end = min(self._size, self._pos + self._window_size)
+            chunks = [(offset, min(REMOTE_READ_REQUEST, end - offset))
+                      for offset in range(self._pos, end, REMOTE_READ_REQUEST)]
+            self._window = b''.join(self._file.readv(chunks))
+            self._window_start, start = self._pos, 0
+        n = min(len(buffer), len(self._window) - start)
+        buffer[:n] = self._window[start:start + n]
+        self._pos += n
+        return n
+
+
+def open_remote_reader(remote_file, size, close_file=False):
+    """远端文件的有界预读流（不再对整个文件 prefetch）；close_file 时关闭流也关闭远端文件"""
+    return io.BufferedReader(RemoteWindowReader(remote_file, size, close_file), buffer_size=REMOTE_READ_REQUEST * 2)
+
+
+class ResultXmlSource:
+    """一次运行的 test_result.xml：优先读结果目录，目录不存在时读同名 zip 归档中的成员（不解压到磁盘）"""
+
+    def __init__(self, sftp, results_base, timestamp):
+        self.sftp = sftp
+        self._zip = None
+        self._remote_file = None
+        self._member = None
+        xml_path = f"{results_base}/{timestamp}/test_result.xml"
+        try:
+            attr = sftp.stat(xml_path)
+            self.path, self.size = xml_path, attr.st_size
+            self.key = (xml_path, attr.st_size, attr.st_mtime)
+        except FileNotFoundError:
+            zip_path = f"{results_base}/{timestamp}.zip"
+            attr = sftp.stat(zip_path)
+            self._remote_file = sftp.open(zip_path, 'rb')
+            self._zip = zipfile.ZipFile(open_remote_reader(self._remote_file, attr.st_size))
+            info = find_result_xml_member(self._zip)
+            if info is None:
+                self.close()
+                raise FileNotFoundError(f"test_result.xml not found in {zip_path}")
+            self._info = info
+            self.path, self.size = f"{zip_path}!{info.filename}", info.file_size
+            self.key = (self.path, attr.st_size, attr.st_mtime)
+        self.mtime = attr.st_mtime
+        self.archived = self._zip is not None
+
+    def open(self):
+        """返回可顺序读取的二进制流"""
+        if self._zip is None:
+            self._remote_file = self.sftp.open(self.path, 'rb')
+            return open_remote_reader(self._remote_file, self.size)
+        self._member = self._zip.open(self._info)
+        return self._member
+
+    def close(self):
+        for handle in (self._member, self._zip, self._remote_file):
+            if handle is not None:
+                try:
+                    handle.close()
+                except Exception:
+                    pass
 
-@app.route('/api/reports/<path:report_timestamp>/files')
-def list_report_files(report_timestamp):
-    """List files in a specific test report directory"""
-    config = load_config()
-    ssh = get_ssh_connection(config)
-    if not ssh:
-        return jsonify({'success': False, 'error': 'SSH connection failed'}), 500
+    def __enter__(self):
+        return self
 
-    try:
-        ubuntu_user = config.get('ubuntu_user', 'hcq')
-        report_dir = f"/home/{ubuntu_user}/gms_test_results/{report_timestamp}"
+    def __exit__(self, *exc):
+        self.close()
 
-        # List files recursively
-        list_cmd = f"find '{report_dir}' -type f 2>/dev/null | head -50"
-        list_output, _, _ = execute_ssh_command(ssh, list_cmd, timeout=10)
 
-        files = []
-        for line in list_output.strip().split('\n'):
-            if not line.strip():
-                continue
+def find_result_xml_member(zf):
+    """zip 中路径最短的 test_result.xml"""
+    candidates = [info for info in zf.infolist()
+                  if posixpath.basename(info.filename) == 'test_result.xml']
+    return min(candidates, key=lambda info: len(info.filename)) if candidates else None
 
-            # Get relative path from report_dir
-            rel_path = line.replace(report_dir + '/', '')
-            file_size_cmd = f"stat -c%s '{line}' 2>/dev/null || echo 0"
-            size_output, _, _ = execute_ssh_command(ssh, file_size_cmd, timeout=3)
 
-            files.append({
-                'name': os.path.basename(line),
-                'path': line,
-                'relative_path': rel_path,
-                'size': int(size_output.strip() or 0)
-            })
+def load_report_summary(ssh, results_base, timestamp):
+    """通过 SFTP 流式读取并解析 test_result.xml（含 zip 归档），按 (size, mtime) 缓存结果"""
+    sftp = ssh.open_sftp()
+    try:
+        with ResultXmlSource(sftp, results_base, timestamp) as source:
+            with report_summary_lock:
+                if source.key in report_summary_cache:
+                    report_summary_cache.move_to_end(source.key)
+                    return report_summary_cache[source.key]
+            summary = parse_test_result_xml(source.open())
+            summary['size'] = source.size
+            summary['mtime'] = datetime.fromtimestamp(source.mtime).isoformat()
+            summary['archived'] = source.archived
+            key = source.key
+    finally:
+        sftp.close()
 
-        return_ssh_connection(ssh)
-        return jsonify({'success': True, 'files': files})
+    with report_summary_lock:
+        report_summary_cache[key] = summary
+        while len(report_summary_cache) > REPORT_SUMMARY_CACHE_SIZE:
+            report_summary_cache.popitem(last=False)
+    return summary
+
+
+# ==================== Run Diff ====================
+# 两次运行的用例级对比：每次运行转为列式结构（名称哈希数组 + 状态字节数组），按模块整段比较
+DIFF_STATUS = {'pass': 1, 'fail': 2, 'skip': 3}
+DIFF_STATUS_NAMES = {1: 'pass', 2: 'fail', 3: 'skip'}
+DIFF_MAX_ITEMS = 1000           # 每个分类最多返回的用例数
+DIFF_CACHE_SIZE = 4
+run_columns_cache = OrderedDict()   # (path, size, mtime) -> RunColumns
+run_columns_lock = threading.Lock()
+
+
+class RunColumns:
+    """一次运行的列式结果：用例按 XML 顺序排列，同一模块的用例连续存放"""
+
+    def __init__(self):
+        self.modules = {}               # (module, abi) -> [[start, end], ...] 各段用例区间
+        self.hashes = array('Q')        # test_case#test 的哈希
+        self.status = bytearray()       # DIFF_STATUS 编码
+        self.name_blob = bytearray()    # 用例名称依次拼接
+        self.name_offsets = array('I', [0])
+        self._current = None
+
+    def add(self, module, test_case, elem, outcome):
+        """parse_test_result_xml 的 on_test 回调"""
+        if module is None:
+            return
+        key = (module['name'], module['abi'])
+        index = len(self.status)
+        if self._current != key:
+            # 同一模块通常在 XML 中连续出现；隔着其他模块重复出现时另起一段
+            self.modules.setdefault(key, []).append([index, index])
+            self._current = key
+        name = f"{test_case}#{elem.get('name', '')}"
+        self.hashes.append(hash(name) & 0xFFFFFFFFFFFFFFFF)
+        self.status.append(DIFF_STATUS[outcome])
+        self.name_blob += name.encode('utf-8')
+        self.name_offsets.append(len(self.name_blob))
+        self.modules[key][-1][1] = index + 1
 
-    except Exception as e:
-        return_ssh_connection(ssh)
-        return jsonify({'success': False, 'error': str(e)}), 500
+    @staticmethod
+    def indexes(segments):
+        return [i for start, end in segments for i in range(start, end)]
 
-@app.route('/api/reports/view')
-def view_report_file():
-    """View a test report file content"""
-    file_path = request.args.get('path')
-    if not file_path:
-        return jsonify({'success': False, 'error': 'File path is required'}), 400
+    @staticmethod
+    def count(segments):
+        return sum(end - start for start, end in segments)
+
+    def name(self, index):
+        return self.name_blob[self.name_offsets[index]:self.name_offsets[index + 1]].decode('utf-8')
+
+    def __len__(self):
+        return len(self.status)
+
+
+def load_run_columns(sftp, results_base, timestamp):
+    """流式解析 test_result.xml（含 zip 归档）为 RunColumns，按 (size, mtime) 缓存"""
+    with ResultXmlSource(sftp, results_base, timestamp) as source:
+        with run_columns_lock:
+            if source.key in run_columns_cache:
+                run_columns_cache.move_to_end(source.key)
+                return run_columns_cache[source.key]
+        columns = RunColumns()
+        parse_test_result_xml(source.open(), on_test=columns.add)
+        key = source.key
+
+    with run_columns_lock:
+        run_columns_cache[key] = columns
+        while len(run_columns_cache) > DIFF_CACHE_SIZE:
+            run_columns_cache.popitem(last=False)
+    return columns
+
+
+def diff_run_columns(base, target):
+    """对比两次运行，返回新增失败、已修复、持续失败、缺失和新增用例
+
+    模块内用例序列和状态完全一致时整段跳过（C 层比较 array/bytearray），
+    只有存在差异的模块才逐条比较。
+    """
+    result = {key: [] for key in ('new_failures', 'fixed', 'still_failing', 'missing', 'added')}
+    counts = dict.fromkeys(result, 0)
+    missing_modules = []
+    added_modules = []
+
+    def record(category, module, abi, name, **extra):
+        counts[category] += 1
+        if len(result[category]) < DIFF_MAX_ITEMS:
+            result[category].append({'module': module, 'abi': abi, 'test': name, **extra})
+
+    fail = DIFF_STATUS['fail']
+    for (module, abi), b_segments in base.modules.items():
+        t_segments = target.modules.get((module, abi))
+        if t_segments is None:
+            missing_modules.append({'module': module, 'abi': abi, 'tests': RunColumns.count(b_segments)})
+            counts['missing'] += RunColumns.count(b_segments)
+            continue
+
+        same_sequence = False
+        if len(b_segments) == 1 and len(t_segments) == 1:
+            (b_start, b_end), (t_start, t_end) = b_segments[0], t_segments[0]
+            same_sequence = base.hashes[b_start:b_end] == target.hashes[t_start:t_end]
+        if same_sequence:
+            # 用例序列一致：状态相同则整段跳过，否则按位置比较
+            base_status = base.status[b_start:b_end]
+            target_status = target.status[t_start:t_end]
+            if base_status == target_status:
+                if fail in base_status:
+                    for offset, code in enumerate(base_status):
+                        if code == fail:
+                            record('still_failing', module, abi, base.name(b_start + offset))
+                continue
+            pairs = ((b_start + i, t_start + i) for i in range(b_end - b_start))
+        else:
+            # 同名用例（参数化用例）可能出现多次，按出现顺序逐个配对
+            target_index = {}
+            for j in RunColumns.indexes(t_segments):
+                target_index.setdefault(target.hashes[j], deque()).append(j)
+            pairs = []
+            for i in RunColumns.indexes(b_segments):
+                candidates = target_index.get(base.hashes[i])
+                pairs.append((i, candidates.popleft() if candidates else None))
+            for remaining in target_index.values():
+                pairs.extend((None, j) for j in remaining)
+
+        for i, j in pairs:
+            before = base.status[i] if i is not None else None
+            after = target.status[j] if j is not None else None
+            if j is None:
+                record('missing', module, abi, base.name(i), status=DIFF_STATUS_NAMES[before])
+            elif i is None:
+                record('added', module, abi, target.name(j), status=DIFF_STATUS_NAMES[after])
+                if after == fail:
+                    record('new_failures', module, abi, target.name(j), before=None)
+            elif before == fail and after == fail:
+                record('still_failing', module, abi, base.name(i))
+            elif after == fail:
+                record('new_failures', module, abi, target.name(j), before=DIFF_STATUS_NAMES[before])
+            elif before == fail:
+                record('fixed', module, abi, base.name(i), after=DIFF_STATUS_NAMES[after])
+
+    for (module, abi), t_segments in target.modules.items():
+        if (module, abi) in base.modules:
+            continue
+        added_modules.append({'module': module, 'abi': abi, 'tests': RunColumns.count(t_segments)})
+        counts['added'] += RunColumns.count(t_segments)
+        for j in RunColumns.indexes(t_segments):
+            if target.status[j] == fail:
+                record('new_failures', module, abi, target.name(j), before=None)
+
+    return {
+        'counts': counts,
+        'truncated': {key: counts[key] > len(result[key]) for key in result},
+        'missing_modules': missing_modules,
+        'added_modules': added_modules,
+        **result
+    }
+
+
+# ==================== Results Database ====================
+# 每次运行的结果入库（SQLite），用于通过率趋势、不稳定用例和耗时统计
+RESULTS_DB = os.path.join(LOGS_DIR, 'results.db')
+RESULTS_BACKFILL_DELAY = 30     # 启动后延迟补录远端历史结果（秒）
+RESULT_STATUS_FAIL = 1
+RESULT_STATUS_SKIP = 2
+
+
+class ResultsDatabase:
+    """运行 / 模块 / 用例结果库：通过的用例只按模块计数，用例表只记录失败和跳过"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            suite TEXT, plan TEXT,
+            start_ms INTEGER, end_ms INTEGER,
+            devices TEXT, device TEXT, fingerprint TEXT,
+            pass INTEGER, fail INTEGER, skip INTEGER,
+            modules_done INTEGER, modules_total INTEGER,
+            xml_size INTEGER, xml_mtime REAL, ingested_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS runs_start ON runs(start_ms);
+        CREATE INDEX IF NOT EXISTS runs_suite_start ON runs(suite, start_ms);
+        CREATE TABLE IF NOT EXISTS modules (
+            run_id INTEGER NOT NULL, name TEXT NOT NULL, abi TEXT NOT NULL,
+            pass INTEGER, fail INTEGER, skip INTEGER, runtime_ms INTEGER, done INTEGER,
+            PRIMARY KEY (run_id, name, abi)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS modules_name ON modules(name, abi, run_id);
+        CREATE TABLE IF NOT EXISTS tests (
+            id INTEGER PRIMARY KEY,
+            module TEXT NOT NULL, abi TEXT NOT NULL, test_case TEXT NOT NULL, name TEXT NOT NULL,
+            UNIQUE (module, abi, test_case, name)
+        );
+        CREATE TABLE IF NOT EXISTS test_results (
+            test_id INTEGER NOT NULL, run_id INTEGER NOT NULL, status INTEGER NOT NULL, message TEXT,
+            PRIMARY KEY (test_id, run_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS test_results_run ON test_results(run_id, status);
+        CREATE TABLE IF NOT EXISTS signatures (
+            id INTEGER PRIMARY KEY,
+            hash TEXT UNIQUE NOT NULL,
+            exception TEXT, normalized TEXT, sample_message TEXT, sample_stack TEXT
+        );
+        CREATE TABLE IF NOT EXISTS failure_signatures (
+            run_id INTEGER NOT NULL, test_id INTEGER NOT NULL, signature_id INTEGER NOT NULL,
+            PRIMARY KEY (run_id, test_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS failure_signatures_sig ON failure_signatures(signature_id, run_id);
+    """
+    # 结构版本：旧版本入库的运行缺少失败签名，升级后清空 xml_size 让补录重新解析
+    SCHEMA_VERSION = 1
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._write_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not self._initialized:
+            conn.executescript(self.SCHEMA)
+            if conn.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+                with conn:
+                    conn.execute("UPDATE runs SET xml_size = NULL")
+                conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            self._initialized = True
+        return conn
+
+    def needs_ingest(self, name, size, mtime):
+        """结果文件未入库或已变化"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT xml_size, xml_mtime FROM runs WHERE name = ?", (name,)).fetchone()
+        finally:
+            conn.close()
+        return row is None or row[0] != size or row[1] != mtime
+
+    def save_run(self, name, summary, tests, size, mtime):
+        """写入一次运行（同名运行先删除再写入）
+
+        tests 为 (module, abi, test_case, test, status, message, stack_trace)，失败用例同时按签名归类。
+        """
+        result, build = summary['result'], summary['build']
+        totals = summary['totals']
+
+        def to_int(value):
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
+
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    old = conn.execute("SELECT id FROM runs WHERE name = ?", (name,)).fetchone()
+                    if old:
+                        conn.execute("DELETE FROM modules WHERE run_id = ?", old)
+                        conn.execute("DELETE FROM test_results WHERE run_id = ?", old)
+                        conn.execute("DELETE FROM failure_signatures WHERE run_id = ?", old)
+                        conn.execute("DELETE FROM runs WHERE id = ?", old)
+                    run_id = conn.execute(
+                        "INSERT INTO runs (name, suite, plan, start_ms, end_ms, devices, device, fingerprint,"
+                        " pass, fail, skip, modules_done, modules_total, xml_size, xml_mtime, ingested_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (name, result.get('suite_name'), result.get('suite_plan'),
+                         to_int(result.get('start')) or int(mtime * 1000), to_int(result.get('end')),
+                         result.get('devices'), build.get('build_device'), build.get('build_fingerprint'),
+                         totals['pass'], totals['fail'], totals['skip'],
+                         to_int(summary['summary'].get('modules_done')),
+                         to_int(summary['summary'].get('modules_total')),
+                         size, mtime, datetime.now().isoformat())
+                    ).lastrowid
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO modules VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(run_id, m['name'], m['abi'], m['pass'], m['fail'], m['skip'], m['runtime_ms'], int(m['done']))
+                         for m in summary['modules']]
+                    )
+                    keys = [(module, abi, test_case, test) for module, abi, test_case, test, _, _, _ in tests]
+                    conn.executemany("INSERT OR IGNORE INTO tests (module, abi, test_case, name) VALUES (?, ?, ?, ?)", keys)
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO test_results (test_id, run_id, status, message)"
+                        " SELECT id, ?, ?, ? FROM tests WHERE module = ? AND abi = ? AND test_case = ? AND name = ?",
+                        [(run_id, status, message, module, abi, test_case, test)
+                         for module, abi, test_case, test, status, message, _ in tests]
+                    )
+
+                    # 失败签名：相同根因的失败归为一类
+                    failures = []
+                    for module, abi, test_case, test, status, message, stack in tests:
+                        if status != RESULT_STATUS_FAIL:
+                            continue
+                        signature = failure_signature(message, stack)
+                        conn.execute(
+                            "INSERT OR IGNORE INTO signatures (hash, exception, normalized, sample_message, sample_stack)"
+                            " VALUES (?, ?, ?, ?, ?)",
+                            (signature['hash'], signature['exception'], signature['normalized'],
+                             (message or '')[:REPORT_FAILURE_TEXT_LIMIT], (stack or '')[:REPORT_FAILURE_TEXT_LIMIT])
+                        )
+                        failures.append((run_id, signature['hash'], module, abi, test_case, test))
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO failure_signatures (run_id, test_id, signature_id)"
+                        " SELECT ?, t.id, s.id FROM tests t, signatures s WHERE s.hash = ?"
+                        " AND t.module = ? AND t.abi = ? AND t.test_case = ? AND t.name = ?",
+                        failures
+                    )
+                return run_id
+            finally:
+                conn.close()
+
+    def query(self, sql, params=()):
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    RECENT_RUNS = "recent AS (SELECT id, name, start_ms FROM runs WHERE (:suite = '' OR suite = :suite) ORDER BY start_ms DESC LIMIT :runs)"
+
+    def trend(self, suite='', module='', runs=50):
+        """最近 N 次运行的通过率（可限定模块）"""
+        if module:
+            sql = (f"WITH {self.RECENT_RUNS} "
+                   "SELECT r.name, r.start_ms, SUM(m.pass) AS pass, SUM(m.fail) AS fail, SUM(m.skip) AS skip,"
+                   " SUM(m.runtime_ms) AS runtime_ms FROM recent r JOIN modules m ON m.run_id = r.id"
+                   " WHERE m.name = :module GROUP BY r.id ORDER BY r.start_ms")
+        else:
+            sql = (f"WITH {self.RECENT_RUNS} "
+                   "SELECT r.name, r.start_ms, x.pass, x.fail, x.skip, x.device, x.fingerprint"
+                   " FROM recent r JOIN runs x ON x.id = r.id ORDER BY r.start_ms")
+        rows = self.query(sql, {'suite': suite, 'module': module, 'runs': runs})
+        for row in rows:
+            executed = (row['pass'] or 0) + (row['fail'] or 0)
+            row['pass_rate'] = round(row['pass'] * 100.0 / executed, 2) if executed else None
+        return rows
+
+    def flaky(self, suite='', runs=20, min_flips=2, limit=50):
+        """最近 N 次运行中在通过/失败之间反复切换的用例
+
+        用例没有失败记录且所属模块（同 ABI）在该次运行中执行过，即视为通过。
+        """
+        sql = (f"WITH {self.RECENT_RUNS}, "
+               "candidates AS (SELECT DISTINCT tr.test_id FROM test_results tr JOIN recent r ON r.id = tr.run_id"
+               f" WHERE tr.status = {RESULT_STATUS_FAIL}), "
+               "history AS (SELECT t.id AS test_id, r.start_ms, tr.status IS NOT NULL AS failed"
+               " FROM candidates c JOIN tests t ON t.id = c.test_id"
+               " JOIN modules m ON m.name = t.module AND m.abi = t.abi"
+               " JOIN recent r ON r.id = m.run_id"
+               " LEFT JOIN test_results tr ON tr.test_id = t.id AND tr.run_id = r.id"
+               f" WHERE tr.status IS NULL OR tr.status = {RESULT_STATUS_FAIL}), "
+               "flips AS (SELECT test_id, failed,"
+               " COALESCE(failed != LAG(failed) OVER (PARTITION BY test_id ORDER BY start_ms), 0) AS flip FROM history) "
+               "SELECT t.module, t.abi, t.test_case, t.name, SUM(f.flip) AS flips, SUM(f.failed) AS failures,"
+               " COUNT(*) AS runs FROM flips f JOIN tests t ON t.id = f.test_id"
+               " GROUP BY f.test_id HAVING flips >= :min_flips ORDER BY flips DESC, failures DESC LIMIT :limit")
+        return self.query(sql, {'suite': suite, 'runs': runs, 'min_flips': min_flips, 'limit': limit})
+
+    def clusters(self, suite='', runs=100, limit=50):
+        """最近 N 次运行的失败按签名聚类，按失败次数排序；首次/最近出现时间不受运行数窗口限制"""
+        seen = ("(SELECT {}(x2.start_ms) FROM failure_signatures f2 JOIN runs x2 ON x2.id = f2.run_id"
+                " WHERE f2.signature_id = s.id AND (:suite = '' OR x2.suite = :suite))")
+        sql = (f"WITH {self.RECENT_RUNS} "
+               "SELECT s.hash AS signature, s.exception, s.normalized, s.sample_message,"
+               " COUNT(*) AS failures, COUNT(DISTINCT fs.run_id) AS runs, COUNT(DISTINCT fs.test_id) AS tests,"
+               " COUNT(DISTINCT t.module) AS modules, GROUP_CONCAT(DISTINCT x.device) AS devices,"
+               f" {seen.format('MIN')} AS first_seen_ms, {seen.format('MAX')} AS last_seen_ms,"
+               " MIN(t.module || ' ' || t.test_case || '#' || t.name) AS sample_test"
+               " FROM recent r JOIN failure_signatures fs ON fs.run_id = r.id"
+               " JOIN runs x ON x.id = r.id JOIN signatures s ON s.id = fs.signature_id"
+               " JOIN tests t ON t.id = fs.test_id"
+               " GROUP BY s.id ORDER BY failures DESC LIMIT :limit")
+        return self.query(sql, {'suite': suite, 'runs': runs, 'limit': limit})
+
+    def cluster_members(self, signature, limit=200):
+        """某个签名下的全部失败（跨运行、设备）"""
+        sql = ("SELECT x.name AS run, x.start_ms, x.device, x.fingerprint, t.module, t.abi, t.test_case, t.name AS test,"
+               " tr.message FROM signatures s JOIN failure_signatures fs ON fs.signature_id = s.id"
+               " JOIN runs x ON x.id = fs.run_id JOIN tests t ON t.id = fs.test_id"
+               " LEFT JOIN test_results tr ON tr.test_id = fs.test_id AND tr.run_id = fs.run_id"
+               " WHERE s.hash = :signature ORDER BY x.start_ms DESC LIMIT :limit")
+        return self.query(sql, {'signature': signature, 'limit': limit})
+
+    def slowest(self, suite='', runs=10, limit=20):
+        """最近 N 次运行中平均耗时最长的模块"""
+        sql = (f"WITH {self.RECENT_RUNS} "
+               "SELECT m.name, m.abi, CAST(AVG(m.runtime_ms) AS INTEGER) AS avg_ms, MAX(m.runtime_ms) AS max_ms,"
+               " COUNT(*) AS runs FROM modules m JOIN recent r ON r.id = m.run_id"
+               " GROUP BY m.name, m.abi ORDER BY avg_ms DESC LIMIT :limit")
+        return self.query(sql, {'suite': suite, 'runs': runs, 'limit': limit})
+
+
+results_db = ResultsDatabase(RESULTS_DB)
+
+# 失败签名：去掉地址、行号、时间戳、数字等易变部分后取异常类型 + 消息 + 栈顶若干帧做哈希
+SIGNATURE_STACK_FRAMES = 5
+SIGNATURE_NORMALIZERS = [
+    (re.compile(r'0x[0-9a-fA-F]+'), '0x?'),
+    (re.compile(r'@[0-9a-fA-F]{4,}\b'), '@?'),
+    (re.compile(r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b'), '<uuid>'),
+    (re.compile(r'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:\.\d+)?'), '<time>'),
+    (re.compile(r'\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?'), '<time>'),
+    (re.compile(r'\d{1,2}:\d{2}:\d{2}(?:\.\d+)?'), '<time>'),
+    (re.compile(r'\.(java|kt|cpp|cc|c|h):\d+\)'), r'.\1)'),
+    (re.compile(r'\b\d+\b'), 'N'),
+    (re.compile(r'\s+'), ' '),
+]
+SIGNATURE_FRAME_RE = re.compile(r'^\s*(?:at |#\d+ |\s*#N )')
+
+
+def normalize_failure_text(text):
+    for pattern, replacement in SIGNATURE_NORMALIZERS:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+def failure_signature(message, stack_trace):
+    """失败消息和堆栈归一化后的签名"""
+    lines = (stack_trace or '').splitlines()
+    head = lines[0] if lines else (message or '')
+    exception = head.split(':', 1)[0].strip()[:200]
+    frames = [normalize_failure_text(line) for line in lines[1:] if SIGNATURE_FRAME_RE.match(line)]
+    normalized = '\n'.join([normalize_failure_text(head)[:300]] + frames[:SIGNATURE_STACK_FRAMES])
+    return {
+        'hash': hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16],
+        'exception': exception,
+        'normalized': normalized
+    }
+
+
+results_backfill_lock = threading.Lock()
+results_backfill_requested = threading.Event()     # 补录进行中又有新请求时，结束后再补录一遍
+
+
+def ingest_report(sftp, result_dir, name):
+    """流式解析一次运行的 test_result.xml 并入库；结果未变化时跳过"""
+    result_xml = f"{result_dir}/test_result.xml"
+    attr = sftp.stat(result_xml)
+    if not results_db.needs_ingest(name, attr.st_size, attr.st_mtime):
+        return False
+
+    tests = []
+
+    def collect(module, test_case, elem, outcome):
+        if outcome == 'pass' or module is None:
+            return
+        failure = elem.find('Failure')
+        message = failure.get('message', '')[:REPORT_FAILURE_TEXT_LIMIT] if failure is not None else None
+        stack = failure.findtext('StackTrace') if failure is not None else None
+        tests.append((module['name'], module['abi'], test_case or '', elem.get('name', ''),
+                      RESULT_STATUS_FAIL if outcome == 'fail' else RESULT_STATUS_SKIP, message, stack))
+
+    with sftp.open(result_xml, 'rb') as remote_file:
+        summary = parse_test_result_xml(open_remote_reader(remote_file, attr.st_size), on_test=collect)
+    results_db.save_run(name, summary, tests, attr.st_size, attr.st_mtime)
+    return True
+
+
+def backfill_results(config):
+    """补录 gms_test_results/ 下尚未入库或已变化的运行结果；已有补录在进行时合并为其后的一遍"""
+    results_backfill_requested.set()
+    ingested = 0
+    while results_backfill_requested.is_set() and results_backfill_lock.acquire(blocking=False):
+        try:
+            while results_backfill_requested.is_set():
+                results_backfill_requested.clear()
+                ingested += _backfill_results_pass(config)
+        finally:
+            results_backfill_lock.release()
+    if ingested:
+        print(f"[RESULTS] 已入库 {ingested} 次运行结果")
+    return ingested
+
+
+def _backfill_results_pass(config):
+    ingested = 0
+    ssh = get_ssh_connection(config)
+    if not ssh:
+        return 0
+    try:
+        results_base = f"/home/{config.get('ubuntu_user', 'hcq')}/gms_test_results"
+        list_cmd = (f"find '{results_base}' -mindepth 2 -maxdepth 2 -name test_result.xml "
+                    f"-printf '%h\\n' 2>/dev/null")
+        output, _, _ = execute_ssh_command(ssh, list_cmd, timeout=60)
+        sftp = ssh.open_sftp()
+        try:
+            for result_dir in output.splitlines():
+                try:
+                    if ingest_report(sftp, result_dir, os.path.basename(result_dir)):
+                        ingested += 1
+                except (IOError, ET.ParseError) as e:
+                    print(f"[RESULTS] Skip {result_dir}: {e}")
+        finally:
+            sftp.close()
+        return_ssh_connection(ssh)
+    except Exception as e:
+        print(f"[RESULTS] Error backfilling results: {e}")
+        ssh.close()
+    return ingested
+
+
+def results_backfill_task():
+    time.sleep(RESULTS_BACKFILL_DELAY)
+    backfill_results(load_config())
+
+threading.Thread(target=results_backfill_task, daemon=True).start()
+
+
+@app.route('/api/reports/list')
+def list_test_reports():
+    """List test report directories with summary information (cached, paginated)"""
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', REPORT_PAGE_SIZE, type=int), 1), 500)
+    force = request.args.get('refresh', 'false').lower() == 'true'
+
+    config = load_config()
+    ubuntu_user = config.get('ubuntu_user', 'hcq')
+    results_base = f"/home/{ubuntu_user}/gms_test_results"
+
+    scanned = False
+    ssh = get_ssh_connection(config)
+    if ssh:
+        try:
+            scanned = report_index.refresh(ssh, results_base, force)
+        except Exception as e:
+            print(f"[ERROR] Error listing test reports: {e}")
+        finally:
+            return_ssh_connection(ssh)
+
+    reports, total, scanned_at = report_index.page(offset, limit)
+    return jsonify({
+        'reports': reports,
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'cached': not scanned,
+        'scanned_at': datetime.fromtimestamp(scanned_at).isoformat() if scanned_at else None
+    })
+
+@app.route('/api/reports/diff')
+def diff_reports():
+    """对比两次运行（base -> target）的用例结果"""
+    base_ts = request.args.get('base', '')
+    target_ts = request.args.get('target', '')
+    for ts in (base_ts, target_ts):
+        if not REPORT_TIMESTAMP_RE.match(ts) or ts.strip('.') == '':
+            return jsonify({'success': False, 'error': 'base and target report timestamps are required'}), 400
 
     config = load_config()
     ssh = get_ssh_connection(config)
     if not ssh:
         return jsonify({'success': False, 'error': 'SSH connection failed'}), 500
 
+    results_base = f"/home/{config.get('ubuntu_user', 'hcq')}/gms_test_results"
+    start = time.time()
     try:
-        # Read file content
-        cat_cmd = f"cat '{file_path}' 2>/dev/null"
-        output, error, code = execute_ssh_command(ssh, cat_cmd, timeout=30)
+        sftp = ssh.open_sftp()
+        try:
+            base = load_run_columns(sftp, results_base, base_ts)
+            target = load_run_columns(sftp, results_base, target_ts)
+        finally:
+            sftp.close()
+        return_ssh_connection(ssh)
+        loaded = time.time()
+        diff = diff_run_columns(base, target)
+        return jsonify({
+            'success': True, 'base': base_ts, 'target': target_ts,
+            'base_tests': len(base), 'target_tests': len(target),
+            'load_ms': round((loaded - start) * 1000, 1),
+            'diff_ms': round((time.time() - loaded) * 1000, 1),
+            **diff
+        })
+    except FileNotFoundError:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': 'test_result.xml not found'}), 404
+    except ET.ParseError as e:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': f'Invalid test_result.xml: {e}'}), 422
+    except Exception as e:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/reports/<report_timestamp>')
+def get_report_summary(report_timestamp):
+    """单个报告的完整摘要：按模块/ABI 统计、耗时和失败用例"""
+    if not REPORT_TIMESTAMP_RE.match(report_timestamp) or report_timestamp.strip('.') == '':
+        return jsonify({'success': False, 'error': 'Invalid report timestamp'}), 400
+
+    config = load_config()
+    ssh = get_ssh_connection(config)
+    if not ssh:
+        return jsonify({'success': False, 'error': 'SSH connection failed'}), 500
+
+    results_base = f"/home/{config.get('ubuntu_user', 'hcq')}/gms_test_results"
+    try:
+        summary = load_report_summary(ssh, results_base, report_timestamp)
+        return_ssh_connection(ssh)
+        return jsonify({'success': True, 'timestamp': report_timestamp, **summary})
+    except FileNotFoundError:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': 'test_result.xml not found'}), 404
+    except ET.ParseError as e:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': f'Invalid test_result.xml: {e}'}), 422
+    except Exception as e:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# 报告文件列表：一次 find 取得全部文件的类型、大小和 mtime；已完成的报告不再变化，按目录缓存
+REPORT_FILES_CACHE_SIZE = 32
+REPORT_FILES_ACTIVE_TTL = 10    # 未完成（无 test_result.xml）的报告目录缓存时间（秒）
+REPORT_FILES_PAGE_SIZE = 100
+report_files_cache = OrderedDict()  # report_dir -> (listed_at, finished, files, dirs)
+report_files_lock = threading.Lock()
+
+
+def scan_report_files(ssh, report_dir):
+    """单次 find 列出报告目录下的所有文件，并汇总每个子目录的文件数和大小"""
+    list_cmd = f"find '{report_dir}' -mindepth 1 -printf '%y %s %T@ %P\\n' 2>/dev/null"
+    output, _, _ = execute_ssh_command(ssh, list_cmd, timeout=60)
+
+    files = []
+    dirs = {'': {'path': '', 'files': 0, 'size': 0}}
+    for line in output.splitlines():
+        parts = line.split(' ', 3)
+        if len(parts) < 4:
+            continue
+        kind, size, mtime, rel_path = parts
+        if kind == 'd':
+            dirs.setdefault(rel_path, {'path': rel_path, 'files': 0, 'size': 0})
+            continue
+        if kind != 'f':
+            continue
+        size = int(size)
+        files.append({
+            'name': os.path.basename(rel_path),
+            'path': f"{report_dir}/{rel_path}",
+            'relative_path': rel_path,
+            'dir': os.path.dirname(rel_path),
+            'size': size,
+            'mtime': float(mtime)
+        })
+        # 大小和文件数向上累加到每一级父目录
+        parent = os.path.dirname(rel_path)
+        while True:
+            entry = dirs.setdefault(parent, {'path': parent, 'files': 0, 'size': 0})
+            entry['files'] += 1
+            entry['size'] += size
+            if not parent:
+                break
+            parent = os.path.dirname(parent)
+
+    finished = any(f['relative_path'] == 'test_result.xml' for f in files)
+    return files, sorted(dirs.values(), key=lambda d: d['path']), finished
+
+
+def get_report_files(ssh, report_dir, refresh=False):
+    """读取缓存或重新扫描报告目录"""
+    with report_files_lock:
+        cached = report_files_cache.get(report_dir)
+        if cached and not refresh and (cached[1] or time.time() - cached[0] < REPORT_FILES_ACTIVE_TTL):
+            report_files_cache.move_to_end(report_dir)
+            return cached[2], cached[3], True
+
+    files, dirs, finished = scan_report_files(ssh, report_dir)
+    with report_files_lock:
+        report_files_cache[report_dir] = (time.time(), finished, files, dirs)
+        while len(report_files_cache) > REPORT_FILES_CACHE_SIZE:
+            report_files_cache.popitem(last=False)
+    return files, dirs, False
+
+
+@app.route('/api/reports/<path:report_timestamp>/files')
+def list_report_files(report_timestamp):
+    """List files in a report directory (single scan, cached, sortable, paginated)
+
+    参数: offset, limit, sort=name|path|size|mtime, order=asc|desc, pattern=glob, dir=子目录, refresh=true
+    """
+    if not REPORT_TIMESTAMP_RE.match(report_timestamp) or report_timestamp.strip('.') == '':
+        return jsonify({'success': False, 'error': 'Invalid report timestamp'}), 400
+
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', REPORT_FILES_PAGE_SIZE, type=int), 1), 1000)
+    sort_key = request.args.get('sort', 'path')
+    if sort_key not in ('name', 'path', 'size', 'mtime'):
+        sort_key = 'path'
+    descending = request.args.get('order', 'desc' if sort_key in ('size', 'mtime') else 'asc') == 'desc'
+    pattern = request.args.get('pattern', '').strip()
+    sub_dir = request.args.get('dir', '').strip().strip('/')
+    refresh = request.args.get('refresh', 'false').lower() == 'true'
+
+    config = load_config()
+    ssh = get_ssh_connection(config)
+    if not ssh:
+        return jsonify({'success': False, 'error': 'SSH connection failed'}), 500
 
+    try:
+        ubuntu_user = config.get('ubuntu_user', 'hcq')
+        report_dir = f"/home/{ubuntu_user}/gms_test_results/{report_timestamp}"
+        files, dirs, cached = get_report_files(ssh, report_dir, refresh)
+        return_ssh_connection(ssh)
+    except Exception as e:
         return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    selected = files
+    if sub_dir:
+        prefix = sub_dir + '/'
+        selected = [f for f in selected if f['relative_path'].startswith(prefix)]
+    if pattern:
+        # 含 / 的模式匹配相对路径，否则只匹配文件名
+        field = 'relative_path' if '/' in pattern else 'name'
+        selected = [f for f in selected if fnmatch.fnmatch(f[field], pattern)]
+    field = 'relative_path' if sort_key == 'path' else sort_key
+    selected = sorted(selected, key=lambda f: f[field], reverse=descending)
+
+    return jsonify({
+        'success': True,
+        'files': selected[offset:offset + limit],
+        'total': len(selected),
+        'offset': offset,
+        'limit': limit,
+        'dirs': dirs,
+        'cached': cached
+    })
 
-        # Determine content type based on file extension
-        file_ext = os.path.splitext(file_path)[1].lower()
-        if file_ext in ['.xml', '.html']:
+# 远端报告文件查看：SFTP 按字节/行范围读取，大文件只返回头尾预览；报告文件按 (路径, 大小, mtime) 缓存
+REMOTE_VIEW_MAX_BYTES = 1024 * 1024         # 小于该大小的文件整体返回
+REMOTE_VIEW_PREVIEW_BYTES = 64 * 1024       # 超限时头部和尾部各返回的字节数
+REMOTE_VIEW_MAX_CHUNK = 1024 * 1024         # 单次字节范围读取上限
+REMOTE_VIEW_MAX_LINES = 5000                # 单次行范围读取上限
+REMOTE_VIEW_LINE_STRIDE = 1000              # 行偏移索引的采样间隔
+REMOTE_VIEW_STREAM_CHUNK = 256 * 1024
+REMOTE_VIEW_CACHE_BYTES = 32 * 1024 * 1024
+remote_view_cache = OrderedDict()   # (path, size, mtime, kind, args) -> (payload, 估算字节数)
+remote_view_cache_bytes = 0
+remote_view_lock = threading.Lock()
+CONTENT_TYPES = {
+    '.xml': 'text/html', '.html': 'text/html', '.htm': 'text/html',
+    '.json': 'application/json', '.log': 'text/plain', '.txt': 'text/plain',
+    '.png': 'image/png', '.jpg': 'image/jpeg', '.zip': 'application/zip', '.gz': 'application/gzip'
+}
+
+
+def resolve_report_path(config, path):
+    """限制只能访问 gms_test_results/ 下的文件"""
+    results_base = f"/home/{config.get('ubuntu_user', 'hcq')}/gms_test_results"
+    normalized = posixpath.normpath(path or '')
+    if not normalized.startswith(results_base + '/'):
+        raise ValueError('Path is outside the test results directory')
+    return normalized
+
+
+def sniff_content_type(path, head):
+    """根据扩展名和文件头判断内容类型，返回 (content_type, 是否二进制)"""
+    name = path[:-3] if path.endswith('.gz') else path
+    content_type = CONTENT_TYPES.get(os.path.splitext(name)[1].lower())
+    if head.startswith(b'\x1f\x8b') and not path.endswith('.gz'):
+        return 'application/gzip', True
+    if head.startswith(b'PK\x03\x04'):
+        return 'application/zip', True
+    if head.startswith(b'\x89PNG'):
+        return 'image/png', True
+    if b'\x00' in head:
+        return content_type or 'application/octet-stream', True
+    if not content_type:
+        stripped = head.lstrip()
+        if stripped.startswith(b'<?xml') or stripped.startswith(b'<'):
             content_type = 'text/html'
-        elif file_ext == '.json':
+        elif stripped[:1] in (b'{', b'['):
             content_type = 'application/json'
-        elif file_ext in ['.log', '.txt']:
-            content_type = 'text/plain'
         else:
             content_type = 'text/plain'
+    return content_type, content_type.startswith('image/') or content_type in ('application/zip', 'application/gzip')
+
+
+def remote_view_cached(key, build):
+    """按文件版本缓存查看结果，总大小超限时淘汰最久未用的项"""
+    global remote_view_cache_bytes
+    with remote_view_lock:
+        if key in remote_view_cache:
+            remote_view_cache.move_to_end(key)
+            return remote_view_cache[key][0]
+
+    payload = build()
+    cost = len(json.dumps(payload, default=str)) if not isinstance(payload, array) else payload.itemsize * len(payload)
+    with remote_view_lock:
+        if key not in remote_view_cache and cost <= REMOTE_VIEW_CACHE_BYTES // 4:
+            remote_view_cache[key] = (payload, cost)
+            remote_view_cache_bytes += cost
+            while remote_view_cache_bytes > REMOTE_VIEW_CACHE_BYTES:
+                _, (_, evicted) = remote_view_cache.popitem(last=False)
+                remote_view_cache_bytes -= evicted
+    return payload
+
+
+def open_remote_text(sftp, path, size):
+    """打开远端文件的有界预读流；.gz 文件另返回解压流（只能顺序读取）"""
+    reader = open_remote_reader(sftp.open(path, 'rb'), size, close_file=True)
+    if path.endswith('.gz'):
+        return gzip.GzipFile(fileobj=reader), reader
+    return reader, reader
+
+
+def read_remote_preview(sftp, path, attr):
+    """小文件返回全部内容，大文件返回头尾预览"""
+    stream, remote_file = open_remote_text(sftp, path, attr.st_size)
+    with remote_file:
+        compressed = path.endswith('.gz')
+        if not compressed and attr.st_size <= REMOTE_VIEW_MAX_BYTES:
+            head = stream.read()
+            tail = b''
+            truncated = False
+        else:
+            head = stream.read(REMOTE_VIEW_MAX_BYTES if compressed else REMOTE_VIEW_PREVIEW_BYTES)
+            tail = b''
+            truncated = True
+            if compressed:
+                # 压缩文件无法定位尾部，只提供头部预览
+                truncated = bool(stream.read(1))
+            else:
+                remote_file.seek(max(attr.st_size - REMOTE_VIEW_PREVIEW_BYTES, len(head)))
+                tail = remote_file.read(REMOTE_VIEW_PREVIEW_BYTES)
+
+    content_type, binary = sniff_content_type(path, head[:512])
+    result = {
+        'content_type': content_type,
+        'binary': binary,
+        'size': attr.st_size,
+        'mtime': datetime.fromtimestamp(attr.st_mtime).isoformat(),
+        'compressed': path.endswith('.gz'),
+        'truncated': truncated,
+        'content': '' if binary else head.decode('utf-8', errors='replace'),
+    }
+    if truncated and tail and not binary:
+        result['tail'] = tail.decode('utf-8', errors='replace')
+    return result
+
+
+def read_remote_bytes(sftp, path, attr, offset, length):
+    """读取 [offset, offset+length) 字节，未到文件尾时截断到最后一个完整行"""
+    stream, remote_file = open_remote_text(sftp, path, attr.st_size)
+    with remote_file:
+        if path.endswith('.gz'):
+            # 解压流只能顺序跳过
+            remaining = offset
+            while remaining > 0:
+                skipped = len(stream.read(min(remaining, REMOTE_VIEW_STREAM_CHUNK)))
+                if not skipped:
+                    break
+                remaining -= skipped
+        else:
+            remote_file.seek(offset)
+        data = stream.read(length + 1)
+    eof = len(data) <= length
+    data = data[:length]
+    if not eof:
+        cut = data.rfind(b'\n')
+        if cut >= 0:
+            data = data[:cut + 1]
+    return {
+        'content': data.decode('utf-8', errors='replace'),
+        'offset': offset,
+        'next_offset': offset + len(data),
+        'eof': eof,
+        'size': attr.st_size
+    }
+
+
+def build_remote_line_index(sftp, path, size):
+    """顺序读取一遍文件，记录每 REMOTE_VIEW_LINE_STRIDE 行的起始字节偏移"""
+    offsets = array('Q', [0])
+    stream, remote_file = open_remote_text(sftp, path, size)
+    with remote_file:
+        position = 0
+        for line_no, line in enumerate(stream, 1):
+            position += len(line)
+            if line_no % REMOTE_VIEW_LINE_STRIDE == 0:
+                offsets.append(position)
+    return offsets
+
+
+def read_remote_lines(sftp, path, attr, line_no, count):
+    """从第 line_no 行（0 起）读取 count 行；普通文件借助缓存的行偏移索引直接定位"""
+    lines = []
+    stream, remote_file = open_remote_text(sftp, path, attr.st_size)
+    with remote_file:
+        if path.endswith('.gz'):
+            source = islice(stream, line_no, line_no + count)
+        else:
+            offsets = remote_view_cached((path, attr.st_size, attr.st_mtime, 'line_index', None),
+                                         lambda: build_remote_line_index(sftp, path, attr.st_size))
+            block, skip = divmod(line_no, REMOTE_VIEW_LINE_STRIDE)
+            if block >= len(offsets):
+                return {'lines': [], 'line': line_no, 'next_line': line_no, 'eof': True}
+            remote_file.seek(offsets[block])
+            source = islice(remote_file, skip, skip + count)
+        for raw in source:
+            lines.append(raw.decode('utf-8', errors='replace').rstrip('\r\n'))
+    return {
+        'lines': lines,
+        'line': line_no,
+        'next_line': line_no + len(lines),
+        'eof': len(lines) < count
+    }
+
+
+def iter_remote_file(ssh, sftp, path, start, end, compress):
+    """分块产出远端文件 [start, end] 字节，可选边读边 gzip 压缩；结束后归还 SSH 连接"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    try:
+        with sftp.open(path, 'rb') as remote_file:
+            reader = open_remote_reader(remote_file, end + 1)
+            reader.seek(start)
+            remaining = end + 1 - start
+            while remaining > 0:
+                chunk = reader.read(min(REMOTE_VIEW_STREAM_CHUNK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                if chunk:
+                    yield chunk
+        if compressor:
+            yield compressor.flush()
+    finally:
+        sftp.close()
+        return_ssh_connection(ssh)
 
-        return jsonify({
-            'success': True,
-            'content': output,
-            'content_type': content_type
-        })
 
+def stream_remote_file(ssh, sftp, path, attr):
+    """原始文件下载：支持单段 Range（206），客户端支持时按 gzip 传输"""
+    size = attr.st_size
+    download_name = os.path.basename(path)
+    headers = {'Accept-Ranges': 'bytes', 'Content-Disposition': f'attachment; filename="{download_name}"',
+               'Last-Modified': time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(attr.st_mtime))}
+    range_match = re.match(r'bytes=(\d*)-(\d*)$', request.headers.get('Range', '').strip())
+    accepts_gzip = 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+
+    if range_match and (range_match.group(1) or range_match.group(2)):
+        first, last = range_match.groups()
+        if first:
+            start, end = int(first), min(int(last) if last else size - 1, size - 1)
+        else:
+            start, end = max(size - int(last), 0), size - 1
+        if start > end or start >= size:
+            sftp.close()
+            return_ssh_connection(ssh)
+            return Response(status=416, headers={'Content-Range': f'bytes */{size}'})
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        headers['Content-Length'] = str(end - start + 1)
+        return Response(stream_with_context(iter_remote_file(ssh, sftp, path, start, end, False)),
+                        status=206, mimetype='application/octet-stream', headers=headers)
+
+    if path.endswith('.gz') and accepts_gzip:
+        # 已压缩文件直接按 gzip 编码传输，浏览器自动解压
+        headers['Content-Encoding'] = 'gzip'
+        headers['Content-Disposition'] = f'attachment; filename="{download_name[:-3]}"'
+        compress = False
+    elif accepts_gzip and not path.endswith(('.zip', '.png', '.jpg')):
+        headers['Content-Encoding'] = 'gzip'
+        compress = True
+    else:
+        headers['Content-Length'] = str(size)
+        compress = False
+    headers['Vary'] = 'Accept-Encoding'
+    return Response(stream_with_context(iter_remote_file(ssh, sftp, path, 0, size - 1, compress)),
+                    mimetype='application/octet-stream', headers=headers)
+
+
+@app.route('/api/reports/view')
+def view_report_file():
+    """View a test report file
+
+    默认返回内容预览（大文件只含头尾）；offset/length 按字节范围读取，line/lines 按行范围读取，
+    raw=true 流式下载原始文件（支持 Range 和 gzip 传输）。
+    """
+    config = load_config()
+    try:
+        file_path = resolve_report_path(config, request.args.get('path'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e) if request.args.get('path') else 'File path is required'}), 400
+
+    ssh = get_ssh_connection(config)
+    if not ssh:
+        return jsonify({'success': False, 'error': 'SSH connection failed'}), 500
+
+    sftp = None
+    try:
+        sftp = ssh.open_sftp()
+        attr = sftp.stat(file_path)
+        version = (file_path, attr.st_size, attr.st_mtime)
+
+        if request.args.get('raw', 'false').lower() == 'true':
+            response = stream_remote_file(ssh, sftp, file_path, attr)
+            sftp = None     # 由流式响应负责关闭
+            return response
+
+        if 'offset' in request.args or 'length' in request.args:
+            offset = max(request.args.get('offset', 0, type=int), 0)
+            length = min(max(request.args.get('length', REMOTE_VIEW_PREVIEW_BYTES, type=int), 1), REMOTE_VIEW_MAX_CHUNK)
+            result = remote_view_cached(version + ('bytes', (offset, length)),
+                                        lambda: read_remote_bytes(sftp, file_path, attr, offset, length))
+        elif 'line' in request.args or 'lines' in request.args:
+            line_no = max(request.args.get('line', 0, type=int), 0)
+            count = min(max(request.args.get('lines', 500, type=int), 1), REMOTE_VIEW_MAX_LINES)
+            result = remote_view_cached(version + ('lines', (line_no, count)),
+                                        lambda: read_remote_lines(sftp, file_path, attr, line_no, count))
+        else:
+            result = remote_view_cached(version + ('preview', None),
+                                        lambda: read_remote_preview(sftp, file_path, attr))
+
+        sftp.close()
+        sftp = None
+        return_ssh_connection(ssh)
+        return jsonify({'success': True, 'path': file_path, **result})
+
+    except FileNotFoundError:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': 'File not found'}), 404
     except Exception as e:
         return_ssh_connection(ssh)
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if sftp:
+            sftp.close()
+
+# ==================== Results Queries ====================
+def results_query_args():
+    """解析结果查询的公共参数"""
+    return {
+        'suite': request.args.get('suite', '').strip(),
+        'runs': min(max(request.args.get('runs', 20, type=int), 1), 5000),
+    }
+
+@app.route('/api/results/trend')
+def results_trend():
+    """最近 N 次运行的通过率趋势（module 参数可限定单个模块）"""
+    start = time.time()
+    args = results_query_args()
+    rows = results_db.trend(args['suite'], request.args.get('module', '').strip(), args['runs'])
+    return jsonify({'success': True, 'runs': rows, 'elapsed_ms': round((time.time() - start) * 1000, 1)})
+
+@app.route('/api/results/flaky')
+def results_flaky():
+    """最近 N 次运行中结果反复切换的用例"""
+    start = time.time()
+    args = results_query_args()
+    rows = results_db.flaky(args['suite'], args['runs'],
+                            max(request.args.get('min_flips', 2, type=int), 1),
+                            min(max(request.args.get('limit', 50, type=int), 1), 500))
+    return jsonify({'success': True, 'tests': rows, 'elapsed_ms': round((time.time() - start) * 1000, 1)})
+
+@app.route('/api/results/slowest')
+def results_slowest():
+    """最近 N 次运行中平均耗时最长的模块"""
+    start = time.time()
+    args = results_query_args()
+    rows = results_db.slowest(args['suite'], args['runs'],
+                              min(max(request.args.get('limit', 20, type=int), 1), 500))
+    return jsonify({'success': True, 'modules': rows, 'elapsed_ms': round((time.time() - start) * 1000, 1)})
+
+@app.route('/api/reports/clusters')
+def results_clusters():
+    """跨运行、设备的失败签名聚类；signature 参数返回该类的全部失败"""
+    start = time.time()
+    signature = request.args.get('signature', '').strip()
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 1000)
+    if signature:
+        rows = results_db.cluster_members(signature, limit)
+        return jsonify({'success': True, 'signature': signature, 'failures': rows,
+                        'elapsed_ms': round((time.time() - start) * 1000, 1)})
+    args = results_query_args()
+    rows = results_db.clusters(args['suite'], args['runs'], limit)
+    return jsonify({'success': True, 'clusters': rows, 'elapsed_ms': round((time.time() - start) * 1000, 1)})
+
+@app.route('/api/results/backfill', methods=['POST'])
+def results_backfill():
+    """后台补录远端历史运行结果"""
+    threading.Thread(target=backfill_results, args=(load_config(),), daemon=True).start()
+    return jsonify({'success': True, 'message': 'Backfill started'})
+
+# zip 归档浏览：ZipFile 直接作用于 SFTP 文件对象，只按需读取中央目录和单个成员的字节区间
+ZIP_MEMBERS_PAGE_SIZE = 200
+
+
+def resolve_report_zip(config, report_timestamp):
+    """报告对应的 zip：默认 <timestamp>.zip，zip 参数可指定结果目录下的其他归档"""
+    results_base = f"/home/{config.get('ubuntu_user', 'hcq')}/gms_test_results"
+    relative = request.args.get('zip', '').strip('/') or f"{report_timestamp}.zip"
+    return resolve_report_path(config, posixpath.join(results_base, relative))
+
+
+def list_zip_members(sftp, zip_path, attr):
+    """读取中央目录，列出全部成员"""
+    with sftp.open(zip_path, 'rb') as remote_file:
+        with zipfile.ZipFile(remote_file) as zf:
+            return [{
+                'name': info.filename,
+                'size': info.file_size,
+                'compressed_size': info.compress_size,
+                'mtime': datetime(*info.date_time).isoformat(),
+                'is_dir': info.is_dir()
+            } for info in zf.infolist()]
+
+
+def iter_zip_member(ssh, sftp, zip_path, member):
+    """分块解压产出单个成员；结束后归还 SSH 连接"""
+    try:
+        with sftp.open(zip_path, 'rb') as remote_file:
+            with zipfile.ZipFile(open_remote_reader(remote_file, remote_file.stat().st_size)) as zf:
+                with zf.open(member) as stream:
+                    while True:
+                        chunk = stream.read(REMOTE_VIEW_STREAM_CHUNK)
+                        if not chunk:
+                            break
+                        yield chunk
+    finally:
+        sftp.close()
+        return_ssh_connection(ssh)
+
+
+@app.route('/api/reports/<report_timestamp>/zip')
+def list_report_zip(report_timestamp):
+    """列出结果 zip 的成员（offset, limit, pattern），无需在主机上解压"""
+    if not REPORT_TIMESTAMP_RE.match(report_timestamp) or report_timestamp.strip('.') == '':
+        return jsonify({'success': False, 'error': 'Invalid report timestamp'}), 400
+    config = load_config()
+    try:
+        zip_path = resolve_report_zip(config, report_timestamp)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', ZIP_MEMBERS_PAGE_SIZE, type=int), 1), 1000)
+    pattern = request.args.get('pattern', '').strip()
+
+    ssh = get_ssh_connection(config)
+    if not ssh:
+        return jsonify({'success': False, 'error': 'SSH connection failed'}), 500
+    try:
+        sftp = ssh.open_sftp()
+        try:
+            attr = sftp.stat(zip_path)
+            members = remote_view_cached((zip_path, attr.st_size, attr.st_mtime, 'zip', None),
+                                         lambda: list_zip_members(sftp, zip_path, attr))
+        finally:
+            sftp.close()
+        return_ssh_connection(ssh)
+    except FileNotFoundError:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': 'Zip archive not found'}), 404
+    except zipfile.BadZipFile as e:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': f'Invalid zip archive: {e}'}), 422
+    except Exception as e:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    if pattern:
+        field_is_path = '/' in pattern
+        members = [m for m in members
+                   if fnmatch.fnmatch(m['name'] if field_is_path else posixpath.basename(m['name'].rstrip('/')), pattern)]
+    return jsonify({
+        'success': True,
+        'zip': zip_path,
+        'size': attr.st_size,
+        'members': members[offset:offset + limit],
+        'total': len(members),
+        'offset': offset,
+        'limit': limit
+    })
+
+
+@app.route('/api/reports/<report_timestamp>/zip/member')
+def view_report_zip_member(report_timestamp):
+    """读取 zip 中的单个成员：默认返回预览（超过上限只含开头），raw=true 流式下载"""
+    if not REPORT_TIMESTAMP_RE.match(report_timestamp) or report_timestamp.strip('.') == '':
+        return jsonify({'success': False, 'error': 'Invalid report timestamp'}), 400
+    member = request.args.get('name', '')
+    if not member:
+        return jsonify({'success': False, 'error': 'Member name is required'}), 400
+    config = load_config()
+    try:
+        zip_path = resolve_report_zip(config, report_timestamp)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    ssh = get_ssh_connection(config)
+    if not ssh:
+        return jsonify({'success': False, 'error': 'SSH connection failed'}), 500
+
+    sftp = None
+    try:
+        sftp = ssh.open_sftp()
+        attr = sftp.stat(zip_path)
+        if request.args.get('raw', 'false').lower() == 'true':
+            # 先确认成员存在：响应头发出后生成器里的 KeyError 只会变成 200 空响应
+            with sftp.open(zip_path, 'rb') as remote_file:
+                with zipfile.ZipFile(remote_file) as zf:
+                    info = zf.getinfo(member)
+            stream = iter_zip_member(ssh, sftp, zip_path, member)
+            sftp = None     # 由流式响应负责关闭
+            return Response(stream_with_context(stream), mimetype='application/octet-stream',
+                            headers={'Content-Disposition': f'attachment; filename="{posixpath.basename(member)}"',
+                                     'Content-Length': str(info.file_size)})
+
+        def build_preview():
+            with sftp.open(zip_path, 'rb') as remote_file:
+                with zipfile.ZipFile(open_remote_reader(remote_file, attr.st_size)) as zf:
+                    info = zf.getinfo(member)
+                    with zf.open(info) as stream:
+                        head = stream.read(REMOTE_VIEW_MAX_BYTES)
+            content_type, binary = sniff_content_type(member, head[:512])
+            return {
+                'name': member, 'size': info.file_size, 'compressed_size': info.compress_size,
+                'content_type': content_type, 'binary': binary,
+                'truncated': info.file_size > len(head),
+                'content': '' if binary else head.decode('utf-8', errors='replace')
+            }
+
+        result = remote_view_cached((zip_path, attr.st_size, attr.st_mtime, 'zip_member', member), build_preview)
+        sftp.close()
+        sftp = None
+        return_ssh_connection(ssh)
+        return jsonify({'success': True, 'zip': zip_path, **result})
+
+    except (FileNotFoundError, KeyError):
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': 'Zip archive or member not found'}), 404
+    except zipfile.BadZipFile as e:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': f'Invalid zip archive: {e}'}), 422
+    except Exception as e:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if sftp:
+            sftp.close()
+
+
+# 报告目录打包下载：远端 tar/zip 输出到 stdout，经 SSH 通道分块转发，两端都不落临时文件
+ARCHIVE_CHUNK = 256 * 1024
+ARCHIVE_WINDOW_SIZE = 8 * 1024 * 1024       # 加大 SSH 通道窗口，避免高延迟链路上吞吐受限
+ARCHIVE_FORMATS = {
+    'tar.zst': ('application/zstd', 'zstd'),
+    'tar.gz': ('application/gzip', None),
+    'zip': ('application/zip', 'zip'),
+}
+remote_tools = {}                           # 远端可用的压缩工具，进程内缓存
+remote_tools_lock = threading.Lock()
+
+
+def remote_has_tool(ssh, tool):
+    """检查远端是否安装了 zstd / zip / pigz"""
+    with remote_tools_lock:
+        if not remote_tools:
+            output, _, _ = execute_ssh_command(ssh, "for t in zstd zip pigz; do command -v $t >/dev/null && echo $t; done", timeout=10)
+            remote_tools.update({t: t in output.split() for t in ('zstd', 'zip', 'pigz')})
+        return remote_tools.get(tool, False)
+
+
+def build_archive_command(ssh, parent, name, archive_format):
+    """生成远端打包命令，所需工具缺失时退回 tar.gz；返回 (命令, 实际格式)"""
+    tool = ARCHIVE_FORMATS[archive_format][1]
+    if tool and not remote_has_tool(ssh, tool):
+        archive_format = 'tar.gz'
+    quoted_parent, quoted_name = shlex.quote(parent), shlex.quote(name)
+    if archive_format == 'tar.zst':
+        command = f"tar -C {quoted_parent} -cf - {quoted_name} | zstd -q -T0 -3 -c"
+    elif archive_format == 'zip':
+        command = f"cd {quoted_parent} && zip -q -r - {quoted_name}"
+    else:
+        compressor = 'pigz -c' if remote_has_tool(ssh, 'pigz') else 'gzip -c'
+        command = f"tar -C {quoted_parent} -cf - {quoted_name} | {compressor}"
+    # 整条管道的 stderr 都丢弃，避免 stderr 窗口写满阻塞远端进程
+    return f"( {command} ) 2>/dev/null", archive_format
+
+
+def iter_remote_command_output(ssh, command):
+    """在独立 SSH 通道上执行命令并按块产出 stdout；客户端断开时关闭通道"""
+    channel = ssh.get_transport().open_session(window_size=ARCHIVE_WINDOW_SIZE)
+    try:
+        channel.exec_command(command)
+        while True:
+            chunk = channel.recv(ARCHIVE_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+        exit_status = channel.recv_exit_status()
+        if exit_status != 0:
+            print(f"[ARCHIVE] Remote archive command exited with {exit_status}: {command}")
+    finally:
+        channel.close()
+        return_ssh_connection(ssh)
+
+
+@app.route('/api/reports/<report_timestamp>/archive')
+def download_report_archive(report_timestamp):
+    """打包下载整个报告目录或其中的子目录（format=tar.zst|tar.gz|zip，dir=子目录）"""
+    if not REPORT_TIMESTAMP_RE.match(report_timestamp) or report_timestamp.strip('.') == '':
+        return jsonify({'success': False, 'error': 'Invalid report timestamp'}), 400
+    archive_format = request.args.get('format', 'tar.zst')
+    if archive_format not in ARCHIVE_FORMATS:
+        return jsonify({'success': False, 'error': f'Unsupported format: {archive_format}'}), 400
+
+    config = load_config()
+    try:
+        target = resolve_report_path(config, posixpath.join(
+            f"/home/{config.get('ubuntu_user', 'hcq')}/gms_test_results", report_timestamp,
+            request.args.get('dir', '').strip('/')))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    ssh = get_ssh_connection(config)
+    if not ssh:
+        return jsonify({'success': False, 'error': 'SSH connection failed'}), 500
+
+    try:
+        _, _, code = execute_ssh_command(ssh, f"test -d {shlex.quote(target)}", timeout=5)
+        if code != 0:
+            return_ssh_connection(ssh)
+            return jsonify({'success': False, 'error': 'Directory not found'}), 404
+        command, archive_format = build_archive_command(ssh, posixpath.dirname(target), posixpath.basename(target), archive_format)
+    except Exception as e:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    base_name = report_timestamp if posixpath.basename(target) == report_timestamp \
+        else f"{report_timestamp}_{posixpath.basename(target)}"
+    return Response(
+        stream_with_context(iter_remote_command_output(ssh, command)),
+        mimetype=ARCHIVE_FORMATS[archive_format][0],
+        headers={'Content-Disposition': f'attachment; filename="{base_name}.{archive_format}"',
+                 'X-Archive-Format': archive_format}
+    )
+
+# ==================== Results Retention ====================
+# 远端 gms_test_results/ 的后台整理：旧运行压缩为 <timestamp>.zip（报告接口可直接浏览），
+# 按天数和总大小清理最旧的运行，并回收 .cas 中不再被引用的内容
+RESULTS_MAINTENANCE_INTERVAL = 6 * 3600
+results_maintenance_lock = threading.Lock()
+results_maintenance_status = {'running': False, 'started_at': None, 'finished_at': None, 'last': None}
+
+RESULTS_MAINTENANCE_SCRIPT = r"""
+base="$1"; compact_days="$2"; retain_days="$3"; max_bytes="$4"
+[ -d "$base" ] || exit 0
+cd "$base" || exit 1
+
+# 1. 删除超过保留天数的运行（目录或 zip）
+if [ "$retain_days" -gt 0 ]; then
+    find . -mindepth 1 -maxdepth 1 -name '[0-9]*' \( -type d -o -name '*.zip' \) -mtime +"$retain_days" -printf '%f\n' |
+    while read -r name; do
+        rm -rf "$name" && echo "R $name"
+    done
+fi
+
+# 2. 压缩已完成且超过 compact_days 天的运行目录
+if [ "$compact_days" -gt 0 ]; then
+    find . -mindepth 1 -maxdepth 1 -type d -name '[0-9]*' -mtime +"$compact_days" -printf '%f\n' |
+    while read -r name; do
+        [ -f "$name/test_result.xml" ] && [ ! -e "$name.zip" ] || continue
+        # 已去重（硬链接到 .cas）的运行压缩后会重复保存共享内容，跳过
+        [ -z "$(find "$name" -type f -links +1 -print -quit)" ] || continue
+        rm -f "$name.zip.tmp"
+        if command -v zip >/dev/null; then
+            zip -qr -X "$name.zip.tmp" "$name"
+        else
+            python3 -m zipfile -c "$name.zip.tmp" "$name"
+        fi && touch -r "$name" "$name.zip.tmp" && mv "$name.zip.tmp" "$name.zip" && rm -rf "$name" && echo "C $name"
+        rm -f "$name.zip.tmp"
+    done
+fi
+
+# 只剩 .cas 自身引用的内容可以回收；返回回收的文件数
+collect_cas() {
+    [ -d .cas ] || { echo 0; return; }
+    find .cas -type f -links 1 -not -path '*/.incoming/*' -print -delete | wc -l
+}
+collected=0
+
+# 3. 总大小超出上限时从最旧的开始删除，始终保留最新的运行。
+#    去重的运行大多是 .cas 的硬链接，删除后要先回收 .cas 再按实际占用重新计算
+if [ "$max_bytes" -gt 0 ]; then
+    total=$(du -sb . | cut -f1)
+    if [ "$total" -gt "$max_bytes" ]; then
+        while read -r _ name; do
+            [ "$total" -le "$max_bytes" ] && break
+            rm -rf "$name" && echo "R $name"
+            collected=$((collected + $(collect_cas)))
+            total=$(du -sb . | cut -f1)
+        done < <(find . -mindepth 1 -maxdepth 1 -name '[0-9]*' \( -type d -o -name '*.zip' \) -printf '%T@ %f\n' |
+                 sort -n | head -n -1)
+    fi
+fi
+
+# 4. 回收其余不再被引用的 .cas 内容
+[ -d .cas ] && echo "G $((collected + $(collect_cas)))"
+echo "S $(du -sb . | cut -f1)"
+"""
+
+
+def run_results_maintenance(config):
+    """执行一次远端结果目录整理，返回压缩/删除的运行和回收的内容数"""
+    if not results_maintenance_lock.acquire(blocking=False):
+        return None
+    summary = None
+    results_maintenance_status.update(running=True, started_at=datetime.now().isoformat())
+    try:
+        ssh = get_ssh_connection(config)
+        if not ssh:
+            summary = {'error': 'SSH connection failed'}
+            return None
+        results_base = f"/home/{config.get('ubuntu_user', 'hcq')}/gms_test_results"
+        args = [results_base,
+                str(int(config.get('results_compact_days', 14))),
+                str(int(config.get('results_retention_days', 365))),
+                str(int(float(config.get('results_retention_max_gb', 0)) * 1024 ** 3))]
+        command = f"bash -c {shlex.quote(RESULTS_MAINTENANCE_SCRIPT)} maintenance " + ' '.join(shlex.quote(a) for a in args)
+        try:
+            output, error, code = execute_ssh_command(ssh, command, timeout=3600)
+        finally:
+            return_ssh_connection(ssh)
+
+        summary = {'compacted': [], 'removed': [], 'collected': 0, 'total_bytes': None}
+        for line in output.splitlines():
+            kind, _, value = line.partition(' ')
+            if kind == 'C':
+                summary['compacted'].append(value)
+            elif kind == 'R':
+                summary['removed'].append(value)
+            elif kind == 'G' and value.isdigit():
+                summary['collected'] = int(value)
+            elif kind == 'S' and value.isdigit():
+                summary['total_bytes'] = int(value)
+        if code != 0:
+            summary['error'] = error.strip()
+
+        # 已压缩/删除的目录不再使用旧的文件列表缓存
+        changed = {f"{results_base}/{name[:-4] if name.endswith('.zip') else name}"
+                   for name in summary['compacted'] + summary['removed']}
+        if changed:
+            with report_files_lock:
+                for report_dir in changed & set(report_files_cache):
+                    report_files_cache.pop(report_dir, None)
+            report_index.invalidate()
+            print(f"[RESULTS_RETENTION] 压缩 {len(summary['compacted'])} 个运行，"
+                  f"删除 {len(summary['removed'])} 个运行，回收 {summary['collected']} 个内容")
+        return summary
+    finally:
+        results_maintenance_status.update(running=False, finished_at=datetime.now().isoformat(), last=summary)
+        results_maintenance_lock.release()
+
+
+def results_maintenance_task():
+    while True:
+        time.sleep(RESULTS_MAINTENANCE_INTERVAL)
+        try:
+            run_results_maintenance(load_config())
+        except Exception as e:
+            print(f"[RESULTS_RETENTION] Error: {e}")
+
+threading.Thread(target=results_maintenance_task, daemon=True).start()
+
+
+@app.route('/api/reports/maintenance', methods=['POST'])
+def trigger_results_maintenance():
+    """在后台立即执行一次远端结果目录压缩和清理，进度通过 GET 查询"""
+    if results_maintenance_lock.locked():
+        return jsonify({'success': False, 'error': 'Maintenance already running', **results_maintenance_status}), 409
+    threading.Thread(target=run_results_maintenance, args=(load_config(),), daemon=True).start()
+    return jsonify({'success': True, 'message': 'Maintenance started', **results_maintenance_status}), 202
+
+
+@app.route('/api/reports/maintenance', methods=['GET'])
+def get_results_maintenance_status():
+    """最近一次结果目录整理的状态和结果"""
+    return jsonify({'success': True, **results_maintenance_status})
 
 # ==================== Advanced Screen Mirroring ====================
 def calculate_window_positions(devices, screen_width=1920, screen_height=1080):
@@ -3304,9 +6321,7 @@ def upload_file_from_browser():
 
         # Upload to remote server
         remote_path = f"/home/{config['ubuntu_user']}/{file.filename}"
-        sftp = ssh.open_sftp()
-        sftp.put(temp_path, remote_path)
-        sftp.close()
+        upload = cached_sftp_put(ssh, config, temp_path, remote_path)
         return_ssh_connection(ssh)
 
         # Clean up temporary file
@@ -3315,6 +6330,7 @@ def upload_file_from_browser():
         return jsonify({
             'success': True,
             'remote_path': remote_path,
+            'cached': upload['cached'],
             'message': f'文件已上传到 {remote_path}'
         })
     except Exception as e:
@@ -3344,13 +6360,11 @@ def upload_file():
         filename = os.path.basename(file_path)
         remote_path = f"/home/{config['ubuntu_user']}/{filename}"
 
-        # Use scp to upload file
-        sftp = ssh.open_sftp()
-        sftp.put(file_path, remote_path)
-        sftp.close()
+        upload = cached_sftp_put(ssh, config, file_path, remote_path)
         return_ssh_connection(ssh)
 
-        return jsonify({'success': True, 'remote_path': remote_path, 'message': f'文件已上传到 {remote_path}'})
+        return jsonify({'success': True, 'remote_path': remote_path, 'cached': upload['cached'],
+                        'message': f'文件已上传到 {remote_path}'})
     except Exception as e:
         return_ssh_connection(ssh)
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -3390,9 +6404,7 @@ def upload_file_with_progress():
                 'filename': os.path.basename(file_path)
             })
 
-        sftp = ssh.open_sftp()
-        sftp.put(file_path, remote_path, callback=progress_callback)
-        sftp.close()
+        upload = cached_sftp_put(ssh, config, file_path, remote_path, callback=progress_callback)
         return_ssh_connection(ssh)
 
         # Final progress update
@@ -3404,7 +6416,7 @@ def upload_file_with_progress():
             'complete': True
         })
 
-        return jsonify({'success': True, 'remote_path': remote_path})
+        return jsonify({'success': True, 'remote_path': remote_path, 'cached': upload['cached']})
     except Exception as e:
         return_ssh_connection(ssh)
         socketio.emit('upload_progress', {
@@ -3413,6 +6425,330 @@ def upload_file_with_progress():
         })
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# ==================== Chunked Upload ====================
+# 分块断点续传：浏览器按块上传并附带校验值，每块直接通过 SFTP 写入远端 .part 文件的对应偏移，
+# 不在本地落盘；会话记录已提交的块，断线后重新 init 即从未提交的块继续
+CHUNKED_UPLOAD_DIR = os.path.join(LOGS_DIR, 'uploads')
+CHUNKED_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_CHUNK = 64 * 1024 * 1024
+CHUNKED_UPLOAD_EXPIRE = 7 * 86400        # 超过该时间未更新的会话及远端 .part 被清理
+CHUNK_CHECKSUMS = {
+    'sha256': lambda: hashlib.sha256(),
+    'crc32': lambda: Crc32Digest(),
+}
+upload_sessions = {}
+upload_sessions_lock = threading.Lock()
+
+class Crc32Digest:
+    """与 hashlib 相同接口的 CRC32（浏览器非安全上下文中没有 crypto.subtle 时使用）"""
+
+    def __init__(self):
+        self._crc = 0
+
+    def update(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+
+    def hexdigest(self):
+        return '%08x' % (self._crc & 0xffffffff)
+
+
+def upload_session_path(upload_id):
+    return os.path.join(CHUNKED_UPLOAD_DIR, f"{upload_id}.json")
+
+
+def save_upload_session(upload):
+    """原子写入会话文件，服务重启后仍可续传"""
+    os.makedirs(CHUNKED_UPLOAD_DIR, exist_ok=True)
+    upload['updated_at'] = time.time()
+    tmp_path = upload_session_path(upload['upload_id']) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({k: v for k, v in upload.items() if k != 'lock'}, f)
+    os.replace(tmp_path, upload_session_path(upload['upload_id']))
+
+
+def get_upload_session(upload_id):
+    """内存中没有时从会话文件恢复"""
+    if not re.fullmatch(r'[0-9a-f]{40}', upload_id or ''):
+        return None
+    with upload_sessions_lock:
+        upload = upload_sessions.get(upload_id)
+        if upload is None and os.path.exists(upload_session_path(upload_id)):
+            try:
+                with open(upload_session_path(upload_id), 'r', encoding='utf-8') as f:
+                    upload = json.load(f)
+            except (OSError, ValueError):
+                return None
+            upload['lock'] = threading.Lock()
+            upload_sessions[upload_id] = upload
+        return upload
+
+
+def drop_upload_session(upload_id):
+    with upload_sessions_lock:
+        upload_sessions.pop(upload_id, None)
+    try:
+        os.remove(upload_session_path(upload_id))
+    except OSError:
+        pass
+
+
+def cleanup_stale_uploads(sftp):
+    """清理过期会话及其远端 .part 文件"""
+    if not os.path.isdir(CHUNKED_UPLOAD_DIR):
+        return
+    now = time.time()
+    for filename in os.listdir(CHUNKED_UPLOAD_DIR):
+        upload = get_upload_session(filename[:-5]) if filename.endswith('.json') else None
+        if not upload or now - upload.get('updated_at', 0) < CHUNKED_UPLOAD_EXPIRE:
+            continue
+        try:
+            sftp.remove(upload['part_path'])
+        except IOError:
+            pass
+        drop_upload_session(upload['upload_id'])
+
+
+def upload_progress(upload):
+    return {
+        'upload_id': upload['upload_id'],
+        'remote_path': upload['remote_path'],
+        'size': upload['size'],
+        'chunk_size': upload['chunk_size'],
+        'total_chunks': upload['total_chunks'],
+        'algo': upload['algo'],
+        'committed': sorted(int(i) for i in upload['chunks']),
+        'committed_bytes': sum(min(upload['chunk_size'], upload['size'] - int(i) * upload['chunk_size'])
+                               for i in upload['chunks']),
+    }
+
+
+def upload_manifest_key(algo, chunk_size, size, checksums):
+    """分块 SHA-256 清单对应的镜像缓存别名；CRC32 不能用于内容寻址，返回 None"""
+    if algo != 'sha256' or size < IMAGE_CACHE_MIN_SIZE:
+        return None
+    if not isinstance(checksums, list) or len(checksums) != -(-size // chunk_size):
+        return None
+    manifest = f"{algo}|{chunk_size}|{size}|" + ','.join(str(c).lower() for c in checksums)
+    return hashlib.sha1(manifest.encode('utf-8')).hexdigest()
+
+
+@app.route('/api/upload/chunked/init', methods=['POST'])
+def init_chunked_upload():
+    """创建或恢复分块上传会话；同一文件（名称、大小、修改时间）重复 init 返回已提交的块"""
+    data = request.json or {}
+    filename = os.path.basename(str(data.get('filename', '')).replace('\\', '/'))
+    algo = data.get('algo', 'sha256')
+    try:
+        size = int(data.get('size', -1))
+        chunk_size = int(data.get('chunk_size') or CHUNKED_UPLOAD_CHUNK_SIZE)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid size'}), 400
+    if not filename or filename in ('.', '..'):
+        return jsonify({'success': False, 'error': 'No file selected'}), 400
+    if size < 0 or not 0 < chunk_size <= CHUNKED_UPLOAD_MAX_CHUNK:
+        return jsonify({'success': False, 'error': 'Invalid size'}), 400
+    if algo not in CHUNK_CHECKSUMS:
+        return jsonify({'success': False, 'error': f'Unsupported checksum: {algo}'}), 400
+
+    config = load_config()
+    remote_path = f"/home/{config['ubuntu_user']}/{filename}"
+    fingerprint = f"{remote_path}|{size}|{chunk_size}|{algo}|{data.get('last_modified', '')}"
+    upload_id = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+    # 浏览器预先算好全部分块校验值时，按分块清单查找镜像缓存（别名只在 complete 时由服务端校验值写入）
+    manifest_key = upload_manifest_key(algo, chunk_size, size, data.get('checksums'))
+
+    ssh = get_ssh_connection(config)
+    if not ssh:
+        return jsonify({'success': False, 'error': 'SSH connection failed'}), 500
+    try:
+        cached_sha256 = image_cache_link(ssh, config, f"m-{manifest_key}", remote_path, size) if manifest_key else None
+        if cached_sha256:
+            stale = get_upload_session(upload_id)
+            if stale:
+                execute_ssh_command(ssh, f"rm -f {shlex.quote(stale['part_path'])}")
+                drop_upload_session(upload_id)
+            return_ssh_connection(ssh)
+            return jsonify({'success': True, 'cached': True, 'remote_path': remote_path, 'size': size,
+                            'sha256': cached_sha256, 'message': f"文件已上传到 {remote_path}"})
+
+        sftp = ssh.open_sftp()
+        try:
+            cleanup_stale_uploads(sftp)
+            upload = get_upload_session(upload_id)
+            if upload:
+                # 远端 .part 丢失时已提交的块作废
+                try:
+                    sftp.stat(upload['part_path'])
+                except IOError:
+                    upload = None
+            if not upload:
+                upload = {
+                    'upload_id': upload_id, 'filename': filename, 'remote_path': remote_path,
+                    'part_path': f"{remote_path}.part", 'size': size, 'chunk_size': chunk_size,
+                    'total_chunks': max(1, -(-size // chunk_size)), 'algo': algo,
+                    'sha256': data.get('sha256'), 'chunks': {},
+                    'created_at': time.time(), 'lock': threading.Lock(),
+                }
+                sftp.open(upload['part_path'], 'wb').close()
+                with upload_sessions_lock:
+                    upload_sessions[upload_id] = upload
+                save_upload_session(upload)
+        finally:
+            sftp.close()
+        return_ssh_connection(ssh)
+    except Exception as e:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'cached': False, **upload_progress(upload)})
+
+
+@app.route('/api/upload/chunked/<upload_id>', methods=['GET', 'DELETE'])
+def chunked_upload_status(upload_id):
+    """GET 查询已提交的块；DELETE 放弃上传并删除远端 .part"""
+    upload = get_upload_session(upload_id)
+    if not upload:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    if request.method == 'GET':
+        return jsonify({'success': True, **upload_progress(upload)})
+
+    ssh = get_ssh_connection(load_config())
+    if ssh:
+        try:
+            sftp = ssh.open_sftp()
+            try:
+                sftp.remove(upload['part_path'])
+            except IOError:
+                pass
+            sftp.close()
+        finally:
+            return_ssh_connection(ssh)
+    drop_upload_session(upload_id)
+    return jsonify({'success': True})
+
+
+@app.route('/api/upload/chunked/<upload_id>/chunk', methods=['PUT', 'POST'])
+def upload_chunk(upload_id):
+    """请求体为第 index 块的原始字节，X-Chunk-Checksum 为其校验值；边接收边写入远端对应偏移"""
+    upload = get_upload_session(upload_id)
+    if not upload:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    try:
+        index = int(request.args.get('index', ''))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid chunk index'}), 400
+    if not 0 <= index < upload['total_chunks']:
+        return jsonify({'success': False, 'error': 'Invalid chunk index'}), 400
+    expected_checksum = request.headers.get('X-Chunk-Checksum', '').lower()
+    if not expected_checksum:
+        return jsonify({'success': False, 'error': 'Missing X-Chunk-Checksum'}), 400
+
+    offset = index * upload['chunk_size']
+    length = min(upload['chunk_size'], upload['size'] - offset)
+    if upload['chunks'].get(str(index)) == expected_checksum:
+        return jsonify({'success': True, 'index': index, 'duplicate': True, **upload_progress(upload)})
+
+    ssh = get_ssh_connection(load_config())
+    if not ssh:
+        return jsonify({'success': False, 'error': 'SSH connection failed'}), 500
+    digest = CHUNK_CHECKSUMS[upload['algo']]()
+    received = 0
+    try:
+        sftp = ssh.open_sftp()
+        try:
+            with sftp.open(upload['part_path'], 'r+b') as f:
+                f.set_pipelined(True)
+                f.seek(offset)
+                while received < length:
+                    data = request.stream.read(min(1024 * 1024, length - received))
+                    if not data:
+                        break
+                    digest.update(data)
+                    f.write(data)
+                    received += len(data)
+        finally:
+            sftp.close()
+        return_ssh_connection(ssh)
+    except Exception as e:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    if received != length:
+        return jsonify({'success': False, 'error': f'Incomplete chunk: {received}/{length} bytes'}), 400
+    if digest.hexdigest() != expected_checksum:
+        return jsonify({'success': False, 'error': 'Chunk checksum mismatch', 'index': index}), 422
+
+    with upload['lock']:
+        upload['chunks'][str(index)] = expected_checksum
+        save_upload_session(upload)
+    return jsonify({'success': True, 'index': index, **upload_progress(upload)})
+
+
+@app.route('/api/upload/chunked/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    """所有块提交后在远端整体校验，通过后把 .part 重命名为目标文件"""
+    upload = get_upload_session(upload_id)
+    if not upload:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    missing = [i for i in range(upload['total_chunks']) if str(i) not in upload['chunks']]
+    if missing:
+        return jsonify({'success': False, 'error': f'{len(missing)} chunks missing', 'missing': missing[:100]}), 409
+
+    ssh = get_ssh_connection(load_config())
+    if not ssh:
+        return jsonify({'success': False, 'error': 'SSH connection failed'}), 500
+    rejected = None
+    try:
+        sftp = ssh.open_sftp()
+        try:
+            # 末块之后不应有多余字节（例如重新上传了更小的同名文件）
+            sftp.truncate(upload['part_path'], upload['size'])
+            command = (f"python3 -c {shlex.quote(UPLOAD_VERIFY_SCRIPT)} {shlex.quote(upload['part_path'])} "
+                       f"{upload['chunk_size']} {upload['algo']}")
+            output, error, code = execute_ssh_command(ssh, command, timeout=1800)
+            lines = output.split()
+            if code != 0 or len(lines) < 2 or lines[-2] != 'SHA256':
+                raise RuntimeError(f"Verification failed: {error.strip() or output.strip()}")
+            sha256 = lines[-1]
+            checksums = lines[:-2]
+
+            bad = [] if upload['size'] == 0 else [
+                i for i in range(upload['total_chunks'])
+                if i >= len(checksums) or checksums[i] != upload['chunks'].get(str(i))]
+            if bad:
+                # 校验不一致的块作废，客户端重新上传这些块后再 complete
+                with upload['lock']:
+                    for i in bad:
+                        upload['chunks'].pop(str(i), None)
+                    save_upload_session(upload)
+                rejected = (jsonify({'success': False, 'error': f'{len(bad)} chunks failed verification',
+                                     'missing': bad[:100]}), 409)
+            elif upload.get('sha256') and upload['sha256'].lower() != sha256:
+                rejected = (jsonify({'success': False, 'error': 'File SHA-256 mismatch', 'sha256': sha256}), 422)
+            else:
+                sftp.posix_rename(upload['part_path'], upload['remote_path'])
+                if upload['size'] >= IMAGE_CACHE_MIN_SIZE:
+                    manifest_key = upload_manifest_key(upload['algo'], upload['chunk_size'], upload['size'], checksums)
+                    image_cache_add(ssh, load_config(), sha256, upload['remote_path'], manifest_key or '')
+        finally:
+            sftp.close()
+        return_ssh_connection(ssh)
+    except Exception as e:
+        return_ssh_connection(ssh)
+        return jsonify({'success': False, 'error': str(e)}), 500
+    if rejected:
+        return rejected
+
+    drop_upload_session(upload_id)
+    return jsonify({
+        'success': True,
+        'remote_path': upload['remote_path'],
+        'size': upload['size'],
+        'sha256': sha256,
+        'message': f"文件已上传到 {upload['remote_path']}"
+    })
+
 # ==================== Firmware Burning ====================
 @app.route('/api/firmware/burn', methods=['POST'])
 def burn_firmware():
@@ -3725,11 +7061,6 @@ def burn_sn():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # ==================== SocketIO Events ====================
-@socketio.on('connect')
-def handle_connect():
-    """Handle client connection"""
-    emit('connected', {'data': 'Connected to GMS Auto Test Server'})
-
 @socketio.on('refresh_devices')
 def handle_refresh_devices():
     """Handle device refresh request"""
@@ -3737,6 +7068,83 @@ def handle_refresh_devices():
     devices = get_connected_devices(config)
     emit('devices_updated', devices)
 
+@socketio.on('sync_state')
+def handle_sync_state(data):
+    """连接/重连握手：客户端上报快照版本和日志游标，服务端只补发缺失部分"""
+    data = data or {}
+    user_state = get_user_state()
+    snapshot = build_state_snapshot(user_state)
+    if data.get('version') != snapshot['version']:
+        emit('state_snapshot', snapshot)
+
+    store = user_state['log_store']
+    cursor = data.get('log_cursor')
+    device = (data.get('device') or '').strip()
+    if device:
+        demux = user_state.get('log_demux')
+        logs, next_seq = demux.tail(device, cursor) if demux else ([], store.next_seq)
+        more = False
+    else:
+        since = cursor if cursor is not None else max(store.next_seq - 50, store.first_seq)
+        logs, next_seq = store.read(since)
+        more = next_seq < store.next_seq
+    emit('log_backlog', {
+        'logs': logs,
+        'device': device,
+        'start_seq': next_seq - len(logs),
+        'next_seq': next_seq,
+        'more': more,
+        'replace': cursor is None
+    })
+
+@socketio.on('watch_device')
+def handle_watch_device(data):
+    """切换当前连接订阅的测试日志流（空设备表示全部输出）"""
+    client_id = get_client_id()
+    device = ((data or {}).get('device') or '').strip()
+
+    all_logs_room = log_room(client_id)
+    for room in rooms():
+        if room == all_logs_room or room.startswith(all_logs_room + ':'):
+            leave_room(room)
+    join_room(log_room(client_id, device or None))
+    emit('watching_device', {'device': device})
+
+@socketio.on('join_run')
+def handle_join_run(data):
+    """观察者加入运行房间：先加入房间再回放缓冲区，客户端按 seq 去重后切换到实时推送"""
+    data = data or {}
+    run_id = data.get('run_id')
+    with active_runs_lock:
+        run = active_runs.get(run_id)
+    if not run:
+        emit('run_error', {'run_id': run_id, 'error': 'Run not found or already finished'})
+        return
+
+    join_room(run_room(run_id))
+    store = run['store']
+    since = data.get('since')
+    if since is None:
+        since = max(store.next_seq - RUN_BACKLOG_LINES, store.first_seq)
+    logs, next_seq = store.read(since, RUN_BACKLOG_LIMIT)
+    emit('run_backlog', {
+        'run_id': run_id,
+        'owner': run['owner'],
+        'test_type': run['test_type'],
+        'devices': run['devices'],
+        'logs': logs,
+        'start_seq': next_seq - len(logs),
+        'next_seq': next_seq,
+        'more': next_seq < store.next_seq
+    })
+
+@socketio.on('leave_run')
+def handle_leave_run(data):
+    """观察者离开运行房间"""
+    run_id = (data or {}).get('run_id')
+    if run_id:
+        leave_room(run_room(run_id))
+
 # ==================== Terminal Events ====================
 terminal_ssh = {}
 terminal_lock = threading.Lock()
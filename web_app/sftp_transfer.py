@@ -0,0 +1,450 @@
+"""SFTP 大文件传输：并行多通道上传、rsync 式增量上传和 Ubuntu 主机镜像缓存（Web 服务与桌面启动器共用）"""
+
+import hashlib
+import mmap
+import os
+import shlex
+import struct
+import threading
+import zlib
+
+import paramiko
+
+
+def execute_ssh_command(ssh, command, timeout=30):
+    """在远端执行命令，返回 (stdout, stderr, 退出码)"""
+    try:
+        stdin, stdout, stderr = ssh.exec_command(command, timeout=timeout)
+        output = stdout.read().decode('utf-8', errors='ignore')
+        error = stderr.read().decode('utf-8', errors='ignore')
+        return output, error, stdout.channel.recv_exit_status()
+    except Exception as e:
+        return "", str(e), -1
+
+
+# ==================== Parallel SFTP Transfer ====================
+# 单个 SFTP 通道受对端窗口限制（OpenSSH 约 2MB 在途数据），高延迟链路上远达不到带宽上限。
+# 大文件按区间拆分，在同一连接上开多个 SFTP 通道并发流水线写入 <目标>.part，
+# 远端逐区间 SHA-256 校验一致后再改名为目标文件
+PARALLEL_SFTP_MIN_SIZE = 64 * 1024 * 1024     # 小于该大小走单通道 put
+PARALLEL_SFTP_STREAMS = 4
+PARALLEL_SFTP_WINDOW = 64 * 1024 * 1024
+PARALLEL_SFTP_PACKET = 256 * 1024
+PARALLEL_SFTP_BLOCK = 1024 * 1024
+
+# 远端按块重新计算校验值并计算整体 SHA-256，确认 .part 与已提交的块一致
+UPLOAD_VERIFY_SCRIPT = r"""
+import hashlib, sys, zlib
+path, chunk_size, algo = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+whole = hashlib.sha256()
+with open(path, 'rb') as f:
+    while True:
+        digest, crc, remaining = hashlib.sha256(), 0, chunk_size
+        while remaining:
+            data = f.read(min(1 << 20, remaining))
+            if not data:
+                break
+            whole.update(data)
+            if algo == 'sha256':
+                digest.update(data)
+            else:
+                crc = zlib.crc32(data, crc)
+            remaining -= len(data)
+        if remaining == chunk_size:
+            break
+        print(digest.hexdigest() if algo == 'sha256' else '%08x' % (crc & 0xffffffff))
+print('SHA256 ' + whole.hexdigest())
+"""
+
+
+
+def open_tuned_sftp(ssh):
+    """使用加大窗口和包大小打开新的 SFTP 通道"""
+    return paramiko.SFTPClient.from_transport(
+        ssh.get_transport(), window_size=PARALLEL_SFTP_WINDOW, max_packet_size=PARALLEL_SFTP_PACKET)
+
+
+def parallel_sftp_put(ssh, local_path, remote_path, callback=None, streams=PARALLEL_SFTP_STREAMS):
+    """上传本地文件到远端，callback(transferred, total) 与 sftp.put 一致；返回整体 SHA-256（单通道时为 None）"""
+    size = os.path.getsize(local_path)
+    if size < PARALLEL_SFTP_MIN_SIZE or streams <= 1:
+        # 先写 .part 再改名：目标可能是镜像缓存内容的硬链接，不能原地覆盖
+        part_path = f"{remote_path}.part"
+        sftp = open_tuned_sftp(ssh)
+        try:
+            sftp.put(local_path, part_path, callback=callback)
+            sftp.posix_rename(part_path, remote_path)
+        except Exception:
+            try:
+                sftp.remove(part_path)
+            except IOError:
+                pass
+            raise
+        finally:
+            sftp.close()
+        return None
+
+    # 区间按 1MB 对齐，远端校验脚本按同样的区间大小计算哈希
+    range_size = -(-size // streams)
+    range_size = -(-range_size // PARALLEL_SFTP_BLOCK) * PARALLEL_SFTP_BLOCK
+    ranges = [(start, min(size, start + range_size)) for start in range(0, size, range_size)]
+    part_path = f"{remote_path}.part"
+    digests = [None] * len(ranges)
+    errors = []
+    transferred = [0]
+    progress_lock = threading.Lock()
+
+    sftp = open_tuned_sftp(ssh)
+    try:
+        with sftp.open(part_path, 'wb'):
+            pass
+        sftp.truncate(part_path, size)
+
+        def send_range(index):
+            start, end = ranges[index]
+            digest = hashlib.sha256()
+            try:
+                channel = open_tuned_sftp(ssh)
+                try:
+                    with open(local_path, 'rb') as src, channel.open(part_path, 'r+b') as dst:
+                        dst.set_pipelined(True)
+                        src.seek(start)
+                        dst.seek(start)
+                        remaining = end - start
+                        while remaining > 0 and not errors:
+                            data = src.read(min(PARALLEL_SFTP_BLOCK, remaining))
+                            if not data:
+                                raise IOError(f"Local file shrank while uploading: {local_path}")
+                            digest.update(data)
+                            dst.write(data)
+                            remaining -= len(data)
+                            if callback:
+                                with progress_lock:
+                                    transferred[0] += len(data)
+                                    callback(transferred[0], size)
+                finally:
+                    channel.close()
+                digests[index] = digest.hexdigest()
+            except Exception as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=send_range, args=(i,), daemon=True) for i in range(len(ranges))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if errors:
+            raise errors[0]
+
+        command = f"python3 -c {shlex.quote(UPLOAD_VERIFY_SCRIPT)} {shlex.quote(part_path)} {range_size} sha256"
+        output, error, code = execute_ssh_command(ssh, command, timeout=1800)
+        lines = output.split()
+        if code != 0 or lines[:-2] != digests or lines[-2:-1] != ['SHA256']:
+            raise IOError(f"Remote verification failed for {remote_path}: {error.strip() or 'checksum mismatch'}")
+        sftp.posix_rename(part_path, remote_path)
+        return lines[-1]
+    except Exception:
+        try:
+            sftp.remove(part_path)
+        except IOError:
+            pass
+        raise
+    finally:
+        sftp.close()
+
+
+# ==================== Delta Upload ====================
+# rsync 式增量上传：远端已有同名旧版本时，按块取旧文件的弱校验(Adler-32)+强校验(MD5)，
+# 本地滚动匹配后只发送变化的数据，远端用旧文件和增量指令重建并校验 SHA-256
+DELTA_MIN_BLOCK = 64 * 1024
+DELTA_MAX_BLOCKS = 100000
+DELTA_MAX_LITERAL_RATIO = 0.2     # 变化数据超过该比例时放弃增量，直接整体上传
+DELTA_PROBE_BLOCKS = 32           # 开头这么多块都未命中时视为无关文件，立即放弃
+DELTA_ROLL_BUDGET = 8 * 1024 * 1024   # 逐字节滚动（纯 Python）的总字节预算
+DELTA_LITERAL_PIECE = 4 * 1024 * 1024
+ADLER_MOD = 65521
+
+DELTA_SIGNATURE_SCRIPT = r"""
+import hashlib, sys, zlib
+path, block = sys.argv[1], int(sys.argv[2])
+with open(path, 'rb') as f:
+    while True:
+        data = f.read(block)
+        if len(data) < block:
+            break
+        print('%08x %s' % (zlib.adler32(data) & 0xffffffff, hashlib.md5(data).hexdigest()))
+"""
+
+# 增量指令：b'C' + (块号, 块数) 从旧文件复制；b'D' + 长度 + 数据
+DELTA_APPLY_SCRIPT = r"""
+import hashlib, struct, sys
+old, delta, out, block = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+digest = hashlib.sha256()
+
+def copy(src, dst, n):
+    while n:
+        data = src.read(min(1 << 20, n))
+        if not data:
+            sys.exit('truncated input')
+        dst.write(data)
+        digest.update(data)
+        n -= len(data)
+
+with open(old, 'rb') as src, open(delta, 'rb') as ops, open(out, 'wb') as dst:
+    while True:
+        op = ops.read(1)
+        if not op:
+            break
+        if op == b'C':
+            index, count = struct.unpack('>QQ', ops.read(16))
+            src.seek(index * block)
+            copy(src, dst, count * block)
+        elif op == b'D':
+            copy(ops, dst, struct.unpack('>Q', ops.read(8))[0])
+        else:
+            sys.exit('bad delta op')
+print(digest.hexdigest())
+"""
+
+
+def delta_block_size(size):
+    block = max(DELTA_MIN_BLOCK, -(-size // DELTA_MAX_BLOCKS))
+    return -(-block // 4096) * 4096
+
+
+def build_delta_ops(data, signatures, block, callback=None):
+    """按块匹配本地数据和远端块签名，生成 ('C', 块号, 块数) / ('D', 起点, 终点) 指令；变化过多时返回 None"""
+    size = len(data)
+    max_literal = size * DELTA_MAX_LITERAL_RATIO
+    roll_budget = DELTA_ROLL_BUDGET
+    ops = []
+    literal = 0
+    matched = False
+    pos = 0
+    literal_start = 0
+
+    def find_block(start, weak):
+        candidates = signatures.get(weak)
+        if not candidates:
+            return None
+        return candidates.get(hashlib.md5(data[start:start + block]).hexdigest())
+
+    while pos + block <= size:
+        # 块对齐位置的校验由 zlib/hashlib 完成，不占用 GIL
+        weak = zlib.adler32(data[pos:pos + block])
+        index = find_block(pos, weak)
+        start = pos
+        if index is None and roll_budget > 0:
+            # 未命中时在有限预算内逐字节滚动 Adler-32，寻找因插入/删除字节而错位的块
+            a, b = weak & 0xffff, weak >> 16
+            limit = min(size - block, pos + block, pos + roll_budget)
+            while index is None and pos < limit:
+                out_byte, in_byte = data[pos], data[pos + block]
+                a = (a - out_byte + in_byte) % ADLER_MOD
+                b = (b - block * out_byte + a - 1) % ADLER_MOD
+                pos += 1
+                index = find_block(pos, (b << 16) | a)
+            roll_budget -= pos - start
+        if index is None:
+            if pos == start:
+                pos += block
+            pending = literal + pos - literal_start
+            if pending > max_literal or (not matched and pending >= DELTA_PROBE_BLOCKS * block):
+                return None
+            continue
+
+        if literal_start < pos:
+            ops.append(('D', literal_start, pos))
+            literal += pos - literal_start
+        if ops and ops[-1][0] == 'C' and ops[-1][1] + ops[-1][2] == index:
+            ops[-1] = ('C', ops[-1][1], ops[-1][2] + 1)
+        else:
+            ops.append(('C', index, 1))
+        matched = True
+        pos += block
+        literal_start = pos
+        if callback:
+            callback(pos, size)
+
+    if literal_start < size:
+        ops.append(('D', literal_start, size))
+        literal += size - literal_start
+    return ops if matched and literal <= max_literal else None
+
+
+def delta_sftp_put(ssh, local_path, remote_path, sha256, callback=None):
+    """远端 remote_path 存在旧版本时增量上传；成功返回实际发送的字节数，不适用、放弃或出错时返回 None"""
+    size = os.path.getsize(local_path)
+    sftp = open_tuned_sftp(ssh)
+    delta_path = f"{remote_path}.delta"
+    part_path = f"{remote_path}.part"
+    try:
+        try:
+            old_size = sftp.stat(remote_path).st_size
+        except IOError:
+            return None
+        block = delta_block_size(max(size, old_size))
+        if old_size < block or size < block:
+            return None
+
+        try:
+            output, _, code = execute_ssh_command(
+                ssh, f"python3 -c {shlex.quote(DELTA_SIGNATURE_SCRIPT)} {shlex.quote(remote_path)} {block}", timeout=1800)
+            if code != 0:
+                return None
+            signatures = {}
+            for index, line in enumerate(output.splitlines()):
+                weak, _, strong = line.partition(' ')
+                signatures.setdefault(int(weak, 16), {}).setdefault(strong, index)
+
+            with open(local_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                ops = build_delta_ops(data, signatures, block, callback)
+                if ops is None:
+                    return None
+
+                sent = 0
+                with sftp.open(delta_path, 'wb') as out:
+                    out.set_pipelined(True)
+                    for op in ops:
+                        if op[0] == 'C':
+                            out.write(b'C' + struct.pack('>QQ', op[1], op[2]))
+                            continue
+                        out.write(b'D' + struct.pack('>Q', op[2] - op[1]))
+                        for start in range(op[1], op[2], DELTA_LITERAL_PIECE):
+                            out.write(data[start:min(op[2], start + DELTA_LITERAL_PIECE)])
+                        sent += op[2] - op[1]
+
+            command = (f"python3 -c {shlex.quote(DELTA_APPLY_SCRIPT)} {shlex.quote(remote_path)} "
+                       f"{shlex.quote(delta_path)} {shlex.quote(part_path)} {block}")
+            output, error, code = execute_ssh_command(ssh, command, timeout=1800)
+            if code != 0 or output.strip() != sha256:
+                print(f"[DELTA_UPLOAD] 重建校验失败 {remote_path}: {error.strip()}")
+                return None
+            sftp.posix_rename(part_path, remote_path)
+        except Exception as e:
+            print(f"[DELTA_UPLOAD] 增量上传失败，改为整体上传 {remote_path}: {e}")
+            return None
+        finally:
+            for path in (delta_path, part_path):
+                try:
+                    sftp.remove(path)
+                except IOError:
+                    pass
+
+        if callback:
+            callback(size, size)
+        print(f"[DELTA_UPLOAD] {remote_path}: 仅发送 {sent}/{size} 字节")
+        return sent
+    finally:
+        sftp.close()
+
+
+# ==================== Image Cache ====================
+# Ubuntu 主机上按 SHA-256 寻址的镜像缓存：上传前先在本地计算哈希，远端已有相同内容时
+# 直接硬链接到目标路径；新上传的大文件以硬链接方式入库，按修改时间做 LRU 淘汰
+IMAGE_CACHE_MIN_SIZE = 16 * 1024 * 1024   # 小文件（脚本等）不走缓存
+IMAGE_CACHE_HASH_BLOCK = 4 * 1024 * 1024
+
+# link: 命中时把缓存内容链接到目标（key 为 m-<清单键> 时先查分块清单别名）
+# add:  把已上传的目标文件链接入库，可选记录清单别名，并按预算淘汰最久未用的内容
+IMAGE_CACHE_SCRIPT = r"""
+op="$1"; cache="$2"; hash="$3"; target="$4"; size="$5"; max_bytes="$6"; alias="$7"
+if [ "${hash#m-}" != "$hash" ]; then
+    hash=$(cat "$cache/manifests/${hash#m-}" 2>/dev/null) || exit 0
+fi
+case "$hash" in *[!0-9a-f]*|"") exit 0 ;; esac
+blob="$cache/${hash:0:2}/$hash"
+case "$op" in
+link)
+    [ -f "$blob" ] && [ "$(stat -c %s "$blob")" = "$size" ] || exit 0
+    mkdir -p "$(dirname "$target")" && rm -f "$target" && ln "$blob" "$target" && touch -c "$blob" && echo "HIT $hash"
+    ;;
+add)
+    mkdir -p "$cache/${hash:0:2}"
+    [ -f "$blob" ] || ln "$target" "$blob" 2>/dev/null || cp "$target" "$blob" || exit 1
+    touch -c "$blob"
+    if [ -n "$alias" ]; then
+        mkdir -p "$cache/manifests" && echo "$hash" > "$cache/manifests/$alias"
+    fi
+    if [ "$max_bytes" -gt 0 ]; then
+        find "$cache" -mindepth 2 -maxdepth 2 -type f -not -path "$cache/manifests/*" -printf '%T@ %s %p\n' |
+        sort -n | awk -v max="$max_bytes" '{ n++; line[n] = $0; total += $2 }
+            END { for (i = 1; i <= n && total > max; i++) { split(line[i], f, " "); print f[3]; total -= f[2] } }' |
+        while read -r path; do
+            [ "$path" = "$blob" ] && continue
+            rm -f "$path" && echo "E ${path##*/}"
+        done
+        # 指向已淘汰内容的清单别名一并清理
+        grep -rlvxFf <(find "$cache" -mindepth 2 -maxdepth 2 -type f -not -path "$cache/manifests/*" -printf '%f\n') \
+            "$cache/manifests" 2>/dev/null | xargs -r rm -f
+    fi
+    ;;
+esac
+"""
+
+
+def image_cache_dir(config):
+    """缓存位于 Ubuntu 用户主目录下，Web 服务和桌面启动器共用"""
+    return f"/home/{config.get('ubuntu_user', 'hcq')}/.gms_image_cache"
+
+
+def local_file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(IMAGE_CACHE_HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def run_image_cache_script(ssh, config, op, key, remote_path, size=0, alias=''):
+    max_bytes = int(float(config.get('image_cache_max_gb', 50)) * 1024 ** 3)
+    args = [op, image_cache_dir(config), key, remote_path, str(size), str(max_bytes), alias]
+    command = f"bash -c {shlex.quote(IMAGE_CACHE_SCRIPT)} image_cache " + ' '.join(shlex.quote(a) for a in args)
+    return execute_ssh_command(ssh, command, timeout=600)
+
+
+def image_cache_link(ssh, config, key, remote_path, size):
+    """远端已缓存该内容时链接到 remote_path，返回内容的 SHA-256，未命中返回 None"""
+    output, _, code = run_image_cache_script(ssh, config, 'link', key, remote_path, size)
+    for line in output.splitlines():
+        if code == 0 and line.startswith('HIT '):
+            return line[4:].strip()
+    return None
+
+
+def image_cache_add(ssh, config, sha256, remote_path, alias=''):
+    """把已上传完成的 remote_path 加入缓存"""
+    output, error, code = run_image_cache_script(ssh, config, 'add', sha256, remote_path, alias=alias)
+    evicted = [line[2:] for line in output.splitlines() if line.startswith('E ')]
+    if evicted:
+        print(f"[IMAGE_CACHE] 淘汰 {len(evicted)} 个缓存内容")
+    if code != 0:
+        print(f"[IMAGE_CACHE] 入库失败 {remote_path}: {error.strip()}")
+
+
+def cached_sftp_put(ssh, config, local_path, remote_path, callback=None):
+    """带镜像缓存的上传：命中时不传输数据；返回 {'cached': bool, 'sha256': str|None, 'delta_sent': int|None}"""
+    size = os.path.getsize(local_path)
+    if size < IMAGE_CACHE_MIN_SIZE:
+        sha256 = parallel_sftp_put(ssh, local_path, remote_path, callback=callback)
+        return {'cached': False, 'sha256': sha256, 'delta_sent': None}
+
+    sha256 = local_file_sha256(local_path)
+    if image_cache_link(ssh, config, sha256, remote_path, size):
+        if callback:
+            callback(size, size)
+        return {'cached': True, 'sha256': sha256, 'delta_sent': None}
+
+    # 远端有同名旧版本时先尝试增量上传（重建到 .part 并校验 SHA-256 后改名，不改动旧文件）
+    delta_sent = delta_sftp_put(ssh, local_path, remote_path, sha256, callback=callback)
+    if delta_sent is None:
+        # 目标可能是缓存内容的硬链接，先解除链接，避免原地写入改坏缓存
+        execute_ssh_command(ssh, f"rm -f {shlex.quote(remote_path)}")
+        remote_sha256 = parallel_sftp_put(ssh, local_path, remote_path, callback=callback)
+        if remote_sha256 is None:
+            output, _, _ = execute_ssh_command(ssh, f"sha256sum {shlex.quote(remote_path)}", timeout=600)
+            remote_sha256 = output.split()[0] if output.split() else None
+        if remote_sha256 != sha256:
+            raise IOError(f"SHA-256 mismatch after upload: {remote_path}")
+    image_cache_add(ssh, config, sha256, remote_path)
+    return {'cached': False, 'sha256': sha256, 'delta_sent': delta_sent}
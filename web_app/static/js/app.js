@@ -13,7 +13,13 @@ const state = {
     fileBrowser: { currentPath: '', selectedFile: null, targetInputId: null, mode: null },
     // 性能优化
     domCache: {},
-    lastLogCount: 0,
+    logCursor: null,        // 服务端日志序号游标（单调递增）
+    stateVersion: null,     // 服务端状态快照版本
+    statusETag: null,       // 长轮询使用的 ETag
+    logDevice: '',          // 当前查看的设备日志流（空为全部）
+    logStreams: [],
+    observingRun: null,     // 正在观察的其他用户运行
+    runCursor: null,        // 观察运行的日志游标
     pendingDeviceRefresh: null,
     isRefreshingDevices: false
 };
@@ -176,6 +182,27 @@ function initSocket() {
     state.socket.on('connect', () => {
         console.log('Connected to server');
         updateConnectionStatus(true);
+        // 重连后恢复设备日志订阅
+        if (state.logDevice) {
+            state.socket.emit('watch_device', { device: state.logDevice });
+        }
+        // 上报本地版本和游标，服务端只补发变化的状态和缺失的日志
+        requestStateSync();
+        // 重连后从断点继续观察
+        if (state.observingRun) {
+            state.socket.emit('join_run', { run_id: state.observingRun, since: state.runCursor });
+        }
+    });
+
+    state.socket.on('state_snapshot', applyStateSnapshot);
+
+    state.socket.on('log_backlog', (data) => {
+        if (state.observingRun || (data.device || '') !== state.logDevice) return;
+        if (data.replace) $('log-output').innerHTML = '';
+        (data.logs || []).forEach(log => addLogEntry(log.message || log, log.type || 'info'));
+        state.logCursor = data.next_seq;
+        // 单次补发有上限，未补齐时继续请求
+        if (data.more) requestStateSync();
     });
 
     state.socket.on('disconnect', () => {
@@ -184,9 +211,49 @@ function initSocket() {
     });
 
     state.socket.on('log_update', (data) => {
+        // 观察其他运行时不显示本机日志
+        if (state.observingRun) return;
+        if (data.seq !== undefined) {
+            // 已通过轮询补齐的日志不再重复显示
+            if (state.logCursor !== null && data.seq < state.logCursor) return;
+            state.logCursor = data.seq + 1;
+        }
         addLogEntry(data.log, data.type || 'info');
     });
 
+    state.socket.on('run_backlog', (data) => {
+        if (data.run_id !== state.observingRun) return;
+        if (state.runCursor === null) {
+            $('log-output').innerHTML = '';
+            addLogEntry(`[观察] ${data.owner} 的 ${data.test_type.toUpperCase()} 测试`, 'info');
+        }
+        (data.logs || []).forEach(log => addLogEntry(log, 'info'));
+        state.runCursor = data.next_seq;
+        if (data.more) {
+            state.socket.emit('join_run', { run_id: data.run_id, since: state.runCursor });
+        }
+    });
+
+    state.socket.on('run_log', (data) => {
+        if (data.run_id !== state.observingRun || state.runCursor === null) return;
+        // 回放与实时推送可能重叠，按序号去重
+        if (data.seq < state.runCursor) return;
+        state.runCursor = data.seq + 1;
+        addLogEntry(data.log, 'info');
+    });
+
+    state.socket.on('run_complete', (data) => {
+        if (data.run_id !== state.observingRun) return;
+        addLogEntry(`[观察] 运行已结束 (exit code: ${data.exit_code ?? '未知'})`, 'success');
+        if (data.summary) {
+            addLogEntry(`[观察] PASS: ${data.summary.pass}  FAIL: ${data.summary.failed}  用时: ${data.summary.duration}s`, 'info');
+        }
+    });
+
+    state.socket.on('run_error', (data) => {
+        showToast(data.error, 'warning');
+    });
+
     state.socket.on('devices_updated', (devices) => {
         state.devices = devices;
         renderDevices();
@@ -1167,6 +1234,57 @@ function updateUsbipButtonStatus(connected) {
 }
 
 // ==================== File Upload ====================
+// 分块断点续传：每块附带校验值直接写入远端文件，中断后重新上传同一文件时跳过已提交的块
+const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+const UPLOAD_CHUNK_RETRIES = 5;
+const UPLOAD_CACHE_MIN_SIZE = 16 * 1024 * 1024;   // 与服务端镜像缓存阈值一致
+let crc32Table = null;
+
+function crc32Hex(bytes) {
+    if (!crc32Table) {
+        crc32Table = new Uint32Array(256);
+        for (let n = 0; n < 256; n++) {
+            let c = n;
+            for (let k = 0; k < 8; k++) c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+            crc32Table[n] = c >>> 0;
+        }
+    }
+    let crc = 0xFFFFFFFF;
+    for (let i = 0; i < bytes.length; i++) crc = crc32Table[(crc ^ bytes[i]) & 0xFF] ^ (crc >>> 8);
+    return ((crc ^ 0xFFFFFFFF) >>> 0).toString(16).padStart(8, '0');
+}
+
+async function chunkChecksum(buffer, algo) {
+    if (algo === 'sha256') {
+        const digest = await crypto.subtle.digest('SHA-256', buffer);
+        return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+    }
+    return crc32Hex(new Uint8Array(buffer));
+}
+
+async function uploadChunk(uploadId, index, buffer, checksum) {
+    for (let attempt = 0; ; attempt++) {
+        let error;
+        try {
+            const response = await fetch(`/api/upload/chunked/${uploadId}/chunk?index=${index}`, {
+                method: 'PUT',
+                headers: { 'Content-Type': 'application/octet-stream', 'X-Chunk-Checksum': checksum },
+                body: buffer
+            });
+            const result = await response.json();
+            if (response.ok) return result;
+            error = new Error(result.error || `HTTP ${response.status}`);
+            // 校验不一致(422)和服务端错误可重试，其余错误直接失败
+            if (response.status !== 422 && response.status < 500) throw Object.assign(error, { fatal: true });
+        } catch (e) {
+            if (e.fatal) throw e;
+            error = e;
+        }
+        if (attempt >= UPLOAD_CHUNK_RETRIES) throw error;
+        await new Promise(resolve => setTimeout(resolve, Math.min(1000 * 2 ** attempt, 15000)));
+    }
+}
+
 async function handleUploadFile() {
     const fileInput = document.getElementById('local-file');
     const file = fileInput.files[0];
@@ -1176,74 +1294,102 @@ async function handleUploadFile() {
         return;
     }
 
+    const progressFill = document.getElementById('upload-progress-fill');
+    const progressInfo = document.getElementById('progress-info');
+
     try {
         addLogEntry(`正在上传文件: ${file.name}`, 'info');
-        const progressFill = document.getElementById('upload-progress-fill');
-        const progressInfo = document.getElementById('progress-info');
-        const startTime = Date.now();
-
-        // Create FormData
-        const formData = new FormData();
-        formData.append('file', file);
+        // 非安全上下文(http://局域网地址)没有 crypto.subtle，改用 CRC32
+        const algo = window.isSecureContext && window.crypto && crypto.subtle ? 'sha256' : 'crc32';
+
+        // 大文件先在本地算出全部分块 SHA-256，主机镜像缓存中已有相同内容时无需上传；
+        // CRC32 不能作为缓存键，非安全上下文下不做这一遍预计算
+        const checksums = [];
+        if (algo === 'sha256' && file.size >= UPLOAD_CACHE_MIN_SIZE) {
+            const totalChunks = Math.ceil(file.size / UPLOAD_CHUNK_SIZE);
+            for (let index = 0; index < totalChunks; index++) {
+                const start = index * UPLOAD_CHUNK_SIZE;
+                const buffer = await file.slice(start, Math.min(start + UPLOAD_CHUNK_SIZE, file.size)).arrayBuffer();
+                checksums.push(await chunkChecksum(buffer, algo));
+                progressInfo.textContent = `计算校验... ${Math.round(((index + 1) / totalChunks) * 100)}%`;
+            }
+        }
 
-        // Use XMLHttpRequest for upload progress
-        const xhr = new XMLHttpRequest();
+        const session = await apiCall('/api/upload/chunked/init', 'POST', {
+            filename: file.name,
+            size: file.size,
+            chunk_size: UPLOAD_CHUNK_SIZE,
+            algo,
+            last_modified: file.lastModified,
+            checksums
+        });
+        if (session.cached) {
+            progressFill.style.width = '100%';
+            progressInfo.textContent = `主机已有相同文件，已直接链接 (${formatBytes(file.size)})`;
+            addLogEntry(`命中镜像缓存，跳过上传: ${session.remote_path} (SHA-256 ${session.sha256})`, 'success');
+            showToast('文件上传成功', 'success');
+            return;
+        }
+        if (session.committed.length) {
+            addLogEntry(`断点续传: 已完成 ${session.committed.length}/${session.total_chunks} 块`, 'info');
+        }
 
-        xhr.upload.addEventListener('progress', (e) => {
-            if (e.lengthComputable) {
-                const percentage = Math.round((e.loaded / e.total) * 100);
-                const transferred = formatBytes(e.loaded);
-                const total = formatBytes(e.total);
-                const elapsed = (Date.now() - startTime) / 1000;
-                const speed = elapsed > 0 ? formatBytes(e.loaded / elapsed) + '/s' : '';
+        let uploaded = session.committed_bytes;
+        let sent = 0;
+        const startTime = Date.now();
+        const updateProgress = (text = '上传中...') => {
+            const percentage = file.size ? Math.round((uploaded / file.size) * 100) : 100;
+            const elapsed = (Date.now() - startTime) / 1000;
+            const speed = elapsed > 0 && sent > 0 ? formatBytes(sent / elapsed) + '/s' : '';
+            progressFill.style.width = percentage + '%';
+            progressInfo.textContent = `${text} ${percentage}% (${formatBytes(uploaded)}/${formatBytes(file.size)}) ${speed}`;
+        };
 
-                progressFill.style.width = percentage + '%';
-                progressInfo.textContent = `上传中... ${percentage}% (${transferred}/${total}) ${speed}`;
+        const sendChunks = async (indexes) => {
+            for (const index of indexes) {
+                const start = index * session.chunk_size;
+                const buffer = await file.slice(start, Math.min(start + session.chunk_size, file.size)).arrayBuffer();
+                const checksum = checksums[index] || await chunkChecksum(buffer, session.algo);
+                const result = await uploadChunk(session.upload_id, index, buffer, checksum);
+                uploaded = result.committed_bytes;
+                sent += buffer.byteLength;
+                updateProgress();
             }
-        });
+        };
 
-        xhr.addEventListener('load', () => {
-            if (xhr.status === 200) {
-                const response = JSON.parse(xhr.responseText);
-                if (response.success) {
-                    progressFill.style.width = '100%';
-                    progressInfo.textContent = `上传完成 (${formatBytes(file.size)})`;
-                    addLogEntry(`文件上传成功: ${response.remote_path || file.name}`, 'success');
-                    showToast('文件上传成功', 'success');
-
-                    setTimeout(() => {
-                        progressFill.style.width = '0%';
-                        progressInfo.textContent = '';
-                        fileInput.value = ''; // Clear file input
-                        // Reset drop zone UI
-                        document.getElementById('drop-zone-text').style.display = 'block';
-                        document.getElementById('drop-zone-filename').style.display = 'none';
-                        document.getElementById('drop-zone-filename').textContent = '';
-                    }, 3000);
-                } else {
-                    addLogEntry('上传失败: ' + (response.error || '未知错误'), 'error');
-                    progressFill.style.width = '0%';
-                    progressInfo.textContent = '';
-                }
-            } else {
-                addLogEntry(`上传失败: HTTP ${xhr.status}`, 'error');
-                progressFill.style.width = '0%';
-                progressInfo.textContent = '';
-            }
-        });
+        const committed = new Set(session.committed);
+        await sendChunks([...Array(session.total_chunks).keys()].filter(i => !committed.has(i)));
+
+        // 远端整体校验；校验不一致的块重传一次后再完成
+        let response, result;
+        for (let round = 0; round < 2; round++) {
+            updateProgress('校验中...');
+            response = await fetch(`/api/upload/chunked/${session.upload_id}/complete`, { method: 'POST' });
+            result = await response.json();
+            if (response.status !== 409 || !result.missing) break;
+            uploaded -= result.missing.length * session.chunk_size;
+            await sendChunks(result.missing);
+        }
+        if (!response.ok) throw new Error(result.error || `HTTP ${response.status}`);
+
+        progressFill.style.width = '100%';
+        progressInfo.textContent = `上传完成 (${formatBytes(file.size)})`;
+        addLogEntry(`文件上传成功: ${result.remote_path || file.name} (SHA-256 ${result.sha256})`, 'success');
+        showToast('文件上传成功', 'success');
 
-        xhr.addEventListener('error', () => {
-            addLogEntry('上传失败: 网络错误', 'error');
+        setTimeout(() => {
             progressFill.style.width = '0%';
             progressInfo.textContent = '';
-        });
-
-        // Start upload
-        xhr.open('POST', '/api/upload/file');
-        xhr.send(formData);
+            fileInput.value = ''; // Clear file input
+            // Reset drop zone UI
+            document.getElementById('drop-zone-text').style.display = 'block';
+            document.getElementById('drop-zone-filename').style.display = 'none';
+            document.getElementById('drop-zone-filename').textContent = '';
+        }, 3000);
     } catch (error) {
-        addLogEntry('文件上传失败: ' + error.message, 'error');
-        document.getElementById('upload-progress-fill').style.width = '0%';
+        addLogEntry('文件上传失败: ' + error.message + '（重新上传同一文件可从断点继续）', 'error');
+        progressFill.style.width = '0%';
+        progressInfo.textContent = '';
     }
 }
 
@@ -1737,47 +1883,69 @@ function addLogEntry(message, type = 'info') {
     }
 }
 
-// ==================== Status Polling ====================
-function startStatusPolling() {
-    // 优化：从2秒改为5秒，减少服务器压力
-    setInterval(async () => {
-        try {
-            // 只在必要时获取完整状态
-            const status = await apiCall('/api/status');
-
-            if (status.running && !state.testing) {
-                state.testing = true;
-                updateTestToggleButton(true);
-            } else if (!status.running && state.testing) {
-                state.testing = false;
-                updateTestToggleButton(false);
-            }
+// ==================== Status Sync ====================
+// Socket.IO 连接时由服务端推送状态；仅在断线期间退回 ETag 长轮询
+function requestStateSync() {
+    state.socket.emit('sync_state', {
+        version: state.stateVersion,
+        log_cursor: state.logCursor,
+        device: state.logDevice
+    });
+}
 
-            // Update VPN status
-            if (status.vpn_connected !== undefined) {
-                updateVpnStatus(status.vpn_connected);
-            }
+function applyStateSnapshot(snapshot) {
+    state.stateVersion = snapshot.version;
+    updateLogDeviceFilter(snapshot.streams);
+
+    if (snapshot.running !== state.testing) {
+        state.testing = snapshot.running;
+        updateTestToggleButton(snapshot.running);
+    }
+}
 
-            // 优化：使用状态中已有的日志数量而不是查询DOM
-            if (status.logs && status.logs.length > 0) {
-                if (status.logs.length > state.lastLogCount) {
-                    status.logs.slice(state.lastLogCount).forEach(log => {
-                        addLogEntry(log.message || log, log.type || 'info');
-                    });
-                    state.lastLogCount = status.logs.length;
+function startStatusPolling() {
+    const poll = async () => {
+        // Socket.IO 在线时不轮询，等待断线后再接管
+        if (state.connected) {
+            setTimeout(poll, 5000);
+            return;
+        }
+        try {
+            const params = new URLSearchParams({ wait: 25 });
+            if (state.logDevice) params.set('device', state.logDevice);
+            if (state.logCursor !== null) params.set('since', state.logCursor);
+            const headers = state.statusETag ? { 'If-None-Match': state.statusETag } : {};
+            const response = await fetch('/api/status?' + params.toString(), { headers });
+
+            if (response.status === 200) {
+                state.statusETag = response.headers.get('ETag');
+                const status = await response.json();
+                applyStateSnapshot(status);
+
+                // 基于序号游标的增量日志（补齐 Socket.IO 断线期间遗漏的日志）
+                (status.logs || []).forEach(log => addLogEntry(log.message || log, log.type || 'info'));
+                if (status.next_seq !== undefined) {
+                    state.logCursor = Math.max(state.logCursor || 0, status.next_seq);
                 }
+            } else if (response.status !== 304) {
+                throw new Error(`HTTP ${response.status}`);
             }
+            setTimeout(poll, 0);
         } catch (error) {
             console.error('Status polling error:', error);
+            setTimeout(poll, 5000);
         }
-    }, 5000); // 从2000ms改为5000ms
+    };
+    poll();
 }
 
 async function checkInitialTestStatus() {
     try {
         const status = await apiCall('/api/status');
         state.testing = status.running;
+        state.stateVersion = status.version;
         updateTestToggleButton(status.running);
+        updateLogDeviceFilter(status.streams);
 
         // Load existing logs if available
         if (status.logs && status.logs.length > 0) {
@@ -1786,14 +1954,81 @@ async function checkInitialTestStatus() {
             status.logs.forEach(log => {
                 addLogEntry(log.message || log, log.type || 'info');
             });
-            // 初始化日志计数
-            state.lastLogCount = status.logs.length;
         }
+        // 初始化日志游标
+        state.logCursor = status.next_seq !== undefined ? status.next_seq : null;
     } catch (error) {
         console.error('Failed to check initial test status:', error);
     }
 }
 
+// ==================== Per-Device Log Streams ====================
+function updateLogDeviceFilter(streams) {
+    const select = $('log-device-filter');
+    if (!select || !streams) return;
+
+    const names = Object.keys(streams).sort();
+    if (names.join(',') === state.logStreams.join(',')) return;
+    state.logStreams = names;
+
+    // 设备名来自测试输出，以文本方式写入选项
+    select.replaceChildren(new Option('全部设备', ''), ...names.map(name =>
+        new Option(`${name === 'host' ? '主机输出' : name} (${streams[name].count})`, name)
+    ));
+    select.value = state.logDevice;
+}
+
+async function onLogDeviceChange() {
+    const select = $('log-device-filter');
+    state.logDevice = select ? select.value : '';
+    state.socket.emit('watch_device', { device: state.logDevice });
+
+    // 切换后从服务端回填该设备的最近日志
+    try {
+        const query = state.logDevice ? `?device=${encodeURIComponent(state.logDevice)}` : '';
+        const status = await apiCall('/api/status' + query);
+        $('log-output').innerHTML = '';
+        (status.logs || []).forEach(log => addLogEntry(log.message || log, log.type || 'info'));
+        state.logCursor = status.next_seq !== undefined ? status.next_seq : null;
+    } catch (error) {
+        console.error('Failed to load device logs:', error);
+    }
+}
+
+// ==================== Run Observers ====================
+async function loadActiveRuns() {
+    const select = $('run-observe');
+    if (!select) return;
+    try {
+        const result = await apiCall('/api/runs');
+        // 运行者和测试类型来自其他会话，以文本方式写入选项
+        select.replaceChildren(new Option('本机运行', ''), ...(result.runs || []).map(run =>
+            new Option(`${run.owner} ${String(run.test_type).toUpperCase()} (${run.observers} 人观察)`, run.run_id)
+        ));
+        select.value = state.observingRun || '';
+    } catch (error) {
+        console.error('Failed to load active runs:', error);
+    }
+}
+
+function onObserveRunChange() {
+    const select = $('run-observe');
+    const runId = select ? select.value : '';
+    if (state.observingRun) {
+        state.socket.emit('leave_run', { run_id: state.observingRun });
+    }
+    state.observingRun = runId || null;
+    state.runCursor = null;
+
+    if (runId) {
+        state.socket.emit('join_run', { run_id: runId });
+    } else {
+        // 回到本机运行：重新拉取最近日志
+        state.logCursor = null;
+        requestStateSync();
+    }
+}
+
 // ==================== UI Helpers ====================
 function updateConnectionStatus(connected) {
     state.connected = connected;
@@ -1846,14 +2081,19 @@ window.onclick = function(event) {
 
 // ==================== Test Reports ====================
 let reportsRefreshInterval = null;
+const reportsPaging = { offset: 0, limit: 20, total: 0 };
 
-async function loadTestReports() {
+async function loadTestReports(forceRefresh = false) {
     try {
-        const resp = await fetch('/api/reports/list');
+        const params = new URLSearchParams({ offset: reportsPaging.offset, limit: reportsPaging.limit });
+        if (forceRefresh) params.set('refresh', 'true');
+        const resp = await fetch('/api/reports/list?' + params.toString());
         const data = await resp.json();
 
         if (data.reports) {
+            reportsPaging.total = data.total || data.reports.length;
             displayTestReports(data.reports);
+            updateReportsPager();
         }
 
         // 启动自动刷新（每15秒）
@@ -1927,18 +2167,73 @@ function displayTestReports(reports) {
     }).join('');
 }
 
-async function viewReportDetails(timestamp) {
+function updateReportsPager() {
+    const pager = document.getElementById('reports-pager');
+    if (!pager) return;
+    const { offset, limit, total } = reportsPaging;
+    const page = Math.floor(offset / limit) + 1;
+    const pages = Math.max(Math.ceil(total / limit), 1);
+    document.getElementById('reports-page-info').textContent = `第 ${page} / ${pages} 页，共 ${total} 个报告`;
+    document.getElementById('reports-prev').disabled = offset === 0;
+    document.getElementById('reports-next').disabled = offset + limit >= total;
+}
+
+function changeReportsPage(delta) {
+    const next = reportsPaging.offset + delta * reportsPaging.limit;
+    if (next < 0 || next >= reportsPaging.total) return;
+    reportsPaging.offset = next;
+    loadTestReports();
+}
+
+const reportFiles = { timestamp: null, pattern: '', offset: 0, limit: 200, files: [], total: 0, archived: false };
+
+async function viewReportDetails(timestamp, append = false) {
+    if (!append) {
+        if (timestamp !== reportFiles.timestamp) {
+            // 切换报告时清除上一个报告的过滤条件
+            reportFiles.pattern = '';
+            const patternInput = document.getElementById('report-files-pattern');
+            if (patternInput) patternInput.value = '';
+        }
+        if (timestamp !== reportFiles.timestamp) reportFiles.archived = false;
+        reportFiles.timestamp = timestamp;
+        reportFiles.offset = 0;
+        reportFiles.files = [];
+    }
     try {
-        const resp = await fetch(`/api/reports/${timestamp}/files`);
-        const data = await resp.json();
+        const params = new URLSearchParams({ offset: reportFiles.offset, limit: reportFiles.limit, sort: 'path' });
+        if (reportFiles.pattern) params.set('pattern', reportFiles.pattern);
+        let data = reportFiles.archived ? { success: true, files: [], total: 0 }
+            : await (await fetch(`/api/reports/${timestamp}/files?` + params.toString())).json();
 
         if (!data.success) {
             showToast('加载报告文件失败: ' + data.error, 'error');
             return;
         }
 
+        // 结果目录不存在时改为浏览同名 zip 归档
+        if (reportFiles.archived || (data.total === 0 && !reportFiles.pattern)) {
+            const zipResp = await fetch(`/api/reports/${timestamp}/zip?` + params.toString());
+            const zipData = await zipResp.json();
+            if (zipData.success) {
+                reportFiles.archived = true;
+                data = {
+                    total: zipData.total,
+                    files: zipData.members.filter(m => !m.is_dir).map(m => ({
+                        name: m.name.split('/').pop(),
+                        path: `zip:${m.name}`,
+                        relative_path: m.name,
+                        size: m.size
+                    }))
+                };
+            }
+        }
+
+        reportFiles.files = reportFiles.files.concat(data.files);
+        reportFiles.total = data.total;
+
         // Show report details modal
-        showReportDetailsModal(timestamp, data.files);
+        showReportDetailsModal(timestamp, reportFiles.files);
     } catch (e) {
         console.error('[Reports] Error loading report details:', e);
         showToast('加载报告详情失败: ' + e.message, 'error');
@@ -1962,11 +2257,19 @@ function showReportDetailsModal(timestamp, files) {
                 <div class="modal-body" style="overflow-y: auto; max-height: calc(80vh - 120px);">
                     <div style="margin-bottom: 15px;">
                         <div style="font-size: 12px; color: var(--text-secondary); margin-bottom: 8px;">时间戳</div>
-                        <div id="report-timestamp" style="font-family: monospace; font-size: 13px; color: var(--text-primary);"></div>
+                        <div style="display: flex; align-items: center; gap: 8px;">
+                            <div id="report-timestamp" style="font-family: monospace; font-size: 13px; color: var(--text-primary);"></div>
+                            <a id="report-archive-link" class="btn-xxs" style="margin-left: auto;">📦 打包下载</a>
+                        </div>
                     </div>
                     <div style="margin-bottom: 15px;">
-                        <div style="font-size: 12px; color: var(--text-secondary); margin-bottom: 8px;">报告文件</div>
+                        <div style="display: flex; align-items: center; gap: 8px; font-size: 12px; color: var(--text-secondary); margin-bottom: 8px;">
+                            <span>报告文件</span>
+                            <span id="report-files-count"></span>
+                            <input id="report-files-pattern" type="text" placeholder="过滤，如 *.txt" style="margin-left: auto; width: 160px; font-size: 11px;" onkeypress="if (event.key === 'Enter') filterReportFiles()">
+                        </div>
                         <div id="report-files-list" style="max-height: 300px; overflow-y: auto;"></div>
+                        <button class="btn-xxs" id="report-files-more" style="display: none; margin-top: 8px;" onclick="loadMoreReportFiles()">加载更多</button>
                     </div>
                     <div id="report-file-preview" style="display: none;">
                         <div style="font-size: 12px; color: var(--text-secondary); margin-bottom: 8px;">文件预览</div>
@@ -1979,6 +2282,7 @@ function showReportDetailsModal(timestamp, files) {
     }
 
     document.getElementById('report-timestamp').textContent = timestamp;
+    document.getElementById('report-archive-link').href = `/api/reports/${encodeURIComponent(timestamp)}/archive?format=tar.zst`;
 
     const filesList = document.getElementById('report-files-list');
     filesList.innerHTML = files.map(file => {
@@ -1992,9 +2296,21 @@ function showReportDetailsModal(timestamp, files) {
         `;
     }).join('');
 
+    document.getElementById('report-files-count').textContent = `${files.length} / ${reportFiles.total}`;
+    document.getElementById('report-files-more').style.display = files.length < reportFiles.total ? 'inline-block' : 'none';
     modal.classList.add('show');
 }
 
+function filterReportFiles() {
+    reportFiles.pattern = document.getElementById('report-files-pattern').value.trim();
+    viewReportDetails(reportFiles.timestamp);
+}
+
+function loadMoreReportFiles() {
+    reportFiles.offset += reportFiles.limit;
+    viewReportDetails(reportFiles.timestamp, true);
+}
+
 function closeReportDetailsModal() {
     const modal = document.getElementById('report-details-modal');
     if (modal) {
@@ -2005,7 +2321,12 @@ function closeReportDetailsModal() {
 
 async function viewReportFile(filePath, fileName) {
     try {
-        const resp = await fetch(`/api/reports/view?path=${encodeURIComponent(filePath)}`);
+        // zip: 前缀表示归档中的成员
+        const member = filePath.startsWith('zip:') ? filePath.slice(4) : null;
+        const url = member
+            ? `/api/reports/${reportFiles.timestamp}/zip/member?name=${encodeURIComponent(member)}`
+            : `/api/reports/view?path=${encodeURIComponent(filePath)}`;
+        const resp = await fetch(url);
         const data = await resp.json();
 
         if (!data.success) {
@@ -2018,11 +2339,32 @@ async function viewReportFile(filePath, fileName) {
         const content = document.getElementById('report-file-content');
 
         preview.style.display = 'block';
-        content.textContent = data.content.substring(0, 10000); // Limit to first 10KB
+        const sizeMB = (data.size / 1024 / 1024).toFixed(1);
+        if (data.binary) {
+            content.textContent = `(二进制文件 ${data.content_type}，${sizeMB} MB)`;
+        } else {
+            content.textContent = data.content;
+            // 大文件服务端只返回头尾预览
+            if (data.truncated) {
+                content.textContent += data.tail !== undefined
+                    ? `\n\n... (文件共 ${sizeMB} MB，仅显示开头和结尾) ...\n\n${data.tail}`
+                    : `\n\n... (文件共 ${sizeMB} MB，仅显示开头)`;
+            }
+        }
 
-        if (data.content.length > 10000) {
-            content.textContent += '\n\n... (文件过大，仅显示前 10KB)';
+        let download = document.getElementById('report-file-download');
+        if (!download) {
+            download = document.createElement('a');
+            download.id = 'report-file-download';
+            download.className = 'btn-xxs';
+            download.style.marginTop = '8px';
+            download.style.display = 'inline-block';
+            download.textContent = '⬇️ 下载原始文件';
+            preview.appendChild(download);
         }
+        download.href = member
+            ? `/api/reports/${reportFiles.timestamp}/zip/member?raw=true&name=${encodeURIComponent(member)}`
+            : `/api/reports/view?raw=true&path=${encodeURIComponent(filePath)}`;
 
         // Scroll to preview
         preview.scrollIntoView({ behavior: 'smooth' });